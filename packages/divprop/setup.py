@@ -63,6 +63,14 @@ entry_points = {
 
         'divprop.random_sbox_benchmark = '
         + 'divprop.tool_random_sbox_benchmark:tool_RandomSboxBenchmark',
+
+        'divprop.sandwich_shard = '
+        + 'divprop.tool_sandwich_shard:tool_SandwichShard',
+        'divprop.sandwich_merge = '
+        + 'divprop.tool_sandwich_shard:tool_SandwichMerge',
+
+        'divprop.sboxes2table = '
+        + 'divprop.tool_sbox_table:tool_Sboxes2Table',
     ]
 }
 
@@ -105,7 +113,9 @@ setup(
             ],
             depends=[
                 "./src/divprop/divprop/DivCore.hpp",
+                "./src/divprop/divprop/PeekANFs.hpp",
                 "./src/sbox/Sbox.hpp",
+                "./src/sbox/SboxFiles.hpp",
                 SUBSETS_SO,
                 HACKYCPP_HPP,
             ],
@@ -1,8 +1,11 @@
 #pragma once
 
 #include <random>
+#include <sstream>
 #include <algorithm>
 
+#include <unistd.h>
+
 #include "hackycpp.h"
 
 #include "DenseSet.hpp"
@@ -14,6 +17,23 @@ log = logging.getLogger(__name__)
 %}
 #endif
 
+#ifndef SWIG
+// Closes the file on all paths
+// and removes the file at path unless it is cleared (e.g. a partial .tmp).
+struct _FileGuard {
+    FILE *fd;
+    string path;
+    ~_FileGuard() {
+        if (fd) {
+            fclose(fd);
+        }
+        if (!path.empty()) {
+            unlink(path.c_str());
+        }
+    }
+};
+#endif
+
 template <typename T>
 struct T_DivCore_StrongComposition {
     int n, r, m;
@@ -21,10 +41,18 @@ struct T_DivCore_StrongComposition {
     std::vector<T> tab1;
     std::vector<T> tab2;
     std::vector<T> keys_left;
+    std::default_random_engine rng;
     DenseSet _ones;
 
     DenseSet divcore;
 
+    // Products of coordinates for all v are built along the subset tree
+    // (the product for v reuses the one for v without its top bit),
+    // one AND per v instead of up to m.
+    // This keeps a stack of m+1 sets per thread,
+    // above this memory cap the products are rebuilt for each v.
+    uint64_t products_memory_cap = 1ull << 30;
+
     // T_DivCore_StrongComposition(int _n, int _r, int _m, const std::vector<T> &_tab1, const std::vector<T> &_tab2);
     T_DivCore_StrongComposition(
         int _n, int _r, int _m,
@@ -59,25 +87,167 @@ struct T_DivCore_StrongComposition {
     #endif
 
     void shuffle() {
-        std::shuffle(keys_left.begin(), keys_left.end(), default_random_engine());
+        std::shuffle(keys_left.begin(), keys_left.end(), rng);
+    }
+
+    // ========================================
+    // Checkpoints
+    // ========================================
+    static const uint64_t STATE_VERSION = 0x3a4f2d6c1b9e8d07ull;
+    static const uint64_t STATE_MARKER_END = 0x7e5c0b2a9f1d4e63ull;
+
+    uint64_t _tables_hash() const {
+        uint64_t h = -1ull;
+        for (auto &tab: {tab1, tab2}) {
+            for (auto v: tab) {
+                h ^= v;
+                h *= 0xcaffee1234abcdefull;
+                h ^= h >> 17;
+            }
+            h += tab.size();
+        }
+        return h;
+    }
+    // Saves keys left, current[], divcore and the shuffle RNG state.
+    // The file is written to filename.tmp and then atomically renamed.
+    void save_state(const char *filename) const {
+        string tmp = string(filename) + ".tmp";
+        FILE *fd = fopen(tmp.c_str(), "w");
+        ensure(fd, "can not open file");
+        _FileGuard guard{fd, tmp};
+
+        std::stringstream ss;
+        ss << rng;
+        string rng_state = ss.str();
+
+        uint64_t header[] = {
+            STATE_VERSION, (uint64_t)n, (uint64_t)r, (uint64_t)m,
+            _tables_hash(), keys_left.size(), rng_state.size(),
+        };
+        ensure(7 == fwrite(header, 8, 7, fd));
+        vector<uint64_t> keys(keys_left.begin(), keys_left.end());
+        ensure(keys.size() == fwrite(keys.data(), 8, keys.size(), fd));
+        ensure(rng_state.size() == fwrite(rng_state.data(), 1, rng_state.size(), fd));
+        for (auto &d: current) {
+            d.data.save_to_file(fd);
+        }
+        divcore.data.save_to_file(fd);
+
+        uint64_t marker = STATE_MARKER_END;
+        ensure(1 == fwrite(&marker, 8, 1, fd));
+        ensure(fflush(fd) == 0 && fsync(fileno(fd)) == 0, "can not write file");
+        guard.fd = NULL;
+        ensure(fclose(fd) == 0, "can not write file");
+        ensure(rename(tmp.c_str(), filename) == 0, "can not rename file");
+        guard.path.clear();
+    }
+    // Restores the state saved by save_state
+    // (the S-boxes and dimensions must be the same).
+    void load_state(const char *filename) {
+        vector<uint64_t> keys;
+        string rng_state;
+        vector<DenseSet> new_current;
+        DenseSet new_divcore;
+        _read_state(filename, keys, rng_state, new_current, new_divcore);
+
+        keys_left.assign(keys.begin(), keys.end());
+        std::stringstream ss(rng_state);
+        ss >> rng;
+        current.swap(new_current);
+        divcore = new_divcore;
     }
-    void process(uint64_t num = -1ull) {
+    // ORs current[] of a state saved by save_state
+    // (e.g. by a run on another shard of the keys) into this one,
+    // call _finalize() after merging to update divcore.
+    // Returns the number of keys left in that state.
+    uint64_t merge_state(const char *filename) {
+        vector<uint64_t> keys;
+        string rng_state;
+        vector<DenseSet> other;
+        DenseSet other_divcore;
+        _read_state(filename, keys, rng_state, other, other_divcore);
+
+        fori (v, current.size()) {
+            current[v] |= other[v];
+        }
+        return keys.size();
+    }
+    void _read_state(
+        const char *filename,
+        vector<uint64_t> &keys, string &rng_state,
+        vector<DenseSet> &new_current, DenseSet &new_divcore
+    ) const {
+        FILE *fd = fopen(filename, "r");
+        ensure(fd, "can not open file");
+        _FileGuard guard{fd, ""};
+
+        uint64_t header[7];
+        ensure(7 == fread(header, 8, 7, fd));
+        ensure(header[0] == STATE_VERSION, "unknown state file version");
+        ensure(
+            header[1] == (uint64_t)n && header[2] == (uint64_t)r
+            && header[3] == (uint64_t)m && header[4] == _tables_hash(),
+            "state file is for a different composition"
+        );
+
+        keys.resize(header[5]);
+        ensure(keys.size() == fread(keys.data(), 8, keys.size(), fd));
+        rng_state.assign(header[6], 0);
+        ensure(rng_state.size() == fread(rng_state.data(), 1, rng_state.size(), fd));
+
+        // no message for each of the 2^m sets
+        bool quiet = BitSet::QUIET;
+        BitSet::set_quiet(true);
+        new_current.assign(current.size(), DenseSet());
+        for (auto &d: new_current) {
+            d.data = BitSet::load_from_file(fd);
+            d.n = n;
+            ensure(d.data.n == 1ull << n, "file format error");
+        }
+        new_divcore = DenseSet(n + m);
+        new_divcore.data = BitSet::load_from_file(fd);
+        BitSet::set_quiet(quiet);
+        ensure(new_divcore.data.n == 1ull << (n + m), "file format error");
+
+        uint64_t marker;
+        ensure(1 == fread(&marker, 8, 1, fd));
+        ensure(marker == STATE_MARKER_END, "file format error");
+    }
+    // Strategies:
+    // "keys": threads process separate keys, each over all v;
+    // "values": v in the outer loop, threads share the keys of the chunk,
+    //     so that current[v] stays in cache (better when the 2^m sets
+    //     of current do not fit in the cache).
+    // n_threads = 0 means OpenMP default
+    void process(
+        uint64_t num = -1ull, int n_threads = 0,
+        const std::string &strategy = "keys"
+    ) {
+        ensure(n_threads >= 0, "number of threads must be non-negative");
+        ensure(
+            strategy == "keys" || strategy == "values",
+            "unknown strategy (keys or values)"
+        );
+        if (n_threads == 0)
+            n_threads = sweep_max_threads();
         num = min(num, keys_left.size());
         vector<uint64_t> keys(keys_left.end() - num, keys_left.end());
         keys_left.erase(keys_left.end() - num, keys_left.end());
-        #pragma omp parallel for
-        for (auto key: keys) {
-            _process_key(key);
+        if (strategy == "keys") {
+            #pragma omp parallel for num_threads(n_threads) schedule(dynamic) if(n_threads > 1)
+            for (auto key: keys) {
+                _process_key(key);
+            }
+        }
+        else {
+            _process_keys_by_value(keys, n_threads);
         }
         _finalize();
     }
-    void _process_key(uint64_t key) {
+    // single bit products
+    // NOTE: reverse order (LSB to MSB)
+    vector<DenseSet> _single_products(uint64_t key) const {
         vector<DenseSet> products(m, DenseSet(n));
-
-        // compute single bit products
-        // could compute all products in linear time
-        // but increases memory usage
-        // NOTE: reverse order (LSB to MSB)
         fori (i, m) {
             fori (x, 1ull << n) {
                 uint64_t y = tab2[tab1[x] ^ key];
@@ -85,14 +255,19 @@ struct T_DivCore_StrongComposition {
                 products[i].set(x, bit);
             }
         }
-
-        // alternative idea to improve cache usage:
-        // precompute products say for current bunch of keys
-        // iterate over v
-        // inside each v run omp-for over keys
-        // every thread works with one local func and one global func same for all threads
+        return products;
+    }
+    void _process_key(uint64_t key) {
+        auto products = _single_products(key);
 
         DenseSet cur(n);
+        uint64_t stack_bytes = (m + 1) * _ones.data.nwords() * 8;
+        if (stack_bytes <= products_memory_cap) {
+            vector<DenseSet> stack(m + 1, _ones);
+            _process_subtree(products, stack, cur, 0, 0);
+            return;
+        }
+
         fori (v, 1ull << m) {
             cur = _ones;
             auto tmp = v;
@@ -102,13 +277,108 @@ struct T_DivCore_StrongComposition {
                 }
                 tmp >>= 1;
             }
+            _process_product(v, cur);
+        }
+    }
+    // stack[depth] is the product for v,
+    // children of v add a bit above its top bit
+    void _process_subtree(
+        const vector<DenseSet> &products, vector<DenseSet> &stack,
+        DenseSet &cur, uint64_t v, int depth
+    ) {
+        cur = stack[depth];
+        _process_product(v, cur);
+
+        int top = v ? 64 - __builtin_clzll(v) : 0;
+        fori (i, top, m) {
+            _and_into(stack[depth + 1], stack[depth], products[i]);
+            _process_subtree(products, stack, cur, v | (1ull << i), depth + 1);
+        }
+    }
+    void _process_keys_by_value(const vector<uint64_t> &keys, int n_threads) {
+        uint64_t K = keys.size();
+        vector<vector<DenseSet>> products(K);
+        #pragma omp parallel for num_threads(n_threads) schedule(dynamic) if(n_threads > 1)
+        for (uint64_t k = 0; k < K; k++) {
+            products[k] = _single_products(keys[k]);
+        }
+
+        // product stacks of all keys (see products_memory_cap)
+        vector<vector<DenseSet>> stacks;
+        uint64_t stack_bytes = K * (m + 1) * _ones.data.nwords() * 8;
+        if (stack_bytes <= products_memory_cap) {
+            stacks.assign(K, vector<DenseSet>(m + 1, _ones));
+        }
 
+        #pragma omp parallel num_threads(n_threads) if(n_threads > 1)
+        {
+            DenseSet cur(n);
+            DenseSet acc(n);
+            _value_subtree(products, stacks, cur, acc, 0, 0, 0);
+        }
+    }
+    // run by all threads of the team:
+    // each thread accumulates products of its keys for v in acc,
+    // static schedule keeps each key (and its stack) on the same thread
+    void _value_subtree(
+        const vector<vector<DenseSet>> &products,
+        vector<vector<DenseSet>> &stacks,
+        DenseSet &cur, DenseSet &acc, uint64_t v, int depth, int bit
+    ) {
+        acc.empty();
+        #pragma omp for schedule(static) nowait
+        for (uint64_t k = 0; k < products.size(); k++) {
+            if (stacks.empty()) {
+                cur = _ones;
+                fori (i, m) {
+                    if ((v >> i) & 1) {
+                        cur &= products[k][i];
+                    }
+                }
+            }
+            else {
+                auto &stack = stacks[k];
+                if (depth) {
+                    _and_into(stack[depth], stack[depth - 1], products[k][bit]);
+                }
+                cur = stack[depth];
+            }
             cur.do_Mobius();
+            acc |= cur;
+        }
+        _atomic_or(current[v], acc);
 
-            // TBD: maybe make maxset here and iterate over support?
+        int top = v ? 64 - __builtin_clzll(v) : 0;
+        fori (i, top, m) {
+            _value_subtree(products, stacks, cur, acc, v | (1ull << i), depth + 1, i);
+        }
+    }
+    // cur is the product of coordinates for v (destroyed)
+    void _process_product(uint64_t v, DenseSet &cur) {
+        cur.do_Mobius();
 
-            #pragma omp critical(orthings)
-            current[v] |= cur;
+        // TBD: maybe make maxset here and iterate over support?
+
+        _atomic_or(current[v], cur);
+    }
+    // dst = a & b in one pass
+    static void _and_into(DenseSet &dst, const DenseSet &a, const DenseSet &b) {
+        uint64_t *d = dst.data.data.data();
+        const uint64_t *pa = a.data.data.data();
+        const uint64_t *pb = b.data.data.data();
+        fori (i, dst.data.nwords()) {
+            d[i] = pa[i] & pb[i];
+        }
+    }
+    // dst |= src, safe against concurrent calls (word-wise atomic OR);
+    // words adding nothing new are skipped without a write
+    static void _atomic_or(DenseSet &dst, const DenseSet &src) {
+        uint64_t *d = dst.data.data.data();
+        const uint64_t *s = src.data.data.data();
+        fori (i, dst.data.nwords()) {
+            if (s[i] & ~__atomic_load_n(&d[i], __ATOMIC_RELAXED)) {
+                __atomic_fetch_or(&d[i], s[i], __ATOMIC_RELAXED);
+            }
         }
     }
     void _finalize() {
@@ -0,0 +1,205 @@
+#pragma once
+
+#include <unordered_map>
+#include <unordered_set>
+#include <algorithm>
+
+#include "hackycpp.h"
+
+#include "DenseSet.hpp"
+#include "Sbox.hpp"
+
+/*
+Native version of divcore_peekanfs.SboxPeekANFs.compute
+(DivCore computation by peeking ANFs of coordinate products).
+Vectors (u,v) are packed as uint64 (u << n) | v,
+so that n can be at most 32.
+*/
+template<typename T>
+struct T_SboxPeekANFs {
+    int n;
+    T_Sbox<T> sbox;
+    T_Sbox<T> isbox;
+
+    uint64_t n_queries;
+    // results of compute()
+    std::vector<uint64_t> divcore;
+    std::vector<uint64_t> invalid_max;
+
+    T_SboxPeekANFs(const T_Sbox<T> &_sbox)
+    : T_SboxPeekANFs(_sbox, _sbox.inverse()) {}
+
+    T_SboxPeekANFs(const T_Sbox<T> &_sbox, const T_Sbox<T> &_isbox)
+    : n(_sbox.n), sbox(_sbox), isbox(_isbox), n_queries(0) {
+        ensure(sbox.n == sbox.m, "only n-bit to n-bit S-boxes are supported");
+        ensure(isbox.n == n && isbox.m == n, "inverse S-box dimensions mismatch");
+        ensure(n <= 32, "n > 32 is not supported");
+    }
+
+    // minimal monomials (u,v) of ANF of product of coordinates given by mask
+    std::vector<uint64_t> run_mask(uint64_t mask, bool inverse) {
+        n_queries++;
+        return _run_mask(mask, inverse);
+    }
+    std::vector<uint64_t> _run_mask(uint64_t mask, bool inverse) const {
+        ensure(mask < (1ull << n));
+        auto &s = inverse ? isbox : sbox;
+        DenseSet func = s.coordinate_product(mask);
+        func.do_ParitySet();
+        func.do_MinSet();
+        std::vector<uint64_t> ret;
+        for (auto u: func.get_support()) {
+            if (inverse)
+                ret.push_back((mask << n) | u);
+            else
+                ret.push_back((u << n) | mask);
+        }
+        return ret;
+    }
+
+    // With n_threads != 1, whole priority levels are drained at once
+    // and their distinct (mask, inverse) queries are run in parallel
+    // (n_threads = 0 means OpenMP default).
+    // This may run a few more queries than the sequential order,
+    // the result is the same.
+    void compute(int n_threads = 1) {
+        ensure(n_threads >= 0, "number of threads must be non-negative");
+        if (n_threads == 0)
+            n_threads = sweep_max_threads();
+        uint64_t vmask = (1ull << n) - 1;
+        uint64_t umask = vmask << n;
+
+        // set of parity1 vectors (possibly redundant)
+        std::unordered_set<uint64_t> parity1 = {umask, vmask};
+        std::unordered_set<uint64_t> dc = parity1;
+        // neighbor counter
+        std::unordered_map<uint64_t, uint32_t> cnt;
+        // masks already run: (mask << 1) | inverse
+        std::unordered_set<uint64_t> masks_run;
+
+        // maximal vectors below divcore = maximal vectors of I_S
+        std::unordered_set<uint64_t> imax;
+        fori(i, n) {
+            imax.insert(umask ^ (1ull << (n + i)));
+            imax.insert(vmask ^ (1ull << i));
+        }
+
+        // bucket queue by priority (min(w1,w2), max(w1,w2)),
+        // priorities of pushed vectors are strictly increasing
+        // with respect to the popped one, so a monotone cursor suffices
+        std::vector<std::vector<uint64_t>> queue((n + 1) * (n + 1));
+        auto prio = [&] (uint64_t uv) -> int {
+            int w1 = hw(uv >> n);
+            int w2 = hw(uv & vmask);
+            return min(w1, w2) * (n + 1) + max(w1, w2);
+        };
+
+        fori(i, n) {
+            fori(j, n) {
+                uint64_t uv = (1ull << (n + i)) | (1ull << j);
+                queue[prio(uv)].push_back(uv);
+                cnt[uv] = 0;
+                imax.insert(uv);
+            }
+        }
+
+        // (u,v) -> query key (mask << 1) | inverse
+        auto query = [&] (uint64_t uv) -> uint64_t {
+            uint64_t u = uv >> n;
+            uint64_t v = uv & vmask;
+            bool inverse = hw(u) < hw(v);
+            uint64_t mask = inverse ? u : v;
+            return (mask << 1) | inverse;
+        };
+        auto run_queries = [&] (const std::vector<uint64_t> &keys) {
+            std::vector<std::vector<uint64_t>> res(keys.size());
+            #pragma omp parallel for num_threads(n_threads) schedule(dynamic) if(n_threads > 1)
+            for (size_t i = 0; i < keys.size(); i++) {
+                res[i] = _run_mask(keys[i] >> 1, keys[i] & 1);
+            }
+            n_queries += keys.size();
+            for (auto &lst: res) {
+                for (auto uv1: lst) {
+                    parity1.insert(uv1);
+                }
+            }
+        };
+
+        std::vector<uint64_t> level;
+        for (size_t cur = 0; cur < queue.size(); ) {
+            if (queue[cur].empty()) {
+                cur++;
+                continue;
+            }
+            level.clear();
+            if (n_threads == 1) {
+                level.push_back(queue[cur].back());
+                queue[cur].pop_back();
+            }
+            else {
+                // new vectors go to higher levels, so the level is final
+                std::swap(level, queue[cur]);
+
+                std::vector<uint64_t> keys;
+                for (auto uv: level) {
+                    if (parity1.count(uv))
+                        continue;
+                    uint64_t key = query(uv);
+                    if (!masks_run.count(key)) {
+                        masks_run.insert(key);
+                        keys.push_back(key);
+                    }
+                }
+                run_queries(keys);
+            }
+
+            for (auto uv: level) {
+                if (parity1.count(uv)) {
+                    dc.insert(uv);
+                    imax.erase(uv);
+                    continue;
+                }
+
+                // check if already evaluated
+                uint64_t key = query(uv);
+                if (!masks_run.count(key)) {
+                    masks_run.insert(key);
+                    run_queries({key});
+
+                    if (parity1.count(uv)) {
+                        // case of parity 1
+                        dc.insert(uv);
+                        imax.erase(uv);
+                        continue;
+                    }
+                }
+
+                // case of parity zero
+                fori(i, 2*n) {
+                    uint64_t bit = 1ull << i;
+                    if (uv & bit) {
+                        // mark downwards as not maximal
+                        imax.erase(uv ^ bit);
+                        continue;
+                    }
+
+                    uint64_t uv2 = uv | bit;
+                    uint32_t c = ++cnt[uv2];
+
+                    int w1 = hw(uv2 >> n);
+                    int w2 = hw(uv2 & vmask);
+                    uint32_t need = (w1 > 1 ? w1 : 0) + (w2 > 1 ? w2 : 0);
+                    if (c == need) {
+                        queue[prio(uv2)].push_back(uv2);
+                        imax.insert(uv2);
+                    }
+                }
+            }
+        }
+
+        divcore.assign(dc.begin(), dc.end());
+        invalid_max.assign(imax.begin(), imax.end());
+        sort(divcore.begin(), divcore.end());
+        sort(invalid_max.begin(), invalid_max.end());
+    }
+};
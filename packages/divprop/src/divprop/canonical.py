@@ -0,0 +1,122 @@
+"""
+Canonical representatives of S-boxes up to XOR constants on the input and
+the output and bit permutations of the input and the output.
+
+The division core is a function of the ANF of the graph
+{(x, S(x))} (maximal monomials), which does not change under
+translations of the graph and is permuted along with the coordinates:
+for C(x) = Q(S(P(x) ^ a)) ^ b,
+    DivCore(C) = {(P^-1(u), Q(v)) : (u, v) in DivCore(S)},
+so the division core of the whole class is computed once
+(on the representative) and remapped.
+"""
+
+from subsets import DenseSet
+
+from divprop import Sbox
+
+
+# bit permutations are tried for S-boxes up to this number of bits
+# (the n! * m! candidates cost more than the division core beyond)
+PERMS_MAX_BITS = 5
+
+
+def _permute_bits(perm, x):
+    """bit i of the result is bit perm[i] of x"""
+    ret = 0
+    for i, j in enumerate(perm):
+        ret |= ((x >> j) & 1) << i
+    return ret
+
+
+def _unpermute_bits(perm, x):
+    """inverse of _permute_bits: bit perm[i] of the result is bit i of x"""
+    ret = 0
+    for i, j in enumerate(perm):
+        ret |= ((x >> i) & 1) << j
+    return ret
+
+
+class SboxTransform:
+    """
+    Map of S-boxes S -> C, C(x) = Q(S(P(x) ^ a)) ^ b,
+    where bit i of P(x) is bit perm_in[i] of x
+    and bit i of Q(y) is bit perm_out[i] of y.
+    """
+    def __init__(self, n, m, a=0, b=0, perm_in=None, perm_out=None):
+        self.n = int(n)
+        self.m = int(m)
+        self.a = int(a)
+        self.b = int(b)
+        self.perm_in = tuple(range(n) if perm_in is None else map(int, perm_in))
+        self.perm_out = tuple(range(m) if perm_out is None else map(int, perm_out))
+        assert sorted(self.perm_in) == list(range(self.n))
+        assert sorted(self.perm_out) == list(range(self.m))
+
+    @classmethod
+    def from_params(cls, n, m, params):
+        """From the result of Sbox.canonical_transform"""
+        params = list(params)
+        assert len(params) == 2 + n + m
+        return cls(n, m, params[0], params[1], params[2:2+n], params[2+n:])
+
+    def __repr__(self):
+        return (
+            f"<SboxTransform n={self.n} m={self.m} a={self.a:#x} b={self.b:#x}"
+            f" perm_in={self.perm_in} perm_out={self.perm_out}>"
+        )
+
+    @property
+    def is_translation(self):
+        """No bit permutations (the division core is unchanged)"""
+        return (
+            self.perm_in == tuple(range(self.n))
+            and self.perm_out == tuple(range(self.m))
+        )
+
+    def apply(self, sbox: Sbox):
+        assert (sbox.n, sbox.m) == (self.n, self.m)
+        return sbox.transformed(
+            list(self.perm_in), self.a, list(self.perm_out), self.b,
+        )
+
+    def divcore_forward(self, divcore: DenseSet):
+        """DivCore(C) from DivCore(S)"""
+        return self._remap(divcore, forward=True)
+
+    def divcore_backward(self, divcore: DenseSet):
+        """DivCore(S) from DivCore(C)"""
+        return self._remap(divcore, forward=False)
+
+    def _remap(self, divcore, forward):
+        n, m = self.n, self.m
+        assert divcore.n == n + m
+        if self.is_translation:
+            return divcore.copy()
+
+        mask_v = (1 << m) - 1
+        ret = []
+        for uv in divcore:
+            u, v = uv >> m, uv & mask_v
+            if forward:
+                u = _unpermute_bits(self.perm_in, u)
+                v = _permute_bits(self.perm_out, v)
+            else:
+                u = _permute_bits(self.perm_in, u)
+                v = _unpermute_bits(self.perm_out, v)
+            ret.append((u << m) | v)
+        return DenseSet(n + m, ret)
+
+
+def canonical_form(sbox: Sbox, perms=None):
+    """
+    (C, transform): the canonical representative C of the class of sbox
+    (lexicographically smallest table) and the map sbox -> C.
+    perms: include bit permutations
+    (default: S-boxes up to PERMS_MAX_BITS bits, XOR constants only beyond)
+    """
+    if perms is None:
+        perms = max(sbox.n, sbox.m) <= PERMS_MAX_BITS
+    params = sbox.canonical_transform(bool(perms))
+    transform = SboxTransform.from_params(sbox.n, sbox.m, params)
+    return transform.apply(sbox), transform
@@ -1,9 +1,13 @@
+import os
 from collections import defaultdict
+from contextlib import nullcontext
 from queue import PriorityQueue
 
 from binteger import Bin
 
 from divprop import Sbox
+from divprop.lib import SboxPeekANFs_classes
+from divprop.utils import fork_pool, pool_shared
 
 import logging
 
@@ -14,6 +18,32 @@ def half_lens(fset, n):
     return l, r
 
 
+def fset_query(fset, n):
+    """(mask, inverse) query to evaluate for the vector fset"""
+    w1, w2 = half_lens(fset, n)
+    inverse = w1 < w2
+    mask = Bin(fset, 2*n).int
+    if inverse:
+        mask >>= n
+    else:
+        mask &= 2**n-1
+    return mask, inverse
+
+
+def _pool_run_mask(query):
+    mask, inverse = query
+    return pool_shared().run_mask(mask, inverse=inverse)
+
+
+def resolve_workers(workers):
+    """None -> 1 (sequential), 0 or negative -> number of CPUs"""
+    if workers is None:
+        return 1
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
 class SboxPeekANFs:
     """
     Advanced algorithm for DivCore computation,
@@ -28,13 +58,49 @@ class SboxPeekANFs:
         self.sbox = sbox
         self.isbox = ~sbox if isbox is None else isbox
 
-    def compute(self, debug=False):
+    def compute(self, debug=False, native=None, workers=None):
         """
         Returns:
             divcore (set(Bin))
             invalid_max (set(Bin))
+
+        The exploration runs in C++ (SboxPeekANFs8/16/32/64)
+        unless run_mask/get_product are overridden
+        (or native=False is given).
+
+        With workers > 1 (or 0 for all CPUs), each priority level
+        is drained at once and its distinct (mask, inverse) queries
+        are evaluated concurrently
+        (OpenMP threads in C++, forked processes in Python).
         """
+        if native is None:
+            native = (
+                type(self).run_mask is SboxPeekANFs.run_mask
+                and type(self).get_product is SboxPeekANFs.get_product
+                and type(self.sbox) in SboxPeekANFs_classes
+                and type(self.isbox) is type(self.sbox)
+                and self.n <= 32
+            )
+        if native:
+            return self.compute_native(workers=workers)
+        return self.compute_python(workers=workers)
+
+    def compute_native(self, workers=None):
+        n = self.n
+        engine = SboxPeekANFs_classes[type(self.sbox)](self.sbox, self.isbox)
+        engine.compute(resolve_workers(workers))
+        self.n_queries += engine.n_queries
+        divcore = {Bin(v, 2*n) for v in engine.divcore}
+        invalid_max = {Bin(v, 2*n) for v in engine.invalid_max}
+        return divcore, invalid_max
 
+    def compute_python(self, workers=None):
+        workers = resolve_workers(workers)
+        pool = fork_pool(workers, self) if workers > 1 else nullcontext()
+        with pool as pool:
+            return self._compute_python(pool)
+
+    def _compute_python(self, pool=None):
         n = self.n
 
         # initialize set of parity1 vectors (possibly redundant)
@@ -75,57 +141,70 @@ class SboxPeekANFs:
                 cnt[fset] = 0
                 invalid_max.add(fset)
 
-        while q.qsize():
-            _, fset = q.get()
-            if fset in parity1:
-                divcore.add(fset)
-                invalid_max.discard(fset)
-                continue
-
-            # choose side to evaluate
-            w1, w2 = half_lens(fset, n)
-            inverse = w1 < w2
-            mask = Bin(fset, 2*n).int
-            if inverse:
-                mask >>= n
-            else:
-                mask &= 2**n-1
-
-            # check if already evaluated
-            if (mask, inverse) not in masks_run:
-                masks_run.add((mask, inverse))
-
-                res = self.run_mask(mask, inverse=inverse)
-                parity1.update({
-                    frozenset(Bin(uv, 2*n).support)
-                    for uv in res
-                })
+        def add_parity1(res):
+            parity1.update({
+                frozenset(Bin(uv, 2*n).support)
+                for uv in res
+            })
 
+        while q.qsize():
+            prio, fset = q.get()
+            level = [fset]
+            if pool is not None:
+                # new vectors go to higher levels, so the level is final
+                while q.qsize() and q.queue[0][0] == prio:
+                    level.append(q.get()[1])
+
+                queries = []
+                for fset in level:
+                    if fset in parity1:
+                        continue
+                    query = fset_query(fset, n)
+                    if query not in masks_run:
+                        masks_run.add(query)
+                        queries.append(query)
+                for res in pool.map(_pool_run_mask, queries):
+                    self.n_queries += 1
+                    add_parity1(res)
+
+            for fset in level:
                 if fset in parity1:
-                    # case of parity 1
                     divcore.add(fset)
                     invalid_max.discard(fset)
                     continue
 
-            # case of parity zero
-            for i in range(2*n):
-                if i in fset:
-                    # mark downwards as not maximal
-                    fset2 = fset - {i}
-                    invalid_max.discard(fset2)
-                    continue
-
-                fset2 = fset | {i}
-                assert len(fset2) == len(fset) + 1
-                cnt[fset2] += 1
-
-                w1, w2 = half_lens(fset2, n)
-                need = w1 if w1 > 1 else 0
-                need += w2 if w2 > 1 else 0
-                if cnt[fset2] == need:
-                    prio = min(w1, w2), max(w1, w2)
-                    q.put((prio, fset2))
-                    invalid_max.add(fset2)
+                # check if already evaluated
+                mask, inverse = fset_query(fset, n)
+                if (mask, inverse) not in masks_run:
+                    masks_run.add((mask, inverse))
+
+                    add_parity1(self.run_mask(mask, inverse=inverse))
+
+                    if fset in parity1:
+                        # case of parity 1
+                        divcore.add(fset)
+                        invalid_max.discard(fset)
+                        continue
+
+                # case of parity zero
+                for i in range(2*n):
+                    if i in fset:
+                        # mark downwards as not maximal
+                        fset2 = fset - {i}
+                        invalid_max.discard(fset2)
+                        continue
+
+                    fset2 = fset | {i}
+                    assert len(fset2) == len(fset) + 1
+                    cnt[fset2] += 1
+
+                    w1, w2 = half_lens(fset2, n)
+                    need = w1 if w1 > 1 else 0
+                    need += w2 if w2 > 1 else 0
+                    if cnt[fset2] == need:
+                        prio = min(w1, w2), max(w1, w2)
+                        q.put((prio, fset2))
+                        invalid_max.add(fset2)
 
         divcore = {Bin(v, 2*n) for v in divcore}
         invalid_max = {Bin(v, 2*n) for v in invalid_max}
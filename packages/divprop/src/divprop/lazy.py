@@ -0,0 +1,104 @@
+"""
+Lazy evaluation of DenseSet pipelines.
+
+A SetGraph holds expressions: leaves (sets given by functions)
+and in-place operations (a do_* method with arguments) applied to
+another expression. Equal expressions are created once,
+so that pipelines sharing a prefix share its evaluation.
+
+evaluate() computes a batch of outputs over the needed part of the graph,
+in depth-first order:
+an operation works in place on the value of its argument
+when it is the last consumer of it (no copy), and on a copy otherwise;
+intermediate values are dropped as soon as all their consumers are done.
+Leaf values are never modified.
+"""
+
+
+class SetExpr:
+    __slots__ = ("key", "parent", "method", "args", "func", "value", "owned")
+
+    def __init__(self, key, parent=None, method=None, args=(), func=None):
+        self.key = key
+        self.parent = parent
+        self.method = method
+        self.args = args
+        self.func = func
+        self.value = None
+        # value may be modified (not a leaf value)
+        self.owned = False
+
+    @property
+    def is_leaf(self):
+        return self.parent is None
+
+    def __repr__(self):
+        if self.is_leaf:
+            return f"<SetExpr {self.key}>"
+        return f"<SetExpr {self.method}{self.args} of {self.parent!r}>"
+
+
+class SetGraph:
+    def __init__(self):
+        self.nodes = {}
+        self.n_copies = 0
+        self.n_ops = 0
+
+    def leaf(self, key, func):
+        """Expression of the set func() (not modified by evaluation)"""
+        if key not in self.nodes:
+            self.nodes[key] = SetExpr(key, func=func)
+        return self.nodes[key]
+
+    def apply(self, parent, method, *args):
+        """Expression of parent.copy().method(*args) (method is a do_* method)"""
+        key = (parent.key, method, args)
+        if key not in self.nodes:
+            self.nodes[key] = SetExpr(key, parent=parent, method=method, args=args)
+        return self.nodes[key]
+
+    def evaluate(self, outputs):
+        """List of values of the outputs (owned by the caller)"""
+        # number of consumers in this batch (outputs count as consumers)
+        refs = {}
+        order = []
+
+        def visit(node):
+            if node.key in refs:
+                refs[node.key] += 1
+                return
+            refs[node.key] = 1
+            if not node.is_leaf:
+                visit(node.parent)
+            order.append(node)
+
+        for node in outputs:
+            visit(node)
+
+        try:
+            for node in order:
+                if node.is_leaf:
+                    node.value = node.func()
+                    node.owned = False
+                    continue
+
+                parent = node.parent
+                if parent.owned and refs[parent.key] == 1:
+                    # last consumer: work in place
+                    value = parent.value
+                else:
+                    value = parent.value.copy()
+                    self.n_copies += 1
+                getattr(value, node.method)(*node.args)
+                self.n_ops += 1
+                node.value = value
+                node.owned = True
+
+                refs[parent.key] -= 1
+                if refs[parent.key] == 0:
+                    parent.value = None
+            return [node.value for node in outputs]
+        finally:
+            for node in order:
+                node.value = None
+                node.owned = False
@@ -31,6 +31,8 @@
 #include "DenseSet.hpp"
 #include "DivCore.hpp"
 #include "Sbox.hpp"
+#include "SboxFiles.hpp"
+#include "PeekANFs.hpp"
 %}
 
 %pythoncode %{
@@ -39,6 +41,8 @@
 
 %include "DivCore.hpp"
 %include "Sbox.hpp"
+%include "SboxFiles.hpp"
+%include "PeekANFs.hpp"
 
 %template(Sbox8) T_Sbox<uint8_t>;
 %template(Sbox16) T_Sbox<uint16_t>;
@@ -71,6 +75,19 @@ class Sbox(Sbox64):
         return cls(data, n, m)
 %}
 
+%template(SboxPeekANFs8) T_SboxPeekANFs<uint8_t>;
+%template(SboxPeekANFs16) T_SboxPeekANFs<uint16_t>;
+%template(SboxPeekANFs32) T_SboxPeekANFs<uint32_t>;
+%template(SboxPeekANFs64) T_SboxPeekANFs<uint64_t>;
+%pythoncode %{
+SboxPeekANFs_classes = {
+    Sbox8: SboxPeekANFs8,
+    Sbox16: SboxPeekANFs16,
+    Sbox32: SboxPeekANFs32,
+    Sbox64: SboxPeekANFs64,
+}
+%}
+
 %template(DivCore_StrongComposition8) T_DivCore_StrongComposition<uint8_t>;
 %template(DivCore_StrongComposition16) T_DivCore_StrongComposition<uint16_t>;
 %template(DivCore_StrongComposition32) T_DivCore_StrongComposition<uint32_t>;
@@ -1,8 +1,11 @@
+import os
+import time
 import logging
 
 from binteger import Bin
 
 from divprop.lib import Sbox, Sbox8
+from divprop.utils import fork_pool, pool_shared
 from divprop.sboxdiv import (
     DivCore_StrongComposition8,
     DivCore_StrongComposition16,
@@ -14,6 +17,33 @@ from divprop.sboxdiv import (
 log = logging.getLogger(__name__)
 
 
+def l3_cache_size(default=32 << 20):
+    """Size of the last level cache in bytes (default if unknown)"""
+    try:
+        size = os.sysconf("SC_LEVEL3_CACHE_SIZE")
+        if size > 0:
+            return size
+    except (ValueError, OSError):
+        pass
+    try:
+        with open("/sys/devices/system/cpu/cpu0/cache/index3/size") as f:
+            size = f.read().strip()
+        units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+        if size[-1] in units:
+            return int(size[:-1]) * units[size[-1]]
+        return int(size)
+    except (OSError, ValueError, IndexError):
+        return default
+
+
+def _pool_compute_component(task):
+    mask, filename, kwargs = task
+    snd = pool_shared()
+    snd = Sandwich(snd.part1, snd.part2, keys=snd.keys, mask=mask)
+    divcore = snd.compute_divcore(filename=filename, resume=True, **kwargs)
+    return mask, divcore
+
+
 class Sandwich:
     """Computing DivCore for two S-boxes with xor key in-between."""
 
@@ -33,6 +63,7 @@ class Sandwich:
         else:
             self.m = 1
             assert 0 <= mask < 2**part2.n
+        self.mask = mask
         self.part1 = part1
         if keys is None:
             self.keys = tuple(range(2**self.r))
@@ -47,7 +78,73 @@ class Sandwich:
             table = [mask.scalar_bin(y) for y in part2]
             self.part2 = Sbox8(table, part2.n, 1)
 
-    def compute_divcore(self, chunk=128, filename=None):
+    def shard(self, index, n_shards):
+        """
+        Same Sandwich restricted to the shard index/n_shards of the keys
+        (each shard gets at least one key)
+        """
+        assert 0 <= index < n_shards
+        if n_shards > len(self.keys):
+            raise ValueError(
+                f"{n_shards} shards for {len(self.keys)} keys"
+                " (empty shards have no state to merge)"
+            )
+        ret = object.__new__(type(self))
+        ret.__dict__.update(self.__dict__)
+        ret.keys = self.keys[index::n_shards]
+        return ret
+
+    def merge_shards(self, state_files, partial=False):
+        """
+        DivCore from the checkpoints (filename + ".state")
+        of compute_divcore runs on shards of the keys.
+        Shards with keys left are an error unless partial=True.
+        """
+        DCS = self.make_composition()
+        for state_file in state_files:
+            n_left = DCS.merge_state(state_file)
+            log.info(f"merged {state_file} ({n_left} keys left)")
+            if n_left and not partial:
+                raise ValueError(f"shard {state_file} is not finished")
+        DCS._finalize()
+        return DCS.divcore
+
+    def iter_components(
+        self, masks, path, workers=None, n_threads=1, chunk=128,
+        strategy=None,
+    ):
+        """
+        Computes DivCores of the components given by masks
+        (as Sandwich(..., mask=mask)) in a pool of forked processes
+        sharing the tables, n_threads OpenMP threads each.
+        Yields (mask, divcore) as they finish.
+        Results and checkpoints go to path/mask_<mask>.*,
+        so that an interrupted batch resumes.
+        """
+        assert self.mask is None, "components of a full Sandwich only"
+        os.makedirs(path, exist_ok=True)
+        width = (self.part2.m + 3) // 4
+        kwargs = dict(chunk=chunk, n_threads=n_threads, strategy=strategy)
+        tasks = [
+            (mask, os.path.join(path, f"mask_{mask:0{width}x}"), kwargs)
+            for mask in masks
+        ]
+        if workers is None or workers <= 0:
+            workers = os.cpu_count() or 1
+
+        with fork_pool(workers, self) as pool:
+            for i, (mask, divcore) in enumerate(
+                pool.imap_unordered(_pool_compute_component, tasks), 1
+            ):
+                log.info(f"component {i}/{len(tasks)} mask {mask:x}: {divcore}")
+                yield mask, divcore
+
+    def compute_components(self, masks, path, **kwargs):
+        """dict mask -> DivCore, see iter_components"""
+        return dict(self.iter_components(masks, path, **kwargs))
+
+    def make_composition(self):
+        """DivCore_StrongComposition instance with all keys left"""
         sz = min(self.part1.ENTRY_SIZE, self.part2.ENTRY_SIZE)
         if sz <= 1:
             cls = DivCore_StrongComposition8
@@ -65,18 +162,66 @@ class Sandwich:
         )
         DCS.set_keys(self.keys)
         DCS.shuffle()
+        return DCS
+
+    def pick_strategy(self):
+        """
+        "values" (v-outer loop) when the 2^m accumulated sets
+        do not fit in the L3 cache, "keys" otherwise
+        """
+        current_bytes = 2**self.m * max(8, 2**self.n // 8)
+        if current_bytes > l3_cache_size():
+            return "values"
+        return "keys"
+
+    def compute_divcore(
+        self, chunk=128, filename=None, n_threads=0, strategy=None,
+        resume=False, checkpoint_interval=600,
+    ):
+        """
+        n_threads: OpenMP threads processing keys (0: default)
+        strategy: "keys" or "values" (see DivCore_StrongComposition.process),
+            picked automatically by default
+        resume: restart from the checkpoint filename + ".state" if it exists
+        checkpoint_interval: minimal time (seconds) between checkpoints
+            of the full state to filename + ".state" (0: after each chunk),
+            each one rewrites all 2^m sets; the final state is always saved
+        """
+        DCS = self.make_composition()
+        if strategy is None:
+            strategy = self.pick_strategy()
+
+        state_file = filename + ".state" if filename else None
+        if resume:
+            assert filename, "resume requires a filename"
+            if os.path.isfile(state_file):
+                DCS.load_state(state_file)
+                log.info(
+                    f"resumed from {state_file}:"
+                    f" {len(DCS.keys_left)}/{len(self.keys)} keys left"
+                )
 
         log.info(
             f"processing Sandwich({self.n},{self.r},{self.m})"
-            f" with {len(self.keys)} keys, saving to {filename}"
+            f" with {len(self.keys)} keys ({strategy} strategy),"
+            f" saving to {filename}"
         )
-        n_done = 0
+        n_done = len(self.keys) - len(DCS.keys_left)
+        last_checkpoint = time.time()
         while len(DCS.keys_left):
-            DCS.process(chunk)
-            n_done += chunk
+            DCS.process(chunk, n_threads, strategy)
+            n_done = len(self.keys) - len(DCS.keys_left)
             log.info(f"done {n_done}/{len(self.keys)}: {DCS.divcore}")
             if filename:
                 DCS.divcore.save_to_file(filename + ".set")
                 with open(filename + ".dim", "w") as f:
                     print(self.n, self.m, file=f)
+
+                now = time.time()
+                if (
+                    now - last_checkpoint >= checkpoint_interval
+                    or not len(DCS.keys_left)
+                ):
+                    DCS.save_state(state_file)
+                    last_checkpoint = now
         return DCS.divcore
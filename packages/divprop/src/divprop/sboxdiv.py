@@ -6,7 +6,10 @@ from optisolveapi.vector import Vector
 from subsets import DenseSet
 
 from divprop import Sbox
-from divprop.utils import cached_method
+from divprop.utils import cached_method, get_store
+from divprop.store import sbox_digest, denseset_digest
+from divprop.lazy import SetGraph
+from divprop.canonical import canonical_form
 
 from divprop.lib import (
     DivCore_StrongComposition,
@@ -24,12 +27,17 @@ def make_mask(m):
 
 class SboxDivision:
     CACHE = None
+    # divcore is computed on the canonical representative of the S-box
+    # up to input/output XOR constants and bit permutations
+    # (cached under its key, shared by the class) and remapped
+    CANONICAL = False
+    _is_canonical = False
 
     log = logging.getLogger()
 
     def __init__(self, sbox: Sbox):
         self.sbox = sbox
-        self.cache_key = "sbox%016X" % sbox.get_hash()  # too small hash?
+        self.cache_key = "sbox_sha256_" + sbox_digest(sbox)
 
         self.n = int(sbox.n)
         self.m = int(sbox.m)
@@ -51,19 +59,25 @@ class SboxDivision:
         self.mask_u = make_mask(self.n) << self.m
         self.mask_v = make_mask(self.m)
 
-        self.cache_key = "divcore%016X" % divcore.get_hash()  # too small hash?
+        self.cache_key = "divcore_sha256_" + denseset_digest(divcore)
         f = cls.divcore.fget
-        f._cache[f._calc_key(self)] = divcore
+        # the cached copy is frozen and shared
+        f._cache[f._calc_key(self)] = divcore.copy()
         assert self.divcore == divcore
         return self
 
     @property
     @cached_method
     def divcore(self):
+        if self.CANONICAL and not self._is_canonical:
+            canon, transform = canonical_form(self.sbox)
+            rep = type(self)(canon)
+            rep._is_canonical = True
+            if rep.cache_key != self.cache_key:
+                return transform.divcore_backward(rep.divcore)
+
         ret = self.sbox.graph_dense()
-        ret.do_Mobius()
-        ret.do_MaxSet()
-        ret.do_Not()
+        ret.do_DivCore()  # fused Mobius -> MaxSet -> Not
         return ret
 
     @property
@@ -110,10 +124,7 @@ class SboxDivision:
     @property
     @cached_method
     def minimal(self):
-        ret = self.divcore.copy()
-        ret.do_UpperSet(self.mask_u)
-        ret.do_MinSet(self.mask_v)
-        return ret
+        return self.divcore.UpperSet_MinSet(self.mask_u, self.mask_v)
 
     @property
     @cached_method
@@ -124,19 +135,86 @@ class SboxDivision:
     @property
     @cached_method
     def full_dppt(self):
-        ret = self.divcore.copy()
-        ret.do_UpperSet()
-        ret.do_Not(self.mask_u)
-        return ret
+        return self.divcore.UpperSet_Not(
+            self.mask_u | self.mask_v, self.mask_u
+        )
 
     @property
     @cached_method
     def min_dppt(self):
-        ret = self.divcore.copy()
-        ret.do_UpperSet(self.mask_u)
-        ret.do_MinSet(self.mask_v)
-        ret.do_Not(self.mask_u)
-        return ret
+        return self.divcore.UpperSet_MinSet(
+            self.mask_u, self.mask_v, self.mask_u
+        )
+
+    # sets derived from divcore that compute() evaluates in one batch
+    DERIVED = (
+        "valid",
+        "invalid_max",
+        "full_dppt",
+        "minimal",
+        "min_dppt",
+        "minimal_max",
+        "redundant_min",
+        "redundant_alternative_min",
+    )
+
+    def _cached_fget(self, name):
+        return getattr(type(self), name).fget
+
+    def _is_cached(self, name):
+        """In memory or in the store (loaded when used)"""
+        f = self._cached_fget(name)
+        key = f._calc_key(self)
+        if key in f._cache:
+            return True
+        store = get_store(self.CACHE)
+        return store is not None and key in store
+
+    def compute(self, *names):
+        """
+        Evaluates the derived sets names (properties, all of DERIVED
+        by default) in one batch sharing their common sweeps
+        (e.g. a single UpperSet for valid, invalid_max, full_dppt, minimal),
+        sets already cached (in memory or in the store) are reused.
+        Results are cached as by the properties, returns them as a list.
+        """
+        names = names or self.DERIVED
+        canonical = {self._cached_fget(name): name for name in self.DERIVED}
+        for name in names:
+            assert self._cached_fget(name) in canonical, f"{name} is not derived"
+
+        g = SetGraph()
+        nodes = {}
+
+        def node(name, parent, *ops):
+            if self._is_cached(name):
+                nodes[name] = g.leaf(name, lambda: getattr(self, name))
+                return
+            expr = nodes[parent]
+            for op in ops:
+                expr = g.apply(expr, *op)
+            nodes[name] = expr
+
+        nodes["divcore"] = g.leaf("divcore", lambda: self.divcore)
+        node("valid", "divcore", ("do_UpperSet",))
+        node("invalid_max", "valid", ("do_ComplementU2L", True))
+        node("full_dppt", "valid", ("do_Not", self.mask_u))
+        # valid is upper closed: MinSet along v is the LESS sweep only
+        node("minimal", "valid", ("do_Sweep_LESS_up", self.mask_v))
+        node("min_dppt", "minimal", ("do_Not", self.mask_u))
+        node("minimal_max", "minimal", ("do_MaxSet",))
+        node("redundant_alternative_min", "minimal_max", ("do_ComplementL2U",))
+        node(
+            "redundant_min", "divcore",
+            ("do_UpperSet_Up1", True, self.mask_v), ("do_MinSet",),
+        )
+
+        names = [canonical[self._cached_fget(name)] for name in names]
+        todo = [name for name in names if not self._is_cached(name)]
+        values = g.evaluate([nodes[name] for name in todo])
+        for name, value in zip(todo, values):
+            self._cached_fget(name)._set(self, value)
+        return [getattr(self, name) for name in names]
 
     @property
     @cached_method
@@ -155,7 +233,7 @@ class SboxDivision:
         n = self.sbox.n
         m = self.sbox.m
         # linear-time build all components
-        cs = list(self.sbox.coordinates())
+        cs = list(self.sbox.coordinates_fast())
         xors = [DenseSet(n)] + [None] * (2**m-1)
         for i in range(m):
             for j in range(2**i):
@@ -0,0 +1,164 @@
+import os
+import ctypes
+import pickle
+import logging
+
+from pathlib import Path
+from hashlib import sha256
+
+from subsets import DenseSet
+
+
+log = logging.getLogger(__name__)
+
+
+NotFound = object()
+
+
+def sbox_digest(sbox):
+    """sha256 (hex) of the S-box table"""
+    h = sha256(b"%d %d %d:" % (sbox.n, sbox.m, sbox.ENTRY_SIZE))
+    h.update(ctypes.string_at(
+        sbox._get_data_ptr(), (1 << sbox.n) * sbox.ENTRY_SIZE
+    ))
+    return h.hexdigest().upper()
+
+
+def denseset_digest(s: DenseSet):
+    """sha256 (hex) of the set"""
+    ai = s.__array_interface__
+    h = sha256(b"%d:" % s.n)
+    h.update(ctypes.string_at(ai["data"][0], ai["shape"][0] * 8))
+    return h.hexdigest().upper()
+
+
+class ResultStore:
+    """
+    Content-addressed file store of results:
+    a key is stored in path/<h[:2]>/<h[2:4]>/<h>.<ext>, h = sha256(key),
+    DenseSets in their native file format (.set), other values pickled (.pkl).
+
+    Writes go to a temporary file renamed over the target (atomic),
+    so concurrent processes sharing the store (e.g. parallel runs)
+    never read partial results; concurrent writes of the same key
+    keep one of the (equal) results.
+
+    With max_bytes, the least recently used results (by mtime,
+    refreshed on hits) are evicted when the store grows over max_bytes.
+    The size is scanned once and then kept up to date by put(),
+    the store is only scanned again to evict
+    (writes of other processes are seen at the next scan).
+    """
+    EXTS = (".set", ".pkl")
+
+    def __init__(self, path, max_bytes=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        # size estimate (None: not scanned yet)
+        self._size = None
+
+    def __repr__(self):
+        return f"<ResultStore {self.path} max_bytes={self.max_bytes}>"
+
+    def filename(self, key, ext=""):
+        h = sha256(key.encode()).hexdigest().upper()
+        return self.path / h[:2] / h[2:4] / (h + ext)
+
+    def get(self, key):
+        """Stored value or NotFound"""
+        for ext in self.EXTS:
+            filename = self.filename(key, ext)
+            try:
+                if ext == ".set":
+                    if not filename.is_file():
+                        continue
+                    ret = DenseSet.load_from_file(str(filename))
+                else:
+                    with open(filename, "rb") as f:
+                        ret = pickle.load(f)
+            except FileNotFoundError:
+                # not stored or evicted meanwhile
+                continue
+            except Exception as err:
+                log.warning(f"load {filename} failed: {err}")
+                continue
+
+            try:
+                os.utime(filename)
+            except OSError:
+                pass
+            return ret
+        return NotFound
+
+    def put(self, key, value):
+        if isinstance(value, DenseSet):
+            filename = self.filename(key, ".set")
+        else:
+            filename = self.filename(key, ".pkl")
+        filename.parent.mkdir(parents=True, exist_ok=True)
+
+        # dot-files are skipped by eviction
+        tmp = filename.parent / f".{filename.name}.{os.getpid()}.tmp"
+        try:
+            if isinstance(value, DenseSet):
+                value.save_to_file(str(tmp))
+            else:
+                with open(tmp, "wb") as f:
+                    pickle.dump(value, f)
+            size = tmp.stat().st_size
+            try:
+                old_size = filename.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp, filename)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        if self.max_bytes is not None:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += size - old_size
+            if self._size > self.max_bytes:
+                self.evict(self.max_bytes)
+        return filename
+
+    def __contains__(self, key):
+        return any(self.filename(key, ext).is_file() for ext in self.EXTS)
+
+    def _entries(self):
+        """[(mtime, size, filename)] of stored results"""
+        ret = []
+        for filename in self.path.glob("*/*/*"):
+            if filename.name.startswith("."):
+                continue
+            try:
+                st = filename.stat()
+            except FileNotFoundError:
+                continue
+            ret.append((st.st_mtime, st.st_size, filename))
+        return ret
+
+    def size(self):
+        """Total size of stored results in bytes"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes):
+        """Removes least recently used results until the size <= max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(filename)
+                log.debug(f"evicted {filename} ({size} bytes)")
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+        return total
@@ -14,14 +14,16 @@ import subprocess
 import pickle
 import argparse
 import gzip
+from collections import OrderedDict
 
 from binteger import Bin
 
 from subsets import DenseSet
-from divprop.lib import Sbox, Sbox32
+from divprop.lib import Sbox, Sbox32, GEN_random_permutation_files
 from divprop.WeightedSetInts import WeightedSetInts
 
 from divprop import SboxDivision, SboxPeekANFs
+from divprop.divcore_peekanfs import resolve_workers
 
 import logging
 import justlogs
@@ -30,12 +32,33 @@ log = logging.getLogger(f"{__name__}:RandomSboxBenchmark")
 
 
 class HeavyPeeks(SboxPeekANFs):
+    """
+    SboxPeekANFs with coordinates stored in files
+    (loaded in memory with memorize=True, or mapped with mmap=True).
+
+    Coordinate products are kept in an LRU cache bounded by
+    product_cache_bytes (0 disables it):
+    product(mask) is obtained from a cached product(mask - one bit)
+    and a single AND with a coordinate.
+    The cache belongs to the process: with workers, each forked worker
+    fills its own cache, so that product_cache_bytes is per worker
+    (run_large divides its budget between the workers).
+    """
     log = logging.getLogger(f"{__name__}:HeavyPeeks")
 
-    def __init__(self, n, fws, bks, cache_dir=None, memorize=False):
+    def __init__(
+        self, n, fws, bks, cache_dir=None, memorize=False, mmap=False,
+        product_cache_bytes=0,
+    ):
         self.n = int(n)
         self.cache_dir = cache_dir
-        if memorize:
+        if mmap:
+            # zero-copy, pages are shared with other processes
+            self.log.info("mapping coordinates")
+            self.fws = [DenseSet.map_file(f) for f in fws]
+            self.bks = [DenseSet.map_file(f) for f in bks]
+            memorize = True
+        elif memorize:
             self.log.info("loading forward coordinates to memory")
             self.fws = [DenseSet.load_from_file(f) for f in fws]
             self.log.info("loading backward coordinates to memory")
@@ -46,6 +69,10 @@ class HeavyPeeks(SboxPeekANFs):
             self.bks = bks
         self.memorize = memorize
 
+        self.product_cache_bytes = int(product_cache_bytes)
+        self.products = OrderedDict()
+        self.n_product_hits = 0
+
     def get_coord(self, i, inverse):
         lst = self.bks if inverse else self.fws
         if self.memorize:
@@ -53,11 +80,51 @@ class HeavyPeeks(SboxPeekANFs):
         else:
             return DenseSet.load_from_file(lst[i])
 
+    @property
+    def product_size(self):
+        return max(8, 2**self.n // 8)
+
     def get_product(self, mask, inverse):
-        cur = DenseSet(self.n)
-        cur.fill()
-        for i in Bin(mask, self.n).support:
+        if self.product_cache_bytes < self.product_size:
+            cur = DenseSet(self.n)
+            cur.fill()
+            for i in Bin(mask, self.n).support:
+                cur &= self.get_coord(i, inverse)
+            return cur
+
+        key = mask, inverse
+        if key in self.products:
+            # a mask is rarely queried twice:
+            # hand over the cached set (modified by the caller), no copy
+            self.n_product_hits += 1
+            return self.products.pop(key)
+
+        # start from mask minus one bit (a single AND)
+        support = Bin(mask, self.n).support
+        base = None
+        for i in support:
+            sub = mask & ~(1 << (self.n - 1 - i))
+            if (sub, inverse) in self.products:
+                base = sub
+                break
+
+        if base is None:
+            cur = DenseSet(self.n)
+            cur.fill()
+            rest = support
+        else:
+            self.products.move_to_end((base, inverse))
+            self.n_product_hits += 1
+            rest = Bin(mask & ~base, self.n).support
+            # the first AND allocates the result (no extra copy)
+            cur = self.products[base, inverse] & self.get_coord(rest[0], inverse)
+            rest = rest[1:]
+        for i in rest:
             cur &= self.get_coord(i, inverse)
+
+        self.products[key] = cur.copy()
+        while len(self.products) * self.product_size > self.product_cache_bytes:
+            self.products.popitem(last=False)
         return cur
 
     def run_mask(self, mask, inverse=False):
@@ -129,6 +196,28 @@ def tool_RandomSboxBenchmark():
         "-o", "--output", type=str, default="divcore_random",
         help="Base directory for files (logs, cache, divcore, etc.)",
     )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help=(
+            "Evaluate ANF queries of each priority level in parallel"
+            " with this many workers (0: all CPUs)"
+        ),
+    )
+    parser.add_argument(
+        "-p", "--product-cache", type=int, default=0,
+        help=(
+            "Memory budget (MiB) for the LRU caches of coordinate products,"
+            " shared by the workers (large mode only, 0: disabled)"
+        ),
+    )
+    parser.add_argument(
+        "-x", "--out-of-core", type=int, default=0, metavar="CHUNK_LOG",
+        help=(
+            "Generate the S-box and its inverse out of core with about"
+            " 2^CHUNK_LOG table entries in memory"
+            " (large mode only, 0: in memory)"
+        ),
+    )
 
     args = parser.parse_args()
 
@@ -144,17 +233,69 @@ def tool_RandomSboxBenchmark():
     log.info(f"{args}")
 
     if args.large:
-        run_large(n, path, seed)
+        run_large(
+            n, path, seed, workers=args.workers,
+            product_cache_bytes=args.product_cache << 20,
+            chunk_log=args.out_of_core,
+        )
     else:
-        run_small(n, path, seed)
+        run_small(n, path, seed, workers=args.workers)
+
+
+def save_coordinates(sbox, prefix, batch=None, memory_bytes=512 << 20):
+    """
+    Saves coordinate i of sbox to prefix + "<i>.set",
+    extracting batch coordinates per pass over the table
+    (default: as many as fit in memory_bytes, at least 1).
+    """
+    if batch is None:
+        batch = max(1, memory_bytes // max(1, (1 << sbox.n) // 8))
+    for first in range(0, sbox.m, batch):
+        count = min(batch, sbox.m - first)
+        for i, coord in enumerate(sbox.coordinates_fast(first, count), first):
+            coord.save_to_file(f"{prefix}{i}.set")
+            log.info(f"coord {i}/{sbox.m} saved")
+
+
+def generate_large(n, path, seed, chunk_log):
+    """
+    Random permutation with files as in run_large, generated out of core
+    (see GEN_random_permutation_files) with about 2^chunk_log
+    table entries in memory.
+    """
+    tmp_dir = f"{path}/tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    log.info(f"generating {n}-bit S-box out of core (chunk 2^{chunk_log})...")
+    GEN_random_permutation_files(
+        n, seed, f"{path}/fw", f"{path}/bk", tmp_dir, chunk_log,
+        f"{path}/fw.sbox", f"{path}/bk.sbox",
+    )
+    os.rmdir(tmp_dir)
+
+    for filename in (f"{path}/fw.sbox", f"{path}/bk.sbox"):
+        log.info(f"hashing {filename}...")
+        h = subprocess.check_output(["sha256sum", filename]).split()[0]
+        log.info(f"sha256sum: {h}")
 
 
-def run_large(n, path, seed):
+def run_large(
+    n, path, seed, workers=None, product_cache_bytes=0, chunk_log=0,
+):
+    """
+    chunk_log: generate the S-box out of core if nonzero
+        (see generate_large)
+    """
     filename = f"{path}/fw.sbox"
     ifilename = f"{path}/bk.sbox"
-    last_filename = f"{path}/bk{n-1}.set"
-
-    if not os.path.isfile(last_filename):
+    # written once all the files are complete:
+    # a killed generation leaves partial files and is redone
+    done_filename = f"{path}/generated"
+
+    if os.path.isfile(done_filename):
+        pass
+    elif chunk_log:
+        generate_large(n, path, seed, chunk_log)
+    else:
         log.info(f"generating {n}-bit S-box...")
         sbox = Sbox32.GEN_random_permutation(n, seed)  # seed
         log.info(f"{sbox}")
@@ -167,10 +308,7 @@ def run_large(n, path, seed):
         log.info(f"sha256sum: {h}")
 
         log.info("splitting into coordinates...")
-        for i in range(n):
-            coord = sbox.coordinate(i)
-            coord.save_to_file(f"{path}/fw{i}.set")
-            log.info(f"coord {i}/{n} saved")
+        save_coordinates(sbox, f"{path}/fw")
 
         log.info("inverting...")
         # somehow ~sbox caused extra (temporary) instance
@@ -187,23 +325,28 @@ def run_large(n, path, seed):
         log.info(f"sha256sum: {h}")
 
         log.info("splitting into coordinates...")
-        for i in range(n):
-            coord = isbox.coordinate(i)
-            coord.save_to_file(f"{path}/bk{i}.set")
-            log.info(f"coord {i}/{n} saved")
+        save_coordinates(isbox, f"{path}/bk")
 
         del isbox
         gc.collect()
 
+    if not os.path.isfile(done_filename):
+        with open(done_filename, "w") as f:
+            print(n, seed, file=f)
+
     log.info("heavy peeks")
     fws = [f"{path}/fw{i}.set" for i in range(n)]
     bks = [f"{path}/bk{i}.set" for i in range(n)]
 
     cache_dir = f"{path}/cache/"
     os.makedirs(cache_dir, exist_ok=True)
-    pa = HeavyPeeks(n, fws, bks, cache_dir=cache_dir, memorize=True)
+    # each worker process has its own product cache
+    pa = HeavyPeeks(
+        n, fws, bks, cache_dir=cache_dir, mmap=True,
+        product_cache_bytes=product_cache_bytes // resolve_workers(workers),
+    )
 
-    divcore, lb = pa.compute()
+    divcore, lb = pa.compute(workers=workers)
     divcore = sorted(divcore)
     lb = sorted(lb)
     ub = sorted(reduntant_from_divcore(divcore, n=n, m=n))
@@ -233,7 +376,7 @@ def run_large(n, path, seed):
     log.info("finished")
 
 
-def run_small(n, path, seed):
+def run_small(n, path, seed, workers=None):
     assert n < 24, "are you crazy?"
 
     log.info(f"generating {n}-bit S-box...")
@@ -252,7 +395,7 @@ def run_small(n, path, seed):
     pa = SboxPeekANFs(sbox)
     log.info("sorting...")
 
-    divcore, lb = pa.compute()
+    divcore, lb = pa.compute(workers=workers)
     divcore = sorted(divcore)
     lb = sorted(lb)
     ub = sorted(reduntant_from_divcore(divcore, n=n, m=n))
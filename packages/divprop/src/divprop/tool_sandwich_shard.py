@@ -0,0 +1,143 @@
+"""
+Sharded Sandwich DivCore computation (e.g. on a batch cluster
+with a shared filesystem):
+
+    divprop.sandwich_shard SSB_LED 0 64   # ... up to 63, one job each
+    divprop.sandwich_merge SSB_LED 64
+
+Shard i processes keys[i::N] and keeps its full state
+(keys left, accumulated current[] sets) in
+<output>/<cipher>/shard_<i>_of_<N>.state, so that a killed job resumes.
+The merge ORs the current[] sets of all shards and reduces them
+to the division core.
+"""
+
+import os
+import argparse
+
+from divprop.ciphers import ciphers
+
+import logging
+import justlogs
+
+log = logging.getLogger(__name__)
+
+
+def shard_filename(path, index, n_shards):
+    return os.path.join(path, f"shard_{index:04d}_of_{n_shards:04d}")
+
+
+def get_cipher(name):
+    try:
+        return ciphers[name.lower()]()
+    except KeyError:
+        raise SystemExit(
+            f"unknown cipher {name}, available: {', '.join(ciphers)}"
+        )
+
+
+def tool_SandwichShard():
+    parser = argparse.ArgumentParser(
+        description="Compute the Sandwich DivCore state of one shard of keys."
+    )
+
+    parser.add_argument(
+        "cipher", type=str,
+        help=f"Cipher ({', '.join(ciphers)})",
+    )
+    parser.add_argument(
+        "index", type=int,
+        help="Shard index (0 <= index < n_shards)",
+    )
+    parser.add_argument(
+        "n_shards", type=int,
+        help="Number of shards",
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, default="data",
+        help="Base directory for shard files",
+    )
+    parser.add_argument(
+        "-c", "--chunk", type=int, default=128,
+        help="Keys per chunk",
+    )
+    parser.add_argument(
+        "-i", "--checkpoint-interval", type=int, default=600,
+        help="Minimal time (seconds) between saved states (0: after each chunk)",
+    )
+    parser.add_argument(
+        "-t", "--threads", type=int, default=0,
+        help="Number of threads (0: OpenMP default)",
+    )
+
+    args = parser.parse_args()
+    assert 0 <= args.index < args.n_shards, "shard index out of range"
+
+    name = args.cipher.lower()
+    path = os.path.join(args.output, name)
+    os.makedirs(path, exist_ok=True)
+    filename = shard_filename(path, args.index, args.n_shards)
+
+    justlogs.addFileHandler(filename)
+    justlogs.setup(level="INFO")
+    log.info(f"{args}")
+
+    cipher = get_cipher(name)
+    snd = cipher.make_sandwich().shard(args.index, args.n_shards)
+    snd.compute_divcore(
+        chunk=args.chunk,
+        filename=filename,
+        n_threads=args.threads,
+        resume=True,
+        checkpoint_interval=args.checkpoint_interval,
+    )
+    log.info(f"shard finished: {filename}.state")
+
+
+def tool_SandwichMerge():
+    parser = argparse.ArgumentParser(
+        description="Merge Sandwich shard states into the division core."
+    )
+
+    parser.add_argument(
+        "cipher", type=str,
+        help=f"Cipher ({', '.join(ciphers)})",
+    )
+    parser.add_argument(
+        "n_shards", type=int,
+        help="Number of shards",
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, default="data",
+        help="Base directory for shard files",
+    )
+    parser.add_argument(
+        "--partial", action="store_true",
+        help="Allow unfinished shards (the result is then incomplete)",
+    )
+
+    args = parser.parse_args()
+
+    name = args.cipher.lower()
+    path = os.path.join(args.output, name)
+
+    justlogs.setup(level="INFO")
+    log.info(f"{args}")
+
+    state_files = [
+        shard_filename(path, i, args.n_shards) + ".state"
+        for i in range(args.n_shards)
+    ]
+    missing = [f for f in state_files if not os.path.isfile(f)]
+    if missing:
+        raise SystemExit(f"missing shard states: {', '.join(missing)}")
+
+    cipher = get_cipher(name)
+    snd = cipher.make_sandwich()
+    divcore = snd.merge_shards(state_files, partial=args.partial)
+
+    filename = os.path.join(path, "divcore")
+    log.info(f"divcore {divcore}, saving to {filename}.set")
+    divcore.save_to_file(filename + ".set")
+    with open(filename + ".dim", "w") as f:
+        print(snd.n, snd.m, file=f)
@@ -0,0 +1,185 @@
+"""
+Table of division property sets of the S-box catalog (divprop.all_sboxes),
+computed in a pool of processes sharing a ResultStore:
+
+    divprop.sboxes2table -o data/sboxes.tsv          # all S-boxes
+    divprop.sboxes2table -o table.tex AES PRESENT    # LaTeX rows
+
+Columns: name, n, m, |min_dppt|, |divcore|, |lb| (invalid_max),
+|ub| (redundant_min), |ub2| (redundant_alternative_min),
+|lb| + min(|ub|, |ub2|); the LaTeX rows are those printed by
+scripts/sbox_convex_partition.py (without m).
+Results are kept in the store, so that regenerating the table
+only computes new S-boxes; with --canonical, S-boxes equivalent up to
+input/output XOR constants and bit permutations share their division core
+(see divprop.canonical).
+"""
+
+import os
+import time
+import argparse
+
+from divprop import SboxDivision
+from divprop.store import ResultStore
+from divprop.utils import fork_pool, pool_shared
+
+import logging
+import justlogs
+
+log = logging.getLogger(__name__)
+
+
+COLUMNS = (
+    "name", "n", "m", "min_dppt", "divcore", "lb", "ub", "ub2", "lb_ubest",
+)
+
+
+def table_row(name, sbox):
+    dc = SboxDivision(sbox)
+    # only the sets of the table
+    dc.compute("min_dppt", "lb", "ub", "ub2")
+    row = [
+        name, dc.n, dc.m,
+        len(dc.min_dppt), len(dc.divcore),
+        len(dc.lb), len(dc.ub), len(dc.ub2),
+    ]
+    row.append(row[5] + min(row[6], row[7]))
+    return row
+
+
+def _pool_init(store, canonical):
+    SboxDivision.CACHE = store
+    SboxDivision.CANONICAL = canonical
+
+
+def _pool_table_row(name):
+    t0 = time.time()
+    row = table_row(name, pool_shared()[name])
+    return row, time.time() - t0
+
+
+def iter_table(sboxes, workers=None, store=None, canonical=False):
+    """
+    Yields table rows of the S-boxes (dict name -> Sbox) as they finish,
+    computed by workers processes (default: all CPUs).
+    Groups of S-boxes of the same size are processed from the largest one,
+    so that the long tasks start first.
+    store: ResultStore (or a path) shared by the workers
+    canonical: see SboxDivision.CANONICAL
+    (both set in the workers only)
+    """
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    if store is not None:
+        if not isinstance(store, ResultStore):
+            store = ResultStore(store)
+        store.path.mkdir(parents=True, exist_ok=True)
+
+    groups = {}
+    for name, sbox in sboxes.items():
+        groups.setdefault((sbox.n, sbox.m), []).append(name)
+    tasks = []
+    for size in sorted(groups, reverse=True):
+        log.info(f"{size[0]} -> {size[1]} bit S-boxes: {len(groups[size])}")
+        tasks += sorted(groups[size])
+
+    with fork_pool(
+        workers, sboxes, initializer=_pool_init, initargs=(store, canonical),
+    ) as pool:
+        for i, (row, elapsed) in enumerate(
+            pool.imap_unordered(_pool_table_row, tasks), 1
+        ):
+            log.info(f"{i}/{len(tasks)} {row[0]}: {elapsed:.2f}s")
+            yield row
+
+
+def compute_table(sboxes, workers=None, store=None, canonical=False):
+    """Rows sorted by (n, m, name), see iter_table"""
+    rows = list(iter_table(
+        sboxes, workers=workers, store=store, canonical=canonical,
+    ))
+    rows.sort(key=lambda row: (row[1], row[2], row[0]))
+    return rows
+
+
+def write_table(rows, filename):
+    """TSV with a header, or LaTeX table rows for a .tex filename"""
+    def num(n):
+        if len(str(n)) > 3:
+            return r"\num{%d}" % n
+        return str(n)
+
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        if filename.endswith(".tex"):
+            # as scripts/sbox_convex_partition.py
+            for name, n, m, *data in rows:
+                data = [n] + data + ["-"]
+                print(
+                    f"\\scriptsize {name} & "
+                    + " & ".join(map(num, data)) + r" \\",
+                    file=f,
+                )
+        else:
+            print("\t".join(COLUMNS), file=f)
+            for row in rows:
+                print("\t".join(map(str, row)), file=f)
+    os.replace(tmp, filename)
+
+
+def tool_Sboxes2Table():
+    from divprop.all_sboxes import sboxes
+
+    parser = argparse.ArgumentParser(
+        description="Table of division property sets of known S-boxes."
+    )
+
+    parser.add_argument(
+        "names", type=str, nargs="*",
+        help="S-box names from divprop.all_sboxes (default: all)",
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, default="data/sboxes.tsv",
+        help="Output table (.tsv, or LaTeX rows for .tex)",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=0,
+        help="Number of processes (0: all CPUs)",
+    )
+    parser.add_argument(
+        "-c", "--cache", type=str, default=".cache/",
+        help="ResultStore directory shared by the workers ('' to disable)",
+    )
+    parser.add_argument(
+        "--cache-max", type=int, default=0,
+        help="Size bound (MiB) of the ResultStore (0: unbounded)",
+    )
+    parser.add_argument(
+        "--canonical", action="store_true",
+        help="Share division cores of S-boxes equivalent up to "
+        "input/output XOR constants and bit permutations",
+    )
+
+    args = parser.parse_args()
+
+    justlogs.setup(level="INFO")
+    log.info(f"{args}")
+
+    if args.names:
+        unknown = [name for name in args.names if name not in sboxes]
+        if unknown:
+            raise SystemExit(f"unknown S-boxes: {', '.join(unknown)}")
+        sboxes = {name: sboxes[name] for name in args.names}
+
+    store = None
+    if args.cache:
+        store = ResultStore(args.cache, max_bytes=(args.cache_max << 20) or None)
+
+    rows = compute_table(
+        sboxes, workers=args.workers, store=store, canonical=args.canonical,
+    )
+    dirname = os.path.dirname(args.output)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    write_table(rows, args.output)
+    log.info(f"saved {len(rows)} rows to {args.output}")
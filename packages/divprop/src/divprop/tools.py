@@ -257,7 +257,7 @@ def tool_divcore2bounds():
 
     log.info("generating bounds...")
 
-    mid = dc.min_dppt
+    mid = dc.min_dppt.copy()
     log.info(f"min-dppt: {mid}")
     mid.do_Not(dc.mask_u)
     log.info(f"     M_S: {mid}")
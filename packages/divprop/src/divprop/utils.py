@@ -1,16 +1,80 @@
 import copy
-import pickle
 import logging
+import multiprocessing
 
 from pathlib import Path
 from functools import wraps
+from contextlib import contextmanager
 from hashlib import sha256
 
+from subsets import DenseSet
+
+from divprop.store import ResultStore, NotFound
+
 DEFAULT_CACHE = Path(".cache/")
 DEFAULT_LOGGER = logging.getLogger()
 
 
-NotFound = object()
+def get_store(CACHE):
+    """
+    ResultStore for the CACHE setting: a ResultStore or a path
+    (None if the folder does not exist or CACHE is empty)
+    """
+    if not CACHE:
+        return None
+    if isinstance(CACHE, ResultStore):
+        store = CACHE
+    else:
+        store = ResultStore(CACHE)
+    if not store.path.is_dir():
+        return None
+    return store
+
+
+def shared(ret):
+    """
+    Cached value handed to callers:
+    DenseSets are frozen and shared (callers modify a .copy()),
+    other values are deep-copied.
+    """
+    if isinstance(ret, DenseSet):
+        ret.freeze()
+        return ret
+    return copy.deepcopy(ret)
+
+
+# object shared with the workers of fork_pool (inherited through fork)
+_pool_shared = None
+
+
+def pool_shared():
+    """The object given to fork_pool, in its worker processes"""
+    return _pool_shared
+
+
+@contextmanager
+def fork_pool(workers, obj, initializer=None, initargs=()):
+    """
+    Pool of workers forked processes inheriting obj (see pool_shared),
+    terminated on exit.
+    initializer(*initargs) runs in each worker.
+    """
+    global _pool_shared
+
+    old = _pool_shared
+    _pool_shared = obj
+    # kept while the pool lives (replaced workers fork again)
+    try:
+        pool = multiprocessing.get_context("fork").Pool(
+            workers, initializer, initargs
+        )
+        try:
+            yield pool
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        _pool_shared = old
 
 
 def cached_method(method):
@@ -30,68 +94,65 @@ def cached_method(method):
     def call(self, *args, **kwargs):
         nonlocal cache, calc_key, disabled_shown
         log = getattr(self, "log", DEFAULT_LOGGER)
-        self.CACHE = getattr(self, "CACHE", DEFAULT_CACHE)
-        if self.CACHE:
-            self.CACHE = Path(self.CACHE)
-
-            if not self.CACHE.is_dir():
-                log.debug(f"cache folder {self.CACHE} does not exist, disabling cache")
-                self.CACHE = None
-        else:
-            if not disabled_shown:
+        CACHE = getattr(self, "CACHE", DEFAULT_CACHE)
+        store = get_store(CACHE)
+        if store is None and not disabled_shown:
+            if CACHE:
+                log.debug(f"cache folder {CACHE} does not exist, disabling cache")
+            else:
                 log.debug("cache disabled")
-                disabled_shown = True
-            self.CACHE = None
+            disabled_shown = True
 
         key = calc_key(self, *args, **kwargs)
 
         ret = cache.get(key, NotFound)
         if ret is not NotFound:
-            return copy.deepcopy(ret)
-
-        if self.CACHE:
-            cache_filename = self.CACHE / key
-            try:
-                ret = pickle.load(open(cache_filename, "rb"))
-                log.info(f"load {cache_filename} succeeded")
-            except Exception as err:
-                log.debug(f"load {cache_filename} failed: {err}")
-                pass
+            return shared(ret)
 
+        if store:
+            ret = store.get(key)
             if ret is not NotFound:
+                log.info(f"load {key} from {store.path} succeeded")
                 cache[key] = ret
-                return copy.deepcopy(ret)
+                return shared(ret)
 
             log.info(f"computing {key}")
 
         ret = method(self, *args, **kwargs)
         cache[key] = ret
 
-        if self.CACHE:
-            pickle.dump(ret, open(cache_filename, "wb"))
-            log.info(f"save {cache_filename} succeeded")
-        return copy.deepcopy(ret)
+        if store:
+            filename = store.put(key, ret)
+            log.info(f"save {filename} succeeded")
+        return shared(ret)
+
+    def set_value(self, value):
+        """Caches value as the result of the call without arguments"""
+        key = calc_key(self)
+        cache[key] = value
+        store = get_store(getattr(self, "CACHE", DEFAULT_CACHE))
+        if store and key not in store:
+            store.put(key, value)
 
     call._calc_key = calc_key
     call._cache = cache
+    call._set = set_value
     return call
 
 
 def cached_func(method=None, CACHE=DEFAULT_CACHE, log=DEFAULT_LOGGER):
     def deco(method):
-        nonlocal CACHE, log
+        nonlocal log
         method._cache = {}
-        if CACHE:
-            CACHE = Path(CACHE)
-            if not CACHE.is_dir():
+        store = get_store(CACHE)
+        if store is None:
+            if CACHE:
                 log.warning(
                     f"cache folder {CACHE} does not exist, "
                     "disabling file cache"
                 )
-                CACHE = None
-        else:
-            log.warning("file cache disabled")
-            CACHE = None
+            else:
+                log.warning("file cache disabled")
 
         @wraps(method)
         def call(*args, **kwargs):
@@ -103,30 +164,24 @@ def cached_func(method=None, CACHE=DEFAULT_CACHE, log=DEFAULT_LOGGER):
 
             ret = method._cache.get(key, NotFound)
             if ret is not NotFound:
-                return copy.deepcopy(ret)
-
-            if CACHE:
-                cache_filename = CACHE / key
-                try:
-                    ret = pickle.load(open(cache_filename, "rb"))
-                    log.info(f"load {cache_filename} succeeded")
-                except Exception as err:
-                    log.warning(f"load {cache_filename} failed: {err}")
-                    pass
+                return shared(ret)
 
+            if store:
+                ret = store.get(key)
                 if ret is not NotFound:
+                    log.info(f"load {key} from {store.path} succeeded")
                     method._cache[key] = ret
-                    return copy.deepcopy(ret)
+                    return shared(ret)
 
             log.info(f"computing {key}")
 
             ret = method(*args, **kwargs)
             method._cache[key] = ret
 
-            if CACHE:
-                pickle.dump(ret, open(cache_filename, "wb"))
-                log.info(f"save {cache_filename} succeeded")
-            return copy.deepcopy(ret)
+            if store:
+                filename = store.put(key, ret)
+                log.info(f"save {filename} succeeded")
+            return shared(ret)
         return call
     if method is None:
         return deco
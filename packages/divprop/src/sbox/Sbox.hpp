@@ -6,6 +6,45 @@
 #include "common.hpp"
 #include "DenseSet.hpp"
 
+#ifdef SWIG
+%pythoncode %{
+import sys
+import ctypes
+
+# byte order mark for __array_interface__ type strings
+_NATIVE_ORDER = "<" if sys.byteorder == "little" else ">"
+%}
+#endif
+
+// table loops over at least 2^SBOX_PARALLEL_MIN_LOG entries are
+// run by DenseSet::get_num_threads() OpenMP threads
+static const int SBOX_PARALLEL_MIN_LOG = 16;
+
+#ifndef SWIG
+// In-place transpose of the 64x64 bit matrix a
+// (bit j of a[i] <-> bit i of a[j]),
+// swapping off-diagonal blocks of size 32, 16, ..., 1.
+static inline void transpose64(uint64_t a[64]) {
+    static const uint64_t masks[6] = {
+        0x00000000ffffffffull,
+        0x0000ffff0000ffffull,
+        0x00ff00ff00ff00ffull,
+        0x0f0f0f0f0f0f0f0full,
+        0x3333333333333333ull,
+        0x5555555555555555ull,
+    };
+    int s = 0;
+    for (int j = 32; j; j >>= 1, s++) {
+        uint64_t mask = masks[s];
+        for (int k = 0; k < 64; k = ((k | j) + 1) & ~j) {
+            uint64_t t = ((a[k] >> j) ^ a[k | j]) & mask;
+            a[k | j] ^= t;
+            a[k] ^= t << j;
+        }
+    }
+}
+#endif
+
 template<typename T>
 struct T_Sbox {
     int n, m;
@@ -71,22 +110,48 @@ struct T_Sbox {
         return string(buf);
     }
 
+    int _n_threads() const {
+        if (n < SBOX_PARALLEL_MIN_LOG)
+            return 1;
+        return DenseSet::get_num_threads();
+    }
+
     void invert_in_place() {
         ensure(n == m);
         T_Sbox<T> ret = *this;
-        fori (x, xmask + 1) {
-            set(ret.data[x], x);
+        ret._invert_to(*this);
+        if (!ret._is_inverse_of(*this)) {
+            data.swap(ret.data);
+            ensure(0, "the S-box is not a permutation");
         }
-        return;
     }
     T_Sbox<T> inverse() const {
         ensure(n == m);
         T_Sbox<T> ret(n, m);
-        fori (x, xmask + 1) {
-            ret.set(data[x], x);
-        }
+        _invert_to(ret);
+        ensure(_is_inverse_of(ret), "the S-box is not a permutation");
         return ret;
     }
+#ifndef SWIG
+    // ret[S(x)] = x for all x (writes collide only if S is not a permutation)
+    void _invert_to(T_Sbox<T> &ret) const {
+        int n_threads = _n_threads();
+        #pragma omp parallel for num_threads(n_threads) schedule(static) if(n_threads > 1)
+        for (uint64_t x = 0; x <= xmask; x++) {
+            ret.data[data[x]] = x;
+        }
+    }
+    // inv[S(x)] == x for all x: S is injective, hence a permutation
+    bool _is_inverse_of(const T_Sbox<T> &inv) const {
+        int n_threads = _n_threads();
+        bool ok = true;
+        #pragma omp parallel for num_threads(n_threads) schedule(static) if(n_threads > 1) reduction(&&:ok)
+        for (uint64_t x = 0; x <= xmask; x++) {
+            ok = ok && inv.data[data[x]] == x;
+        }
+        return ok;
+    }
+#endif
 
     T get(uint64_t x) const {
         ensure(x <= xmask);
@@ -99,43 +164,95 @@ struct T_Sbox {
         return y;
     }
 
+    // f gets bit x = pred(data[x]) for all x,
+    // words of f are built independently (in parallel)
+    template<typename Pred>
+    void _fill_by_words(DenseSet &f, const Pred &pred) const {
+        uint64_t *words = f.data.data.data();
+        uint64_t nwords = f.data.nwords();
+        uint64_t len = min(64ull, 1ull << n);
+        int n_threads = _n_threads();
+        #pragma omp parallel for num_threads(n_threads) schedule(static) if(n_threads > 1)
+        for (uint64_t w = 0; w < nwords; w++) {
+            const T *ys = data.data() + (w << 6);
+            uint64_t word = 0;
+            for (uint64_t j = 0; j < len; j++) {
+                word |= uint64_t(pred(ys[j])) << j;
+            }
+            words[w] = word;
+        }
+    }
+
     DenseSet coordinate_product(T mask) const {
         DenseSet f(n);
-        fori (x, 1ull << n) {
-            uint64_t y = (uint64_t)data[x];
-            int bit = (y & mask) == mask;
-            f.set(x, bit);
-        }
+        _fill_by_words(f, [mask] (T y) { return (y & mask) == mask; });
         return f;
     }
 
     DenseSet graph_dense() const {
         DenseSet graph(n + m);
-        fori (x, 1ull << n) {
-            uint64_t y = (uint64_t)data[x];
-            graph.add((u64(x) << m) | y);
+        uint64_t *words = graph.data.data.data();
+        int n_threads = _n_threads();
+        // blocks of 64 inputs cover whole words of the graph
+        #pragma omp parallel for num_threads(n_threads) schedule(static) if(n_threads > 1)
+        for (uint64_t x0 = 0; x0 <= xmask; x0 += 64) {
+            uint64_t end = min(x0 + 64, xmask + 1);
+            for (uint64_t x = x0; x < end; x++) {
+                uint64_t xy = (x << m) | (uint64_t)data[x];
+                words[xy >> 6] |= 1ull << (xy & 63);
+            }
         }
         return graph;
     }
 
+    // All coordinates in a single pass over the table.
+    // NOTE: funcs[i] is the coordinate of output bit m-1-i (MSB first)
     std::vector<DenseSet> coordinates() const {
-        std::vector<DenseSet> funcs(m, DenseSet(n));
-        fori (x, 1ull << n) {
-            uint64_t y = (uint64_t)data[x];
-            fori (i, m) {
-                funcs[m-1-i].set(x, (y >> i) & 1);
+        return coordinates_fast();
+    }
+
+    // Coordinates first..first+count-1 (count=-1: up to m-1),
+    // in the order of coordinates() / coordinate(i).
+    // Each block of 64 outputs is transposed as a 64x64 bit matrix,
+    // giving one word for each coordinate.
+    std::vector<DenseSet> coordinates_fast(int first=0, int count=-1) const {
+        if (count == -1) {
+            count = m - first;
+        }
+        ensure(0 <= first && 0 <= count && first + count <= m);
+
+        std::vector<DenseSet> funcs(count, DenseSet(n));
+        std::vector<uint64_t *> words(count);
+        fori (i, count) {
+            words[i] = funcs[i].data.data.data();
+        }
+        uint64_t nwords = funcs.empty() ? 0 : funcs[0].data.nwords();
+        uint64_t len = min(64ull, 1ull << n);
+        int n_threads = _n_threads();
+        #pragma omp parallel for num_threads(n_threads) schedule(static) if(n_threads > 1)
+        for (uint64_t w = 0; w < nwords; w++) {
+            const T *ys = data.data() + (w << 6);
+            uint64_t block[64];
+            fori (j, len) {
+                block[j] = ys[j];
+            }
+            fori (j, len, 64) {
+                block[j] = 0;
+            }
+            transpose64(block);
+            // block[b] is the word of output bit b
+            fori (i, count) {
+                words[i][w] = block[m - 1 - (first + i)];
             }
         }
         return funcs;
     }
 
     DenseSet coordinate(int i) const {
-        ensure(0 <= i && i < n);
+        ensure(0 <= i && i < m);
         DenseSet func(n);
-        fori (x, 1ull << n) {
-            uint64_t y = (uint64_t)data[x];
-            func.set(x, (y >> (m - 1 - i)) & 1);
-        }
+        int shift = m - 1 - i;
+        _fill_by_words(func, [shift] (T y) { return (y >> shift) & 1; });
         return func;
     }
 
@@ -168,6 +285,123 @@ struct T_Sbox {
         return true;
     }
 
+    // Table C(x) = Q(S(P(x) ^ a)) ^ b,
+    // where bit i of P(x) is bit perm_in[i] of x
+    // and bit i of Q(y) is bit perm_out[i] of y.
+    T_Sbox<T> transformed(
+        const std::vector<int> &perm_in, uint64_t a,
+        const std::vector<int> &perm_out, uint64_t b
+    ) const {
+        ensure(_is_perm(perm_in, n) && _is_perm(perm_out, m));
+        ensure(a <= xmask && b <= ymask);
+        T_Sbox<T> ret(n, m);
+        fori (x, 1ull << n) {
+            uint64_t y = data[_apply_perm(perm_in, x) ^ a];
+            ret.data[x] = _apply_perm(perm_out, y) ^ b;
+        }
+        return ret;
+    }
+
+    // Parameters of the canonical representative of the S-box
+    // up to XOR constants on the input and the output
+    // (and bit permutations of the input and the output, if perms):
+    // the lexicographically smallest table C = transformed(P, a, Q, b)
+    // (C(0) = 0, i.e. b = Q(S(a))).
+    // Returns a, b, perm_in[0..n-1], perm_out[0..m-1].
+    // Tries 2^n candidates (2^n * n! * m! with perms, small S-boxes only),
+    // each compared up to the first difference with the best one.
+    std::vector<uint64_t> canonical_transform(bool perms=false) const {
+        ensure(!perms || (n <= 8 && m <= 8), "too many bit permutations");
+
+        // output permutations with their tables
+        std::vector<std::vector<int>> perms_out;
+        std::vector<std::vector<uint64_t>> tables_out;
+        std::vector<int> perm_in(n), perm_out(m);
+        fori (i, n) {
+            perm_in[i] = i;
+        }
+        fori (i, m) {
+            perm_out[i] = i;
+        }
+        if (perms) {
+            do {
+                perms_out.push_back(perm_out);
+                tables_out.push_back(_perm_table(perm_out, m));
+            } while (std::next_permutation(perm_out.begin(), perm_out.end()));
+        }
+        else {
+            perms_out.push_back(perm_out);
+        }
+
+        std::vector<T> best;
+        std::vector<uint64_t> ret;
+        do {
+            std::vector<uint64_t> px;
+            if (perms) {
+                px = _perm_table(perm_in, n);
+            }
+            fori (a, 1ull << n) {
+                fori (iq, perms_out.size()) {
+                    const uint64_t *qy = perms ? tables_out[iq].data() : NULL;
+                    auto QS = [&] (uint64_t x) -> T {
+                        T y = data[(perms ? px[x] : x) ^ a];
+                        return perms ? qy[y] : y;
+                    };
+                    T b = QS(0);
+                    // C(x) = QS(x) ^ b, the first difference with the best table decides
+                    uint64_t x = 0;
+                    if (!best.empty()) {
+                        while (x <= xmask && (QS(x) ^ b) == best[x]) {
+                            x++;
+                        }
+                        if (x > xmask || (QS(x) ^ b) > best[x]) {
+                            continue;
+                        }
+                    }
+                    best.resize(1ull << n);
+                    for (; x <= xmask; x++) {
+                        best[x] = QS(x) ^ b;
+                    }
+                    ret = {uint64_t(a), b};
+                    ret.insert(ret.end(), perm_in.begin(), perm_in.end());
+                    ret.insert(ret.end(), perms_out[iq].begin(), perms_out[iq].end());
+                }
+            }
+        } while (perms && std::next_permutation(perm_in.begin(), perm_in.end()));
+        return ret;
+    }
+
+#ifndef SWIG
+    static bool _is_perm(const std::vector<int> &perm, int n) {
+        if ((int)perm.size() != n) {
+            return false;
+        }
+        std::vector<bool> seen(n);
+        for (auto i: perm) {
+            if (i < 0 || i >= n || seen[i]) {
+                return false;
+            }
+            seen[i] = 1;
+        }
+        return true;
+    }
+    // bit i of the result is bit perm[i] of x
+    static uint64_t _apply_perm(const std::vector<int> &perm, uint64_t x) {
+        uint64_t ret = 0;
+        fori (i, perm.size()) {
+            ret |= ((x >> perm[i]) & 1) << i;
+        }
+        return ret;
+    }
+    static std::vector<uint64_t> _perm_table(const std::vector<int> &perm, int n) {
+        std::vector<uint64_t> ret(1ull << n);
+        fori (x, 1ull << n) {
+            ret[x] = _apply_perm(perm, x);
+        }
+        return ret;
+    }
+#endif
+
     static T_Sbox<T> GEN_random_permutation(int n, uint64_t seed=-1ull) {
         ensure(1 <= n && n <= 62);
         if (seed == -1ull) {
@@ -175,14 +409,20 @@ struct T_Sbox {
         }
 
         T_Sbox<T> res(n, n);
-        fori (x, 1ull << n) {
-            res.set(x, x);
+        int n_threads = res._n_threads();
+        #pragma omp parallel for num_threads(n_threads) schedule(static) if(n_threads > 1)
+        for (uint64_t x = 0; x <= res.xmask; x++) {
+            res.data[x] = x;
         }
         std::mt19937 engine(seed);
         shuffle(res.data.begin(), res.data.end(), engine);
         return res;
     }
 
+    uint64_t _get_data_ptr() const {
+        return (uint64_t)data.data();
+    }
+
     void save_to_file(const char *filename) const {
         FILE *fd = fopen(filename, "w");
         ensure(fd, "can not open file");
@@ -252,12 +492,32 @@ struct T_Sbox {
         def __iter__(self):
             return iter(self.data)
 
+        @property
+        def __array_interface__(self):
+            # zero-copy view of the table, e.g. numpy.asarray(sbox)
+            return dict(
+                version=3,
+                shape=(1 << self.n,),
+                typestr=_NATIVE_ORDER + "u%d" % self.ENTRY_SIZE,
+                data=(self._get_data_ptr(), False),
+            )
+
         def __getstate__(self):
-            return self.n, self.m, list(self.data)
+            size = (1 << self.n) * self.ENTRY_SIZE
+            data = ctypes.string_at(self._get_data_ptr(), size)
+            return self.n, self.m, data
 
         def __setstate__(self, st):
             n, m, data = st
-            self.__init__(data, n, m)
+            if isinstance(data, bytes):
+                self.__init__(n, m)
+                assert len(data) == (1 << n) * self.ENTRY_SIZE
+                ctypes.memmove(self._get_data_ptr(), data, len(data))
+                # check the range of values
+                self.init()
+            else:
+                # old format (list of values)
+                self.__init__(data, n, m)
             return self
     %}
     #endif
@@ -0,0 +1,335 @@
+#pragma once
+
+#include <random>
+#include <string>
+#include <algorithm>
+
+#include <unistd.h>
+
+#include "common.hpp"
+#include "DenseSet.hpp"
+#include "Sbox.hpp"
+
+#ifndef SWIG
+// Temporary file of values packed in little-endian order, `bytes` bytes each,
+// written and read sequentially through a buffer.
+struct _PackedFile {
+    static const uint64_t BUFFER_SIZE = 1 << 16;
+
+    std::string filename;
+    int bytes;
+    FILE *fd = NULL;
+    std::vector<uint8_t> buf;
+    uint64_t pos = 0;
+
+    _PackedFile(const std::string &_filename, int _bytes)
+        : filename(_filename), bytes(_bytes) {}
+
+    void open(const char *mode) {
+        fd = fopen(filename.c_str(), mode);
+        ensure(fd, "can not open temporary file");
+        buf.clear();
+        pos = 0;
+    }
+    void append(uint64_t v) {
+        fori (i, bytes) {
+            buf.push_back(v >> (8 * i));
+        }
+        if (buf.size() >= BUFFER_SIZE) {
+            flush();
+        }
+    }
+    void flush() {
+        ensure(buf.size() == fwrite(buf.data(), 1, buf.size(), fd), "can not write temporary file");
+        buf.clear();
+    }
+    bool read(uint64_t &v) {
+        if (pos == buf.size()) {
+            buf.resize(BUFFER_SIZE / bytes * bytes);
+            buf.resize(fread(buf.data(), 1, buf.size(), fd));
+            pos = 0;
+            if (buf.empty()) {
+                return false;
+            }
+            ensure(buf.size() % bytes == 0, "truncated temporary file");
+        }
+        v = 0;
+        fori (i, bytes) {
+            v |= uint64_t(buf[pos++]) << (8 * i);
+        }
+        return true;
+    }
+    void close() {
+        if (!buf.empty()) {
+            flush();
+        }
+        ensure(fclose(fd) == 0, "can not close temporary file");
+        fd = NULL;
+    }
+    void remove() {
+        ensure(unlink(filename.c_str()) == 0, "can not remove temporary file");
+    }
+};
+
+// Writes the files of an n -> m table given entry by entry (x = 0, 1, ...),
+// keeping only a few buffers in memory:
+// coordinate files coord_prefix<i>.set (as Sbox.coordinate(i).save_to_file)
+// and, if table_filename is not empty, the table in Sbox file format
+// with entries of entry_size bytes (as T_Sbox<T>.save_to_file).
+struct _SboxFilesWriter {
+    static const uint64_t BUFFER_WORDS = 1 << 12;
+
+    int n, m;
+    uint64_t entry_size;
+    uint64_t n_written = 0;
+
+    std::vector<FILE *> coords;
+    std::vector<std::vector<uint64_t>> coord_bufs;
+    uint64_t block[64];
+    uint64_t block_len = 0;
+
+    FILE *table = NULL;
+    std::vector<uint8_t> table_buf;
+
+    _SboxFilesWriter(
+        int _n, int _m,
+        const std::string &coord_prefix,
+        const std::string &table_filename,
+        uint64_t _entry_size
+    ) : n(_n), m(_m), entry_size(_entry_size) {
+        ensure(entry_size == 1 || entry_size == 2 || entry_size == 4 || entry_size == 8);
+        ensure(uint64_t(m) <= entry_size * 8);
+
+        // dense BitSet format, see BitSet::save_to_file
+        uint64_t vn = 1ull << n;
+        uint64_t vl = Pack64::HICEIL(vn);
+        uint64_t sz = 8;
+        if (vn < 1ull << 8) {
+            sz = 1;
+        }
+        else if (vn < 1ull << 16) {
+            sz = 2;
+        }
+        else if (vn < 1ull << 32) {
+            sz = 4;
+        }
+        coords.resize(m);
+        coord_bufs.resize(m);
+        fori (i, m) {
+            std::string filename = coord_prefix + std::to_string(i) + ".set";
+            coords[i] = fopen(filename.c_str(), "w");
+            ensure(coords[i], "can not open file");
+
+            uint64_t header = BitSet::VERSION_DENSE;
+            ensure(1 == fwrite(&header, 8, 1, coords[i]));
+            ensure(1 == fwrite(&vn, 8, 1, coords[i]));
+            ensure(1 == fwrite(&vl, 8, 1, coords[i]));
+            ensure(1 == fwrite(&sz, 8, 1, coords[i]));
+        }
+
+        if (!table_filename.empty()) {
+            table = fopen(table_filename.c_str(), "w");
+            ensure(table, "can not open file");
+
+            uint64_t header = T_Sbox<uint8_t>::VERSION1;
+            uint64_t vn = n;
+            uint64_t vm = m;
+            ensure(1 == fwrite(&header, 8, 1, table));
+            ensure(1 == fwrite(&entry_size, 8, 1, table));
+            ensure(1 == fwrite(&vn, 8, 1, table));
+            ensure(1 == fwrite(&vm, 8, 1, table));
+        }
+    }
+
+    void write(uint64_t y) {
+        ensure(n_written < (1ull << n), "too many table entries");
+        n_written++;
+
+        if (table) {
+            switch (entry_size) {
+            case 1: _write_entry<uint8_t>(y); break;
+            case 2: _write_entry<uint16_t>(y); break;
+            case 4: _write_entry<uint32_t>(y); break;
+            case 8: _write_entry<uint64_t>(y); break;
+            }
+        }
+
+        block[block_len++] = y;
+        if (block_len == 64) {
+            _flush_block();
+        }
+    }
+
+    template<typename T>
+    void _write_entry(uint64_t y) {
+        T v = y;
+        const uint8_t *p = (const uint8_t *)&v;
+        table_buf.insert(table_buf.end(), p, p + sizeof(T));
+        if (table_buf.size() >= BUFFER_WORDS * 8) {
+            _flush_table();
+        }
+    }
+    void _flush_table() {
+        ensure(table_buf.size() == fwrite(table_buf.data(), 1, table_buf.size(), table), "can not write file");
+        table_buf.clear();
+    }
+
+    void _flush_block() {
+        fori (j, block_len, 64) {
+            block[j] = 0;
+        }
+        transpose64(block);
+        fori (i, m) {
+            coord_bufs[i].push_back(block[m - 1 - i]);
+        }
+        block_len = 0;
+        if (coord_bufs[0].size() >= BUFFER_WORDS) {
+            _flush_coords();
+        }
+    }
+    void _flush_coords() {
+        fori (i, m) {
+            auto &buf = coord_bufs[i];
+            ensure(buf.size() == fwrite(buf.data(), 8, buf.size(), coords[i]), "can not write file");
+            buf.clear();
+        }
+    }
+
+    void close() {
+        ensure(n_written == (1ull << n), "incomplete table");
+        if (block_len) {
+            // n < 6: a single partial block
+            _flush_block();
+        }
+        if (m) {
+            _flush_coords();
+        }
+        fori (i, m) {
+            uint64_t marker = BitSet::MARKER_END;
+            ensure(1 == fwrite(&marker, 8, 1, coords[i]));
+            ensure(fclose(coords[i]) == 0, "can not write file");
+        }
+        if (table) {
+            _flush_table();
+            uint64_t marker = T_Sbox<uint8_t>::MARKER_END;
+            ensure(1 == fwrite(&marker, 8, 1, table));
+            ensure(fclose(table) == 0, "can not write file");
+            table = NULL;
+        }
+    }
+};
+#endif
+
+// Random n-bit permutation generated out of core with about 2^chunk_log
+// table entries in memory and temporary files in tmp_dir:
+// 1. each x goes to a uniformly random bucket (2^(n-chunk_log) buckets);
+// 2. the buckets, each shuffled in memory, are concatenated into
+//    the backward table bk[y] = x (uniformly random permutation),
+//    streamed to files, and the pairs (x, y) are bucketed again
+//    by the top bits of x;
+// 3. each x-bucket is scattered in memory into a chunk of
+//    the forward table fw[x] = y, streamed to files.
+// Writes coordinate files fw_prefix<i>.set and bk_prefix<i>.set
+// (as Sbox.coordinate(i).save_to_file) and, for non-empty filenames,
+// the tables fw_table and bk_table in the format of Sbox32 (n <= 32)
+// or Sbox64 (n > 32).
+// NOTE: not the same permutation as T_Sbox::GEN_random_permutation(n, seed)
+inline void GEN_random_permutation_files(
+    int n, uint64_t seed,
+    const std::string &fw_prefix,
+    const std::string &bk_prefix,
+    const std::string &tmp_dir,
+    int chunk_log=28,
+    const std::string &fw_table="",
+    const std::string &bk_table=""
+) {
+    // buckets are open files at the same time
+    const int MAX_BUCKETS_LOG = 8;
+
+    ensure(1 <= n && n <= 62);
+    ensure(0 <= chunk_log);
+    int buckets_log = max(0, n - chunk_log);
+    ensure(buckets_log <= MAX_BUCKETS_LOG, "too many buckets, increase chunk_log");
+    int low_log = n - buckets_log;
+    uint64_t n_buckets = 1ull << buckets_log;
+    uint64_t low_mask = (1ull << low_log) - 1;
+    int bytes = (n + 7) / 8;
+    uint64_t entry_size = n <= 32 ? 4 : 8;
+
+    std::mt19937_64 engine(seed);
+
+    auto bucket_files = [&] (const char *name) {
+        std::vector<_PackedFile> files;
+        fori (b, n_buckets) {
+            files.emplace_back(tmp_dir + "/" + name + std::to_string(b), bytes);
+        }
+        return files;
+    };
+
+    // 1. random buckets of x
+    auto xbuckets = bucket_files("perm_bucket");
+    for (auto &f: xbuckets) {
+        f.open("w");
+    }
+    fori (x, 1ull << n) {
+        uint64_t b = buckets_log ? engine() >> (64 - buckets_log) : 0;
+        xbuckets[b].append(x);
+    }
+    for (auto &f: xbuckets) {
+        f.close();
+    }
+
+    // 2. backward table, pairs (x, y) bucketed by x
+    auto pairs = bucket_files("inv_bucket");
+    for (auto &f: pairs) {
+        f.open("w");
+    }
+    _SboxFilesWriter bk(n, n, bk_prefix, bk_table, entry_size);
+    uint64_t y = 0;
+    std::vector<uint64_t> xs;
+    for (auto &f: xbuckets) {
+        xs.clear();
+        f.open("r");
+        uint64_t x;
+        while (f.read(x)) {
+            xs.push_back(x);
+        }
+        f.close();
+        f.remove();
+
+        shuffle(xs.begin(), xs.end(), engine);
+        for (auto x: xs) {
+            bk.write(x);
+            auto &pf = pairs[x >> low_log];
+            pf.append(x & low_mask);
+            pf.append(y);
+            y++;
+        }
+    }
+    xs = std::vector<uint64_t>();
+    bk.close();
+    for (auto &f: pairs) {
+        f.close();
+    }
+
+    // 3. forward table, chunk by chunk
+    _SboxFilesWriter fw(n, n, fw_prefix, fw_table, entry_size);
+    std::vector<uint64_t> chunk(1ull << low_log);
+    for (auto &f: pairs) {
+        f.open("r");
+        uint64_t xl, cnt = 0;
+        while (f.read(xl)) {
+            ensure(f.read(y), "truncated temporary file");
+            chunk[xl] = y;
+            cnt++;
+        }
+        f.close();
+        f.remove();
+        ensure(cnt == chunk.size(), "corrupted temporary file");
+
+        for (auto fy: chunk) {
+            fw.write(fy);
+        }
+    }
+    fw.close();
+}
@@ -1,6 +1,10 @@
+import os
 import logging
 
+from random import shuffle
+
 from divprop import Sbox, SboxDivision, DivCore_StrongComposition
+from divprop.sandwich import Sandwich
 
 from test_sboxes import get_sboxes
 
@@ -26,6 +30,25 @@ def check_one_DPPT(sbox, n, m, dppt):
     print(res)
     print()
 
+    # concurrent keys merge into the same sets
+    for n_threads in (1, 4):
+        DCS2 = DivCore_StrongComposition(n, m, m, sbox, sbox)
+        DCS2.process(2**m, n_threads)
+        assert DCS2.divcore == res
+
+    # products rebuilt for each v (over the memory cap)
+    for strategy in ("keys", "values"):
+        DCS2 = DivCore_StrongComposition(n, m, m, sbox, sbox)
+        DCS2.products_memory_cap = 0
+        DCS2.process(2**m, 0, strategy)
+        assert DCS2.divcore == res
+
+    # v in the outer loop, keys shared by threads
+    for n_threads in (1, 3):
+        DCS2 = DivCore_StrongComposition(n, m, m, sbox, sbox)
+        DCS2.process(2**m, n_threads, "values")
+        assert DCS2.divcore == res
+
     id = list(range(2**n))
     test1 = DivCore_StrongComposition(n, n, n, id, sbox)
     test2 = DivCore_StrongComposition(n, n, n, sbox, id)
@@ -42,5 +65,126 @@ def check_one_DPPT(sbox, n, m, dppt):
     assert test.divcore == ans.divcore
 
 
+def test_checkpoint(tmp_path):
+    n = 5
+    s1 = list(range(2**n))
+    s2 = list(range(2**n))
+    shuffle(s1)
+    shuffle(s2)
+    snd = Sandwich(Sbox(s1, n, n), Sbox(s2, n, n))
+    ans = snd.make_composition()
+    ans.process(2**n)
+
+    # interrupted run
+    filename = str(tmp_path / "divcore")
+    DCS = snd.make_composition()
+    DCS.process(10)
+    DCS.save_state(filename + ".state")
+    keys_left = list(DCS.keys_left)
+
+    DCS2 = snd.make_composition()
+    DCS2.load_state(filename + ".state")
+    assert list(DCS2.keys_left) == keys_left
+    assert list(DCS2.current) == list(DCS.current)
+    assert DCS2.divcore == DCS.divcore
+
+    res = snd.compute_divcore(chunk=8, filename=filename, resume=True)
+    assert res == ans.divcore
+
+    # the same RNG continues after resuming
+    DCS.shuffle()
+    DCS2.shuffle()
+    assert list(DCS2.keys_left) == list(DCS.keys_left)
+
+    other = Sandwich(Sbox(s2, n, n), Sbox(s1, n, n)).make_composition()
+    try:
+        other.load_state(filename + ".state")
+    except RuntimeError:
+        pass
+    else:
+        assert 0, "state of a different composition loaded"
+
+    # failed reads and writes close the file, no partial .tmp is left
+    target = tmp_path / "dir.state"
+    (target / "sub").mkdir(parents=True)
+    n_fds = len(os.listdir("/proc/self/fd"))
+    for _ in range(10):
+        for f in (
+            lambda: other.load_state(filename + ".state"),
+            lambda: DCS.save_state(str(target)),
+        ):
+            try:
+                f()
+            except RuntimeError:
+                pass
+            else:
+                assert 0, "state error not raised"
+    assert len(os.listdir("/proc/self/fd")) == n_fds
+    assert not (tmp_path / "dir.state.tmp").exists()
+
+
+def test_shards(tmp_path):
+    n = 5
+    s1 = list(range(2**n))
+    s2 = list(range(2**n))
+    shuffle(s1)
+    shuffle(s2)
+    snd = Sandwich(Sbox(s1, n, n), Sbox(s2, n, n))
+    ans = snd.compute_divcore()
+
+    n_shards = 3
+    state_files = []
+    for i in range(n_shards):
+        shard = snd.shard(i, n_shards)
+        assert len(shard.keys) in (10, 11)
+        filename = str(tmp_path / f"shard{i}")
+        shard.compute_divcore(chunk=4, filename=filename)
+        state_files.append(filename + ".state")
+    assert snd.merge_shards(state_files) == ans
+
+    # unfinished shard
+    DCS = snd.shard(0, n_shards).make_composition()
+    DCS.process(1)
+    DCS.save_state(state_files[0])
+    try:
+        snd.merge_shards(state_files)
+    except ValueError:
+        pass
+    else:
+        assert 0, "unfinished shard merged"
+
+    # no empty shards
+    assert len(snd.shard(31, 32).keys) == 1
+    try:
+        snd.shard(0, 33)
+    except ValueError:
+        pass
+    else:
+        assert 0, "empty shard created"
+    partial = snd.merge_shards(state_files, partial=True)
+    assert partial.UpperSet() <= ans.UpperSet()
+
+
+def test_components(tmp_path):
+    n = 4
+    s1 = list(range(2**n))
+    s2 = list(range(2**n))
+    shuffle(s1)
+    shuffle(s2)
+    snd = Sandwich(Sbox(s1, n, n), Sbox(s2, n, n))
+    masks = [1, 3, 8, 15]
+    res = snd.compute_components(masks, str(tmp_path), workers=2, chunk=4)
+    assert sorted(res) == masks
+    for mask in masks:
+        ans = Sandwich(Sbox(s1, n, n), Sbox(s2, n, n), mask=mask)
+        assert res[mask] == ans.compute_divcore()
+        assert (tmp_path / f"mask_{mask:x}.set").is_file()
+
+    # resumed from the saved states
+    assert snd.compute_components(masks[:2], str(tmp_path), workers=1) == {
+        mask: res[mask] for mask in masks[:2]
+    }
+
+
 if __name__ == '__main__':
     test_DPPT()
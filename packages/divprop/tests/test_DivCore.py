@@ -6,6 +6,7 @@ from binteger import Bin
 from subsets import DenseSet
 
 from divprop import Sbox, SboxDivision, SboxPeekANFs
+from divprop.utils import pool_shared
 
 from test_sboxes import get_sboxes
 
@@ -157,6 +158,233 @@ def test_SboxDivision_from_divcore():
             assert getattr(sd1, attr) == getattr(sd2, attr)
 
 
+def derived_from_scratch(divcore, mask_u, mask_v):
+    """The DERIVED sets computed one by one, without any cache"""
+    minimal = divcore.UpperSet_MinSet(mask_u, mask_v)
+    minimal_max = minimal.MaxSet()
+    redundant_min = divcore.copy()
+    redundant_min.do_UpperSet_Up1(True, mask_v)
+    redundant_min.do_MinSet()
+    return dict(
+        valid=divcore.UpperSet(),
+        invalid_max=divcore.ComplementU2L(),
+        full_dppt=divcore.UpperSet_Not(mask_u | mask_v, mask_u),
+        minimal=minimal,
+        min_dppt=divcore.UpperSet_MinSet(mask_u, mask_v, mask_u),
+        minimal_max=minimal_max,
+        redundant_min=redundant_min,
+        redundant_alternative_min=minimal_max.ComplementL2U(),
+    )
+
+
+def test_SboxDivision_compute():
+    sboxes = [Sbox(sbox, n, m) for name, sbox, n, m, dppt in get_sboxes()]
+    for n, m in ((3, 3), (4, 4), (4, 6), (5, 3), (6, 6)):
+        for _ in range(3):
+            sboxes.append(Sbox([randrange(2**m) for _ in range(2**n)], n, m))
+
+    for sbox in sboxes:
+        # fresh caches: nothing is shared with other tests
+        for attr in ("divcore",) + SboxDivision.DERIVED:
+            getattr(SboxDivision, attr).fget._cache.clear()
+
+        divcore = sbox.graph_dense()
+        divcore.do_DivCore()
+        sd = SboxDivision(sbox)
+        ans = derived_from_scratch(divcore, sd.mask_u, sd.mask_v)
+
+        res = sd.compute()
+        assert len(res) == len(SboxDivision.DERIVED)
+        for attr, value in zip(SboxDivision.DERIVED, res):
+            assert value == ans[attr], attr
+            assert getattr(sd, attr) is value
+
+        # aliases, reuse of cached sets
+        for attr in SboxDivision.DERIVED:
+            getattr(SboxDivision, attr).fget._cache.clear()
+        sd = SboxDivision(sbox)
+        assert sd.compute("lb", "ub") == [
+            ans["invalid_max"], ans["redundant_min"]
+        ]
+        assert sd.compute("ub2", "min_dppt", "lb") == [
+            ans["redundant_alternative_min"], ans["min_dppt"],
+            ans["invalid_max"],
+        ]
+
+
+def test_SboxDivision_compute_store(tmp_path, monkeypatch):
+    from divprop.lazy import SetGraph
+    from divprop.store import ResultStore
+
+    evaluated = []
+    evaluate = SetGraph.evaluate
+    monkeypatch.setattr(
+        SetGraph, "evaluate",
+        lambda g, outputs: evaluated.extend(outputs) or evaluate(g, outputs),
+    )
+    puts = []
+    put = ResultStore.put
+    monkeypatch.setattr(
+        ResultStore, "put",
+        lambda store, key, value: puts.append(key) or put(store, key, value),
+    )
+    monkeypatch.setattr(SboxDivision, "CACHE", ResultStore(tmp_path))
+
+    sbox = Sbox([randrange(2**5) for _ in range(2**5)], 5, 5)
+    for attr in ("divcore",) + SboxDivision.DERIVED:
+        getattr(SboxDivision, attr).fget._cache.clear()
+    res = SboxDivision(sbox).compute()
+    assert len(evaluated) == len(SboxDivision.DERIVED)
+    assert len(puts) == 1 + len(SboxDivision.DERIVED)
+
+    # warm store: everything is loaded, nothing computed or rewritten
+    for attr in ("divcore",) + SboxDivision.DERIVED:
+        getattr(SboxDivision, attr).fget._cache.clear()
+    evaluated.clear()
+    puts.clear()
+    assert SboxDivision(sbox).compute() == res
+    assert evaluated == []
+    assert puts == []
+
+    # stored sets are leaves of the missing ones
+    for attr in ("divcore",) + SboxDivision.DERIVED:
+        getattr(SboxDivision, attr).fget._cache.clear()
+    f = SboxDivision.redundant_alternative_min.fget
+    key = f._calc_key(SboxDivision(sbox))
+    for ext in ResultStore.EXTS:
+        SboxDivision.CACHE.filename(key, ext).unlink(missing_ok=True)
+    assert SboxDivision(sbox).compute("ub2") == [res[-1]]
+    assert len(evaluated) == 1
+    assert puts == [key]
+
+    for attr in ("divcore",) + SboxDivision.DERIVED:
+        getattr(SboxDivision, attr).fget._cache.clear()
+
+
+def test_canonical():
+    from divprop.canonical import canonical_form, SboxTransform
+
+    def divcore(sbox):
+        ret = sbox.graph_dense()
+        ret.do_DivCore()
+        return ret
+
+    for n, m, perms in ((4, 4, True), (5, 3, True), (6, 6, False)):
+        sbox = Sbox([randrange(2**m) for _ in range(2**n)], n, m)
+        pin = list(range(n))
+        pout = list(range(m))
+        if perms:
+            shuffle(pin)
+            shuffle(pout)
+        t = SboxTransform(n, m, randrange(2**n), randrange(2**m), pin, pout)
+        sbox2 = t.apply(sbox)
+        assert t.divcore_forward(divcore(sbox)) == divcore(sbox2)
+        assert t.divcore_backward(divcore(sbox2)) == divcore(sbox)
+
+        canon, t1 = canonical_form(sbox, perms=perms)
+        canon2, t2 = canonical_form(sbox2, perms=perms)
+        assert list(canon) == list(canon2) == list(t1.apply(sbox))
+        assert canon[0] == 0
+
+        # one divcore computation for the class, remapped
+        f = SboxDivision.divcore.fget
+        f._cache.clear()
+        SboxDivision.CANONICAL = True
+        try:
+            assert SboxDivision(sbox).divcore == divcore(sbox)
+            assert len(f._cache) == 2
+            assert SboxDivision(sbox2).divcore == divcore(sbox2)
+            assert len(f._cache) == 3
+            assert SboxDivision(canon).divcore == divcore(canon)
+            assert len(f._cache) == 3
+        finally:
+            SboxDivision.CANONICAL = False
+            f._cache.clear()
+
+
+def test_sbox_table(tmp_path, monkeypatch):
+    from divprop.all_sboxes import sboxes
+    from divprop.lazy import SetGraph
+    from divprop.store import ResultStore
+    from divprop.tool_sbox_table import iter_table, compute_table, write_table
+
+    names = ["PRINTcipher", "GIFT", "PRESENT", "Ascon"]
+    batch = {name: sboxes[name] for name in names}
+    store = ResultStore(tmp_path / "cache")
+    rows = compute_table(batch, workers=2, store=store)
+    assert [row[0] for row in rows] == ["PRINTcipher", "GIFT", "PRESENT", "Ascon"]
+    # columns by the individual properties (not compute()), fresh caches
+    for attr in ("divcore",) + SboxDivision.DERIVED:
+        getattr(SboxDivision, attr).fget._cache.clear()
+    for name, n, m, *counts in rows:
+        dc = SboxDivision(sboxes[name])
+        lb = len(dc.invalid_max)
+        ub = len(dc.redundant_min)
+        ub2 = len(dc.redundant_alternative_min)
+        assert (n, m) == (dc.n, dc.m)
+        assert counts == [
+            len(dc.min_dppt), len(dc.divcore), lb, ub, ub2, lb + min(ub, ub2),
+        ]
+    assert store.size() > 0
+
+    # the settings are given to the workers only
+    for row in iter_table(batch, workers=1, store=store, canonical=True):
+        assert SboxDivision.CACHE is None
+        assert not SboxDivision.CANONICAL
+    assert compute_table(batch, workers=2, canonical=True) == rows
+
+    # served by the store: nothing computed or written in the workers
+    for attr in ("divcore",) + SboxDivision.DERIVED:
+        getattr(SboxDivision, attr).fget._cache.clear()
+
+    def fail(*args):
+        raise AssertionError("computed with a warm store")
+
+    with monkeypatch.context() as mp:
+        mp.setattr(
+            SetGraph, "evaluate",
+            lambda g, outputs: outputs and fail() or [],
+        )
+        mp.setattr(ResultStore, "put", fail)
+        assert compute_table(batch, workers=1, store=store) == rows
+
+    write_table(rows, str(tmp_path / "table.tsv"))
+    lines = (tmp_path / "table.tsv").read_text().splitlines()
+    assert len(lines) == 1 + len(rows)
+    assert lines[2].split("\t") == list(map(str, rows[1]))
+
+    write_table(rows[:1], str(tmp_path / "table.tex"))
+    name, n, m, *counts = rows[0]
+    assert (tmp_path / "table.tex").read_text() == (
+        f"\\scriptsize {name} & {n} & "
+        + " & ".join(map(str, counts)) + " & - \\\\\n"
+    )
+
+
+def test_SetGraph():
+    from divprop.lazy import SetGraph
+
+    s = DenseSet(6, [3, 12, 40])
+    g = SetGraph()
+    leaf = g.leaf("s", lambda: s)
+    up = g.apply(leaf, "do_UpperSet")
+    assert g.apply(leaf, "do_UpperSet") is up
+    a = g.apply(up, "do_Not", 7)
+    b = g.apply(g.apply(up, "do_MinSet"), "do_Not", 7)
+
+    ra, rb = g.evaluate([a, b])
+    assert ra == s.UpperSet().Not(7)
+    assert rb == s.UpperSet().MinSet().Not(7)
+    assert list(s) == [3, 12, 40]
+    # copy of the leaf and of the shared prefix, the rest in place
+    assert g.n_ops == 4
+    assert g.n_copies == 2
+    # the shared prefix is an output: not modified
+    rup, rb = g.evaluate([up, b])
+    assert rup == s.UpperSet()
+    assert g.n_copies == 4
+
+
 def form_partition(*sets):
     for s in sets:
         break
@@ -185,6 +413,63 @@ def test_peekanfs():
     print("OK")
 
 
+def test_peekanfs_native():
+    for n in range(2, 11):
+        sbox = list(range(2**n))
+        shuffle(sbox)
+        sbox = Sbox(sbox, n, n)
+
+        native = SboxPeekANFs(sbox)
+        python = SboxPeekANFs(sbox)
+        ans = native.compute(native=True)
+        assert ans == python.compute(native=False)
+        assert native.n_queries == python.n_queries
+
+        # level-batched evaluation
+        assert SboxPeekANFs(sbox).compute(native=True, workers=3) == ans
+        if n <= 6:
+            assert SboxPeekANFs(sbox).compute(native=False, workers=2) == ans
+            assert pool_shared() is None
+
+
+def test_heavy_peeks_product_cache(tmp_path):
+    from divprop.tool_random_sbox_benchmark import HeavyPeeks, save_coordinates
+
+    n = 8
+    sbox = list(range(2**n))
+    shuffle(sbox)
+    sbox = Sbox(sbox, n, n)
+    isbox = ~sbox
+    save_coordinates(sbox, str(tmp_path / "fw"), batch=3)
+    save_coordinates(isbox, str(tmp_path / "bk"), batch=3)
+    fws = [str(tmp_path / f"fw{i}.set") for i in range(n)]
+    bks = [str(tmp_path / f"bk{i}.set") for i in range(n)]
+    assert DenseSet.load_from_file(fws[5]) == sbox.coordinate(5)
+
+    # room for all products: each one is one AND away from a cached one
+    pa = HeavyPeeks(n, fws, bks, product_cache_bytes=2**n * 2**n // 8)
+    for mask in range(2**n):
+        assert sbox.coordinate_product(mask) == pa.get_product(mask, False)
+    assert pa.n_product_hits == 2**n - 1
+    # an exact hit hands over the cached set
+    prod = pa.get_product(5, False)
+    assert pa.n_product_hits == 2**n
+    assert (5, False) not in pa.products
+    prod.do_ParitySet()
+    assert pa.get_product(5, False) == sbox.coordinate_product(5)
+
+    ans = SboxPeekANFs(sbox).compute()
+    for product_cache_bytes in (0, 128, 2**20):
+        pa = HeavyPeeks(
+            n, fws, bks, memorize=True,
+            product_cache_bytes=product_cache_bytes,
+        )
+        assert pa.compute() == ans
+        assert len(pa.products) <= product_cache_bytes // 32
+
+    assert HeavyPeeks(n, fws, bks, mmap=True).compute() == ans
+
+
 def test_component_anf():
     for name, sbox, n, m, dppt in get_sboxes():
         if n >= 7:
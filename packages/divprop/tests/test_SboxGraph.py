@@ -1,4 +1,12 @@
+import ctypes
+import pickle
+from random import shuffle, randrange
+
+import pytest
+
+from subsets import DenseSet
 from divprop import Sbox
+from divprop.lib import Sbox32, GEN_random_permutation_files
 
 
 def test_Sbox():
@@ -26,5 +34,128 @@ def test_Sbox():
     assert list(q7) == [5]
 
 
+def test_Sbox_tables():
+    # n >= 16 runs the parallel loops
+    for n, m in ((2, 3), (3, 3), (7, 5), (16, 9)):
+        table = [randrange(2**m) for _ in range(2**n)]
+        s = Sbox(table, n, m)
+
+        coords = [
+            [x for x, y in enumerate(table) if y >> (m - 1 - i) & 1]
+            for i in range(m)
+        ]
+        assert [list(f) for f in s.coordinates()] == coords
+        assert [list(s.coordinate(i)) for i in range(m)] == coords
+
+        mask = randrange(2**m)
+        assert list(s.coordinate_product(mask)) == [
+            x for x, y in enumerate(table) if y & mask == mask
+        ]
+        assert list(s.graph_dense()) == [
+            (x << m) | y for x, y in enumerate(table)
+        ]
+
+    for n in (3, 16):
+        table = list(range(2**n))
+        shuffle(table)
+        s = Sbox(table, n, n)
+        inv = [0] * 2**n
+        for x, y in enumerate(table):
+            inv[y] = x
+        assert list(s.inverse()) == inv
+        s.invert_in_place()
+        assert list(s) == inv
+
+        # not a permutation: an error, the table is unchanged
+        table[1] = table[0]
+        s = Sbox(table, n, n)
+        for f in (s.inverse, s.invert_in_place):
+            try:
+                f()
+            except RuntimeError:
+                pass
+            else:
+                assert 0, "inverted a non-permutation"
+        assert list(s) == table
+
+    # 64x64 transpose kernel: full and partial blocks, all word sizes
+    for n, m in ((0, 1), (5, 7), (6, 8), (9, 16), (10, 33), (7, 64)):
+        table = [randrange(2**m) for _ in range(2**n)]
+        s = Sbox(table, n, m)
+        coords = [s.coordinate(i) for i in range(m)]
+        assert list(s.coordinates_fast()) == coords
+        first = randrange(m)
+        count = randrange(m - first + 1)
+        assert list(s.coordinates_fast(first, count)) == \
+            coords[first:first+count]
+
+    s = type(s).GEN_random_permutation(16, 1)
+    assert sorted(s) == list(range(2**16))
+
+
+def test_Sbox_buffer():
+    for n, m in ((3, 3), (4, 10), (5, 20), (6, 40)):
+        table = list(range(2**n))
+        shuffle(table)
+        table = [(y << (m - n)) | (y & 1) for y in table]
+        s = Sbox(table, n, m)
+
+        ai = s.__array_interface__
+        assert ai["shape"] == (2**n,)
+        assert ai["typestr"][1:] == "u%d" % s.ENTRY_SIZE
+        ctype = {
+            1: ctypes.c_uint8, 2: ctypes.c_uint16,
+            4: ctypes.c_uint32, 8: ctypes.c_uint64,
+        }[s.ENTRY_SIZE]
+        view = (ctype * 2**n).from_address(ai["data"][0])
+        assert list(view) == table
+
+        s2 = pickle.loads(pickle.dumps(s))
+        assert type(s2) is type(s)
+        assert list(s2) == table
+        assert isinstance(s.__getstate__()[2], bytes)
+
+        # old pickles store the table as a list
+        s3 = type(s).__new__(type(s))
+        s3.__setstate__((n, m, table))
+        assert list(s3) == table
+
+
+def test_Sbox_numpy():
+    np = pytest.importorskip("numpy")
+    s = Sbox([1, 2, 3, 4, 0, 7, 6, 5], 3, 3)
+    arr = np.asarray(s)
+    assert arr.dtype == np.uint8
+    assert list(arr) == list(s)
+    # zero-copy
+    s[0] = 7
+    assert arr[0] == 7
+
+
+def test_random_permutation_files(tmp_path):
+    # single partial block, many buckets, everything in one chunk
+    for n, chunk_log in ((3, 1), (9, 4), (10, 20)):
+        path = tmp_path / str(n)
+        path.mkdir()
+        fw_table = str(path / "fw.sbox")
+        bk_table = str(path / "bk.sbox")
+        GEN_random_permutation_files(
+            n, 1, str(path / "fw"), str(path / "bk"), str(path), chunk_log,
+            fw_table, bk_table,
+        )
+        fw = Sbox32.load_from_file(fw_table)
+        bk = Sbox32.load_from_file(bk_table)
+        assert sorted(fw) == list(range(2**n))
+        assert list(fw.inverse()) == list(bk)
+        for i in range(n):
+            assert DenseSet.load_from_file(str(path / f"fw{i}.set")) \
+                == fw.coordinate(i)
+            assert DenseSet.load_from_file(str(path / f"bk{i}.set")) \
+                == bk.coordinate(i)
+        # temporary buckets removed
+        assert len(list(path.iterdir())) == 2 * n + 2
+
+
 if __name__ == '__main__':
     test_Sbox()
+    test_Sbox_buffer()
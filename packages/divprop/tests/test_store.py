@@ -0,0 +1,133 @@
+import os
+import multiprocessing
+
+from subsets import DenseSet
+
+from divprop import Sbox, SboxDivision
+from divprop.store import ResultStore, NotFound, sbox_digest
+from divprop.utils import cached_method
+
+
+def test_store(tmp_path):
+    store = ResultStore(tmp_path)
+    assert store.get("a") is NotFound
+    assert "a" not in store
+
+    s = DenseSet(3, [1, 2, 7])
+    filename = store.put("a", s)
+    assert filename.suffix == ".set"
+    assert filename.parent.parent.parent == tmp_path
+    assert "a" in store
+    assert store.get("a") == s
+
+    filename = store.put("b", [s, 123])
+    assert filename.suffix == ".pkl"
+    assert store.get("b") == [s, 123]
+
+    # overwritten atomically, no temporary files left
+    store.put("a", DenseSet(3, [0]))
+    assert list(store.get("a")) == [0]
+    assert not [f for f in tmp_path.glob("*/*/.*")]
+
+
+def test_store_eviction(tmp_path):
+    store = ResultStore(tmp_path)
+    sizes = {}
+    for i, key in enumerate("abcd"):
+        filename = store.put(key, DenseSet(12))
+        sizes[key] = filename.stat().st_size
+        # distinct mtimes
+        os.utime(filename, (i, i))
+    # hit refreshes "a"
+    assert store.get("a") is not NotFound
+
+    store.max_bytes = sizes["a"] + sizes["c"] + sizes["d"]
+    store.put("e", DenseSet(3))
+    assert store.size() <= store.max_bytes
+    assert "a" in store and "e" in store
+    assert "b" not in store and "c" not in store
+
+    # the store is scanned again only to evict
+    scans = []
+    entries = store._entries
+    store._entries = lambda: scans.append(1) or entries()
+    store.max_bytes = 10**6
+    for key in "fgh":
+        store.put(key, DenseSet(3))
+    assert len(scans) == 0
+    store.max_bytes = store._size - 1
+    store.put("f", DenseSet(3))
+    assert len(scans) == 1
+    assert store.size() <= store.max_bytes
+
+
+def _put_many(path):
+    store = ResultStore(path)
+    for _ in range(20):
+        store.put("same", DenseSet(10, list(range(100))))
+        assert len(store.get("same")) == 100
+
+
+def test_store_concurrent(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_put_many, args=(tmp_path,)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    assert len(ResultStore(tmp_path).get("same")) == 100
+
+
+class Counted:
+    CACHE = None
+    calls = 0
+
+    def __init__(self, cache_key):
+        self.cache_key = cache_key
+
+    @cached_method
+    def value(self, x):
+        type(self).calls += 1
+        return DenseSet(4, [x])
+
+
+def test_cached_method_store(tmp_path):
+    Counted.CACHE = ResultStore(tmp_path)
+    try:
+        assert list(Counted("k").value(3)) == [3]
+        assert Counted.calls == 1
+        # loaded from the store after the memory cache is gone
+        Counted.value._cache.clear()
+        assert list(Counted("k").value(3)) == [3]
+        assert Counted.calls == 1
+        assert list(Counted("k2").value(3)) == [3]
+        assert Counted.calls == 2
+        # hits share the frozen result
+        res = Counted("k2").value(3)
+        assert res is Counted("k2").value(3)
+        assert res.is_frozen()
+    finally:
+        Counted.CACHE = None
+
+    s1 = Sbox([1, 2, 3, 0], 2, 2)
+    s2 = Sbox([1, 2, 3, 0], 2, 3)
+    assert sbox_digest(s1) != sbox_digest(s2)
+    assert SboxDivision(s1).cache_key != SboxDivision(s2).cache_key
+
+    dc = SboxDivision(s1)
+    assert dc.divcore is dc.divcore
+    try:
+        dc.divcore.do_UpperSet()
+    except RuntimeError:
+        pass
+    else:
+        assert 0, "cached divcore modified"
+    ub = dc.divcore.copy()
+    ub.do_UpperSet()
+    assert ub == dc.valid
+
+    # the set given to from_divcore stays mutable
+    divcore = dc.divcore.copy()
+    dc2 = SboxDivision.from_divcore(divcore, 2, 2)
+    assert dc2.divcore.is_frozen() and not divcore.is_frozen()
@@ -20,6 +20,7 @@ install_requires = [
 entry_points = {
     'console_scripts': [
         'subsets.info = subsets.tools:tool_setinfo',
+        'subsets.sweep_benchmark = subsets.tools:tool_sweep_benchmark',
     ]
 }
 
@@ -32,6 +33,7 @@ ext_modules = [
             "./subsets/DenseSet.cpp",
             "./subsets/DenseBox.cpp",
             "./subsets/DenseTernary.cpp",
+            "./subsets/SparseSet.cpp",
         ],
         swig_opts=[
             "-c++",
@@ -45,6 +47,7 @@ ext_modules = [
             "./subsets/hackycpp.hpp",
 
             "./subsets/Sweep.hpp",
+            "./subsets/SweepKernels.hpp",
             "./subsets/BitSet.hpp",
             "./subsets/DenseSet.hpp",
             "./subsets/DenseBox.hpp",
@@ -52,8 +55,10 @@ ext_modules = [
             "./subsets/ternary.hpp",
             "./subsets/Sweep3.hpp",
             "./subsets/DenseTernary.hpp",
+            "./subsets/SparseSet.hpp",
         ],
-        extra_compile_args=["-std=c++2a", "-O3"],
+        extra_compile_args=["-std=c++2a", "-O3", "-fopenmp"],
+        extra_link_args=["-fopenmp"],
     ),
 ]
 
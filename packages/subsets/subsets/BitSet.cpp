@@ -1,5 +1,10 @@
 #include <sstream>
 
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
 #include "common.hpp"
 
 #include "BitSet.hpp"
@@ -14,7 +19,7 @@ void BitSet::set_quiet(bool value) {
 
 BitSet::BitSet(const vector<uint64_t> &_data) {
     n = _data.size() << 6;
-    data = _data;
+    data.assign(_data.begin(), _data.end());
     _trim();
 }
 BitSet::BitSet(const string &_bits) {
@@ -476,6 +481,68 @@ BitSet BitSet::load_from_file(FILE *fd) {
     return res;
 }
 
+BitSetMapping::BitSetMapping(
+    void *_addr, uint64_t _length, uint64_t offset, uint64_t _nwords
+) : addr(_addr), length(_length), nwords(_nwords), initializing(true) {
+    words = (uint64_t *)((char *)addr + offset);
+}
+BitSetMapping::~BitSetMapping() {
+    munmap(addr, length);
+}
+// closes the file descriptor when leaving the scope (also on errors)
+struct _FdGuard {
+    int fd;
+    ~_FdGuard() {
+        if (fd >= 0) {
+            close(fd);
+        }
+    }
+};
+
+BitSet BitSet::map_file(const char *filename) {
+    int fd = open(filename, O_RDONLY);
+    ensure(fd >= 0, "can not open file");
+    _FdGuard guard{fd};
+
+    struct stat st;
+    ensure(fstat(fd, &st) == 0, "can not stat file");
+    uint64_t length = st.st_size;
+
+    uint64_t header[4] = {};
+    ensure(length >= sizeof(header), "file format error");
+    ensure(pread(fd, header, sizeof(header), 0) == sizeof(header));
+    if (header[0] != VERSION_DENSE) {
+        return load_from_file(filename);
+    }
+    uint64_t vn = header[1];
+    uint64_t vl = header[2];
+    ensure(vl == HICEIL(vn), "file format error");
+    ensure(length == sizeof(header) + vl * 8 + 8, "file format error");
+
+    void *addr = mmap(NULL, length, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+    ensure(addr != MAP_FAILED, "can not map file");
+
+    auto mapping = make_shared<BitSetMapping>(addr, length, sizeof(header), vl);
+    ensure(mapping->words[vl] == MARKER_END, "file format error");
+    if (!QUIET) {
+        fprintf(stderr,
+            "Mapping BitSet(n=%lu)"
+            " with %lu words\n",
+            vn, vl
+        );
+    }
+
+    BitSet res;
+    res.n = vn;
+    res.data = decltype(res.data)(vl, BitSetAllocator<uint64_t>(mapping));
+    mapping->initializing = false;
+    return res;
+}
+bool BitSet::is_mapped() const {
+    auto mapping = data.get_allocator().mapping;
+    return mapping && (void *)data.data() == (void *)mapping->words;
+}
+
 uint64_t BitSet::_get_data_ptr() const {
     return (uint64_t)data.data();
 }
\ No newline at end of file
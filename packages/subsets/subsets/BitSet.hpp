@@ -2,13 +2,18 @@
 
 #ifdef SWIG
 %pythoncode %{
+    import sys
     import ctypes
+
+    # byte order mark for __array_interface__ type strings
+    _NATIVE_ORDER = "<" if sys.byteorder == "little" else ">"
 %}
 #endif
 
 #include "hackycpp.h" // for types
 
 #include <functional>
+#include <memory>
 
 namespace Pack64 {
     inline uint64_t HI(uint64_t x) {
@@ -24,9 +29,75 @@ namespace Pack64 {
     }
 }
 
+#ifndef SWIG
+// Copy-on-write file mapping holding the words of a BitSet
+// (see BitSet::map_file), unmapped when the last user is gone.
+struct BitSetMapping {
+    void *addr;
+    uint64_t length;
+    uint64_t *words;
+    uint64_t nwords;
+    // words are already initialized (by the file) while true
+    bool initializing;
+
+    BitSetMapping(void *_addr, uint64_t _length, uint64_t offset, uint64_t _nwords);
+    ~BitSetMapping();
+};
+
+// Allocator of BitSet words: heap by default,
+// or the pages of a file mapping for mapped sets.
+// Copies of a mapped vector are made on the heap.
+template<typename T>
+struct BitSetAllocator {
+    typedef T value_type;
+    typedef std::true_type propagate_on_container_move_assignment;
+    typedef std::true_type propagate_on_container_swap;
+
+    std::shared_ptr<BitSetMapping> mapping;
+
+    BitSetAllocator() {};
+    BitSetAllocator(const std::shared_ptr<BitSetMapping> &_mapping) : mapping(_mapping) {};
+    template<typename U>
+    BitSetAllocator(const BitSetAllocator<U> &b) : mapping(b.mapping) {};
+
+    BitSetAllocator select_on_container_copy_construction() const {
+        return BitSetAllocator();
+    }
+
+    T *allocate(size_t cnt) {
+        if (mapping && mapping->initializing) {
+            ensure(cnt * sizeof(T) == mapping->nwords * 8);
+            return (T *)mapping->words;
+        }
+        return std::allocator<T>().allocate(cnt);
+    }
+    void deallocate(T *ptr, size_t cnt) {
+        if (mapping && (void *)ptr == (void *)mapping->words)
+            return;
+        std::allocator<T>().deallocate(ptr, cnt);
+    }
+    template<typename U, typename... Args>
+    void construct(U *ptr, Args&&... args) {
+        // keep the file contents
+        if (sizeof...(Args) == 0 && mapping && mapping->initializing)
+            return;
+        ::new((void *)ptr) U(std::forward<Args>(args)...);
+    }
+
+    bool operator==(const BitSetAllocator &b) const {
+        return mapping == b.mapping;
+    }
+    bool operator!=(const BitSetAllocator &b) const {
+        return mapping != b.mapping;
+    }
+};
+#endif
+
 struct BitSet {
     uint64_t n;
-    std::vector<uint64_t> data;
+    #ifndef SWIG
+    std::vector<uint64_t, BitSetAllocator<uint64_t>> data;
+    #endif
 
     static const uint64_t VERSION_SPARSE = 0x1c674e0bf03fea6full;
     static const uint64_t VERSION_DENSE = 0x556483ae0da9468full;
@@ -62,6 +133,12 @@ struct BitSet {
     void save_to_file(const char *filename) const;
     static BitSet load_from_file(const char *filename);
     static BitSet load_from_file(FILE *fd);
+    // Zero-copy copy-on-write mapping of a file saved by save_to_file:
+    // pages are read on demand and shared (page cache) between processes,
+    // modifications stay private to the set.
+    // Files in sparse format are loaded normally.
+    static BitSet map_file(const char *filename);
+    bool is_mapped() const;
     std::string str() const;
     std::string info() const;
     uint64_t get_hash() const;
@@ -140,14 +217,33 @@ struct BitSet {
     def __len__(self):
         return self.get_weight()
 
+    @property
+    def data(self):
+        # read-only copy of the words
+        # (the C++ vector is not wrapped, it may be a file mapping)
+        return tuple((ctypes.c_uint64 * self.nwords()).from_address(
+            self._get_data_ptr()
+        ))
+
+    @property
+    def __array_interface__(self):
+        # zero-copy view of the words, e.g. numpy.asarray(bitset)
+        # (element i is bit i % 64 of word i // 64)
+        return dict(
+            version=3,
+            shape=(self.nwords(),),
+            typestr=_NATIVE_ORDER + "u8",
+            data=(self._get_data_ptr(), False),
+        )
+
     def __getstate__(self):
-        data = ctypes.string_at(self._get_data_ptr(), self.data.size() * 8)
-        return self.n, self.data.size(), data
+        data = ctypes.string_at(self._get_data_ptr(), self.nwords() * 8)
+        return self.n, self.nwords(), data
 
     def __setstate__(self, st):
         n, l, data = st
         self.__init__(n)
-        assert self.data.size() == l
+        assert self.nwords() == l
         dst = self._get_data_ptr()
         src = self._bytes_to_ctypes(data)
         ctypes.memmove(dst, src, len(data))
@@ -3,6 +3,7 @@
 #include "BitSet.hpp"
 #include "DenseSet.hpp"
 #include "DenseBox.hpp"
+#include "SparseSet.hpp"
 #include "Sweep.hpp"
 
 TTi
@@ -14,9 +15,37 @@ static T vector_sum(const vector<T> & vec) {
     return s;
 }
 
+int DenseSet::N_THREADS = 0;
+
 void DenseSet::set_quiet(bool value) {
     BitSet::set_quiet(value);
 }
+void DenseSet::set_num_threads(int value) {
+    ensure(value >= 0, "number of threads must be non-negative");
+    DenseSet::N_THREADS = value;
+}
+int DenseSet::get_num_threads() {
+    if (N_THREADS == 0) {
+        return sweep_max_threads();
+    }
+    return N_THREADS;
+}
+
+static const char *SWEEP_ISA_NAMES[] = {"generic", "avx2", "avx512"};
+
+void DenseSet::set_sweep_isa(const std::string &isa) {
+    fori(i, 3) {
+        if (isa == SWEEP_ISA_NAMES[i]) {
+            ensure(sweep_isa_supported(i), "instruction set not supported by the CPU");
+            SWEEP_ISA = i;
+            return;
+        }
+    }
+    ensure(0, "unknown instruction set (known: generic, avx2, avx512)");
+}
+std::string DenseSet::get_sweep_isa() {
+    return SWEEP_ISA_NAMES[SWEEP_ISA];
+}
 
 DenseSet::DenseSet(int n, const std::vector<uint64_t> &ints) : DenseSet::DenseSet(n) {
     for (auto v: ints) {
@@ -30,20 +59,32 @@ DenseSet::DenseSet(int n, const std::vector<uint64_t> &ints) : DenseSet::DenseSe
 //     data.resize(HICEIL(1ull << n));
 // }
 DenseSet DenseSet::copy() const {
-    return *this;
+    DenseSet ret = *this;
+    ret.frozen = false;
+    return ret;
+}
+void DenseSet::freeze() {
+    frozen = true;
+}
+bool DenseSet::is_frozen() const {
+    return frozen;
 }
 void DenseSet::resize(uint64_t n) {
+    _check_mutable();
     this->n = n;
     this->data.resize(1ull << n);
 }
 void DenseSet::clear() {
+    _check_mutable();
     data.clear();
     n = 0;
 }
 void DenseSet::empty() {
+    _check_mutable();
     data.empty();
 }
 void DenseSet::fill() {
+    _check_mutable();
     data.fill();
 }
 
@@ -62,25 +103,32 @@ int DenseSet::get(uint64_t x) const {
     return data.get(x);
 }
 void DenseSet::set(uint64_t x) {
+    _check_mutable();
     data.set(x);
 }
 void DenseSet::unset(uint64_t x) {
+    _check_mutable();
     data.unset(x);
 }
 void DenseSet::flip(uint64_t x) {
+    _check_mutable();
     data.get(x) ? data.unset(x) : data.set(x);
 }
 void DenseSet::set(uint64_t x, uint64_t value) {
+    _check_mutable();
     data.set(x, value);
 }
 void DenseSet::add(uint64_t x) {
+    _check_mutable();
     data.add(x);
 }
 void DenseSet::remove(uint64_t x) {
+    _check_mutable();
     // ensure is inside
     data.remove(x);
 }
 void DenseSet::discard(uint64_t x) {
+    _check_mutable();
     // ignore if is inside
     data.discard(x);
 }
@@ -150,21 +198,25 @@ bool DenseSet::operator>=(const DenseSet & b) const {
 }
 
 DenseSet & DenseSet::operator|=(const DenseSet & b) {
+    _check_mutable();
     ensure(is_compatible_set(b), "sets have different dimensions");
     data |= b.data;
     return *this;
 }
 DenseSet & DenseSet::operator^=(const DenseSet & b) {
+    _check_mutable();
     ensure(is_compatible_set(b), "sets have different dimensions");
     data ^= b.data;
     return *this;
 }
 DenseSet & DenseSet::operator&=(const DenseSet & b) {
+    _check_mutable();
     ensure(is_compatible_set(b), "sets have different dimensions");
     data &= b.data;
     return *this;
 }
 DenseSet & DenseSet::operator-=(const DenseSet & b) {
+    _check_mutable();
     ensure(is_compatible_set(b), "sets have different dimensions");
     data -= b.data;
     return *this;
@@ -302,26 +354,36 @@ void DenseSet::do_ParitySet(uint64_t mask) {
     do_Sweep<XOR_down<uint64_t>>(mask);
 }
 void DenseSet::do_Complement() {
+    _check_mutable();
     data.do_Complement();
 }
 void DenseSet::do_Not(uint64_t mask) {
+    _check_mutable();
     mask &= (1ull << n)-1;
     auto &raw = data.data;
     uint64_t lo = LO(mask);
     uint64_t hi = HI(mask);
+    int n_threads = get_num_threads();
     if (lo) {
-        for(uint64_t &word: raw) {
-            GenericSweepWord<SWAP<uint64_t>>(word, lo);
-        }
+        GenericSweepWords<SWAP<uint64_t>>(raw, lo, n_threads);
     }
-    if (hi) {
-        fori(i, raw.size()) {
-            uint64_t j = i ^ hi;
-            ensure(j < raw.size());
-            if (j < uint64_t(i))
-                continue;
-            swap(raw[i], raw[j]);
-        }
+    do_NotWords(hi);
+}
+void DenseSet::do_NotWords(uint64_t hi) {
+    _check_mutable();
+    if (!hi)
+        return;
+    auto &raw = data.data;
+    uint64_t size = raw.size();
+    ensure((hi | (size - 1)) == size - 1);
+    int n_threads = get_num_threads();
+    bool parallel = n_threads > 1 && size >= (1ull << SWEEP_PARALLEL_MIN_LOG);
+    #pragma omp parallel for num_threads(n_threads) schedule(static) if(parallel)
+    for (uint64_t i = 0; i < size; i++) {
+        uint64_t j = i ^ hi;
+        if (j < i)
+            continue;
+        swap(raw[i], raw[j]);
     }
 }
 void DenseSet::do_UpperSet(uint64_t mask) {
@@ -330,18 +392,41 @@ void DenseSet::do_UpperSet(uint64_t mask) {
 void DenseSet::do_LowerSet(uint64_t mask) {
     do_Sweep<OR_down<uint64_t>>(mask);
 }
+// the chains below are fused into few passes over the data,
+// every sweep after the first one is order-independent on its input
+// (LESS_up on upward-closed sets, MORE_down on downward-closed sets)
 void DenseSet::do_MinSet(uint64_t mask) {
-    do_UpperSet(mask);
-    do_Sweep<LESS_up<uint64_t>>(mask);
+    do_SweepChain({
+        SweepStepOf<OR_up<uint64_t>>(mask),
+        SweepStepOf<LESS_up<uint64_t>>(mask),
+    });
 }
 void DenseSet::do_MaxSet(uint64_t mask) {
-    do_LowerSet(mask);
-    do_Sweep<MORE_down<uint64_t>>(mask);
+    do_SweepChain({
+        SweepStepOf<OR_down<uint64_t>>(mask),
+        SweepStepOf<MORE_down<uint64_t>>(mask),
+    });
 }
 void DenseSet::do_DivCore(uint64_t mask) {
-    do_Sweep<XOR_up<uint64_t>>(mask);
-    do_MaxSet(mask);
-    do_Not(mask);
+    // Mobius -> MaxSet -> Not
+    do_SweepChain({
+        SweepStepOf<XOR_up<uint64_t>>(mask),
+        SweepStepOf<OR_down<uint64_t>>(mask),
+        SweepStepOf<MORE_down<uint64_t>>(mask),
+    }, mask);
+}
+void DenseSet::do_UpperSet_MinSet(
+    uint64_t mask_up, uint64_t mask_min, uint64_t mask_not
+) {
+    do_SweepChain({
+        SweepStepOf<OR_up<uint64_t>>(mask_up | mask_min),
+        SweepStepOf<LESS_up<uint64_t>>(mask_min),
+    }, mask_not);
+}
+void DenseSet::do_UpperSet_Not(uint64_t mask_up, uint64_t mask_not) {
+    do_SweepChain({
+        SweepStepOf<OR_up<uint64_t>>(mask_up),
+    }, mask_not);
 }
 void DenseSet::do_ComplementU2L(bool is_upper, uint64_t mask) {
     if (!is_upper)
@@ -356,6 +441,7 @@ void DenseSet::do_ComplementL2U(bool is_lower, uint64_t mask) {
     do_MinSet(mask);
 }
 void DenseSet::do_UpperSet_Up1(bool is_minset, uint64_t mask) {
+    _check_mutable();
     if (!is_minset)
         do_MinSet(-1ull);
 
@@ -383,7 +469,7 @@ vector<int64_t> DenseSet::WalshHadamard(uint64_t mask) const {
     vector<int64_t> ret(1ull << n, 1);
     auto func = [&] (uint64_t v) -> void { ret[v] = -1; };
     iter_support(func);
-    GenericSweep<WALSH_HADAMARD<int64_t>>(ret, mask);
+    GenericSweep<WALSH_HADAMARD<int64_t>>(ret, mask, get_num_threads());
     return ret;
 }
 
@@ -447,6 +533,18 @@ DenseSet DenseSet::UpperSet_Up1(bool is_minset, uint64_t mask) const {
     ret.do_UpperSet_Up1(is_minset, mask);
     return ret;
 }
+DenseSet DenseSet::UpperSet_MinSet(
+    uint64_t mask_up, uint64_t mask_min, uint64_t mask_not
+) const {
+    auto ret = copy();
+    ret.do_UpperSet_MinSet(mask_up, mask_min, mask_not);
+    return ret;
+}
+DenseSet DenseSet::UpperSet_Not(uint64_t mask_up, uint64_t mask_not) const {
+    auto ret = copy();
+    ret.do_UpperSet_Not(mask_up, mask_not);
+    return ret;
+}
 
 // ========================================
 // Stuff
@@ -461,6 +559,16 @@ DenseSet DenseSet::load_from_file(const char *filename) {
     ensure(1ull << res.n == res.data.n);
     return res;
 }
+DenseSet DenseSet::map_file(const char *filename) {
+    DenseSet res;
+    res.data = BitSet::map_file(filename);
+    res.n = log2(res.data.n);
+    ensure(1ull << res.n == res.data.n);
+    return res;
+}
+bool DenseSet::is_mapped() const {
+    return data.is_mapped();
+}
 
 uint64_t DenseSet::get_hash() const {
     return data.get_hash();
@@ -503,4 +611,7 @@ DenseBox DenseSet::to_DenseBox(const std::vector<uint64_t> & dimensions) const {
     };
     iter_support(func);
     return d;
-}
\ No newline at end of file
+}
+SparseSet DenseSet::to_SparseSet() const {
+    return SparseSet(*this);
+}
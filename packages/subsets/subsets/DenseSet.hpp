@@ -5,6 +5,7 @@
 #include "common.hpp"
 
 #include "BitSet.hpp"
+#include "Sweep.hpp"
 
 #ifdef SWIG
 %pythoncode %{
@@ -15,15 +16,30 @@ from binteger import Bin
 using namespace Pack64;
 
 struct DenseBox;
+struct SparseSet;
 
 /*
 Working with single bit vector, represented as vector<uint64_t>.
 */
 struct DenseSet {
     int n; // n input bits
+#ifndef SWIG
+    // hidden from python: writes would bypass frozen,
+    // see __array_interface__ (read-only view of frozen sets)
     BitSet data;
+    // frozen sets (e.g. shared cached results) can not be modified,
+    // copy() gives a mutable set
+    bool frozen = false;
+#endif
+
+    static int N_THREADS;  // threads used by sweeps (0 = OpenMP default)
 
     static void set_quiet(bool value=true);
+    static void set_num_threads(int value=0);
+    static int get_num_threads();
+    // instruction set of sweep kernels: "generic", "avx2" or "avx512"
+    static void set_sweep_isa(const std::string &isa);
+    static std::string get_sweep_isa();
 
     DenseSet() : n(0) {};
     DenseSet(int _n) : n(_n), data(1ull << _n) {
@@ -32,6 +48,16 @@ struct DenseSet {
     DenseSet(int n, const std::vector<uint64_t> &ints);
 
     DenseSet copy() const;
+    void freeze();
+    bool is_frozen() const;
+    // words of the bit vector (for __array_interface__ / pickling)
+    uint64_t _get_data_ptr() const { return data._get_data_ptr(); }
+    uint64_t _get_nwords() const { return data.nwords(); }
+#ifndef SWIG
+    void _check_mutable() const {
+        ensure(!frozen, "DenseSet is frozen, modify a copy()");
+    }
+#endif
     void resize(uint64_t n);
     void clear(); // set to empty set with n=0
 
@@ -46,6 +72,9 @@ struct DenseSet {
     // ========================================
     void save_to_file(const char *filename) const;
     static DenseSet load_from_file(const char *filename);
+    // zero-copy copy-on-write file mapping (see BitSet::map_file)
+    static DenseSet map_file(const char *filename);
+    bool is_mapped() const;
     uint64_t get_hash() const;
     std::string info() const;
 
@@ -107,19 +136,55 @@ struct DenseSet {
     #ifndef SWIG
     template<auto func>
     void do_Sweep(uint64_t mask = -1ull) {
+        _check_mutable();
         mask &= (1ull << n)-1;
+        int n_threads = get_num_threads();
         // we can use GenericSweep
         // pretending we have bit-slice 64 parallel sets in our array
+        // and then it's only left to Sweep each word
+        // (done on each cached block right after its sweep)
+        uint64_t lo = LO(mask);
         if (HI(mask)) {
-            GenericSweep<func>(data.data, HI(mask));
+            GenericSweepBlocked<func>(
+                data.data, HI(mask), n_threads,
+                [lo](uint64_t *ptr, uint64_t len) {
+                    if (lo) {
+                        GenericSweepWordsRange<func>(ptr, len, lo);
+                    }
+                }
+            );
         }
-        // and then it's only left to Sweep each word
-        if (LO(mask)) {
-            for(uint64_t &word: data.data) {
-                GenericSweepWord<func>(word, LO(mask));
-            }
+        else if (lo) {
+            GenericSweepWords<func>(data.data, lo, n_threads);
         }
     }
+    // step of a fused chain of sweeps (see GenericSweepChain),
+    // in-word bits are swept in the tile stage
+    template<auto func>
+    SweepStep<uint64_t> SweepStepOf(uint64_t mask) const {
+        mask &= (1ull << n)-1;
+        auto step = sweep_step<func, uint64_t>(HI(mask));
+        step.extra = GenericSweepWordsRange<func>;
+        step.extra_mask = LO(mask);
+        return step;
+    }
+    // the in-word part of the final Not is done in the last pass
+    void do_SweepChain(
+        const vector<SweepStep<uint64_t>> &steps, uint64_t mask_not = 0
+    ) {
+        _check_mutable();
+        mask_not &= (1ull << n)-1;
+        uint64_t lo = LO(mask_not);
+        GenericSweepChain(
+            data.data, steps, get_num_threads(),
+            [lo](uint64_t *ptr, uint64_t len) {
+                if (lo) {
+                    GenericSweepWordsRange<SWAP<uint64_t>>(ptr, len, lo);
+                }
+            }
+        );
+        do_NotWords(HI(mask_not));
+    }
     #endif
     // for python low-level API
     void do_Sweep_OR_up(uint64_t mask = -1ull);
@@ -144,6 +209,8 @@ struct DenseSet {
     void do_ParitySet(uint64_t mask = -1ull);
     void do_Complement();
     void do_Not(uint64_t mask = -1ull);
+    // Not on word indexes only (hi = HI(mask))
+    void do_NotWords(uint64_t hi);
     void do_UpperSet(uint64_t mask = -1ull);
     void do_LowerSet(uint64_t mask = -1ull);
     void do_MinSet(uint64_t mask = -1ull);
@@ -152,6 +219,12 @@ struct DenseSet {
     void do_ComplementU2L(bool is_upper=false, uint64_t mask = -1ull);
     void do_ComplementL2U(bool is_lower=false, uint64_t mask = -1ull);
     void do_UpperSet_Up1(bool is_minset=false, uint64_t mask = -1ull);
+    // fused UpperSet -> MinSet (-> Not)
+    void do_UpperSet_MinSet(
+        uint64_t mask_up = -1ull, uint64_t mask_min = -1ull, uint64_t mask_not = 0
+    );
+    // fused UpperSet -> Not
+    void do_UpperSet_Not(uint64_t mask_up = -1ull, uint64_t mask_not = -1ull);
 
     std::vector<int64_t> WalshHadamard(uint64_t mask = -1ull) const;
     DenseSet Mobius(uint64_t mask = -1ull) const;
@@ -166,9 +239,14 @@ struct DenseSet {
     DenseSet ComplementU2L(bool is_upper=false, uint64_t mask = -1ull) const;
     DenseSet ComplementL2U(bool is_lower=false, uint64_t mask = -1ull) const;
     DenseSet UpperSet_Up1(bool is_minset=false, uint64_t mask = -1ull) const;
+    DenseSet UpperSet_MinSet(
+        uint64_t mask_up = -1ull, uint64_t mask_min = -1ull, uint64_t mask_not = 0
+    ) const;
+    DenseSet UpperSet_Not(uint64_t mask_up = -1ull, uint64_t mask_not = -1ull) const;
 
     // static uint64_t project_to_Box(uint64_t v, const std::vector<uint64_t> & dimensions);
     DenseBox to_DenseBox(const std::vector<uint64_t> & dimensions) const;
+    SparseSet to_SparseSet() const;
 
     #ifdef SWIG
     %pythoncode %{
@@ -201,13 +279,35 @@ struct DenseSet {
         n = int(self.n)
         return [Bin(v, n) for v in self]
 
+    @property
+    def __array_interface__(self):
+        # uint64 words of the bit vector (see BitSet.__array_interface__),
+        # read-only for frozen sets
+        return dict(
+            version=3,
+            shape=(self._get_nwords(),),
+            typestr=_NATIVE_ORDER + "u8",
+            data=(self._get_data_ptr(), self.is_frozen()),
+        )
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
     def __getstate__(self):
-        return self.n, self.data.__getstate__()
+        # (same format as BitSet.__getstate__ of the bit vector)
+        l = self._get_nwords()
+        data = ctypes.string_at(self._get_data_ptr(), l * 8)
+        return self.n, (1 << self.n, l, data)
 
     def __setstate__(self, st):
-        n, data = st
+        n, (_, l, data) = st
         self.__init__(n)
-        self.data.__setstate__(data)
+        assert self._get_nwords() == l
+        src = BitSet._bytes_to_ctypes(data)
+        ctypes.memmove(self._get_data_ptr(), src, len(data))
         return self
     %}
     #endif
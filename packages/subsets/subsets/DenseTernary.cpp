@@ -63,6 +63,30 @@ uint64_t DenseTernary::get_weight() const {
     return ret;
 }
 
+uint64_t DenseTernary::get_n_words() const {
+    return data.size();
+}
+std::vector<uint64_t> DenseTernary::get_implicants(uint64_t start, uint64_t end) const {
+    end = min(end, (uint64_t)data.size());
+    vector<uint64_t> ret;
+    for (uint64_t hi = start; hi < end; hi++) {
+        auto &w = data[hi];
+        if (w.none()) {
+            continue;
+        }
+        auto hi3 = hi * BITSET3_PER3;
+        fori(lo, BITSET3_PER3) {
+            if (w[lo]) {
+                uint64_t a, u;
+                ter2bin(hi3 + lo, n, a, u);
+                ret.push_back(a);
+                ret.push_back(u);
+            }
+        }
+    }
+    return ret;
+}
+
 void DenseTernary::do_Sweep_QmC_AND_up_OR(uint64_t mask) {
     do_Sweep<QmC_AND_up_OR<BITSET3>>(mask);
 }
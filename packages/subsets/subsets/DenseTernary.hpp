@@ -32,15 +32,22 @@ struct DenseTernary {
         mask &= (1ull << n)-1;
         // we can use GenericTernarySweep
         // pretending we have bit-slice 64 parallel sets in our array
+        int n_threads = DenseSet::get_num_threads();
+        // small sets: no parallel regions (as DenseSet sweeps)
+        bool parallel = n_threads > 1 && data.size() >= (1ull << SWEEP_PARALLEL_MIN_LOG);
+        if (!parallel) {
+            n_threads = 1;
+        }
         uint64_t mask_hi = mask >> BITSET3_LOG3;
         if (mask_hi) {
-            GenericSweep3<func>(data, mask_hi);
+            GenericSweep3<func>(data, mask_hi, n_threads);
         }
         // and then it's only left to Sweep each word
         uint64_t mask_lo = mask & ((1ull << BITSET3_LOG3) - 1);
         if (mask_lo) {
-            for(auto &word: data) {
-                GenericSweep3Word<func>(word, mask_lo);
+            #pragma omp parallel for num_threads(n_threads) schedule(static) if(n_threads > 1)
+            for (uint64_t hi = 0; hi < data.size(); hi++) {
+                GenericSweep3Word<func>(data[hi], mask_lo);
             }
         }
     }
@@ -48,8 +55,17 @@ struct DenseTernary {
 
     void do_Sweep_QmC_AND_up_OR(uint64_t mask = -1ull);
     void do_Sweep_QmC_NOTAND_down(uint64_t mask = -1ull);
+    // prime implicants of a set (given as DenseTernary(set)):
+    // ternary vectors (digit 2 = free bit) of maximal subcubes of the set,
+    // sweeps run by DenseSet::get_num_threads() threads
     void do_QuineMcCluskey(uint64_t mask = -1ull);
 
+    // number of BITSET3 words, see get_implicants
+    uint64_t get_n_words() const;
+    // elements in words [start, end) as pairs (a, u), flattened:
+    // bit i of a (resp. u) is set for digit i equal to 1 (resp. 2)
+    std::vector<uint64_t> get_implicants(uint64_t start=0, uint64_t end=-1ull) const;
+
     void iter_support(std::function<void(uint64_t x)> const & func) const;
 
     std::vector<uint64_t> get_support() const;
@@ -63,6 +79,12 @@ struct DenseTernary {
         return iter(self.get_support())
     def __len__(self):
         return self.get_weight()
+
+    def iter_implicants(self, words=4096):
+        """Yields elements as pairs (a, u), see get_implicants"""
+        for start in range(0, self.get_n_words(), words):
+            flat = self.get_implicants(start, start + words)
+            yield from zip(flat[::2], flat[1::2])
     %}
     #endif
 };
\ No newline at end of file
@@ -0,0 +1,303 @@
+#include <algorithm>
+
+#include "common.hpp"
+
+#include "DenseSet.hpp"
+#include "SparseSet.hpp"
+
+static inline bool weight_less(uint64_t a, uint64_t b) {
+    int wa = hw(a);
+    int wb = hw(b);
+    return wa < wb || (wa == wb && a < b);
+}
+
+SparseSet::SparseSet(int n, const std::vector<uint64_t> &ints) : SparseSet::SparseSet(n) {
+    uint64_t mask = n == 64 ? -1ull : (1ull << n) - 1;
+    for (auto v: ints) {
+        ensure((v & ~mask) == 0, "element out of range");
+    }
+    data = ints;
+    sort(data.begin(), data.end(), weight_less);
+    data.erase(unique(data.begin(), data.end()), data.end());
+    for (auto v: data) {
+        offsets[hw(v) + 1] += 1;
+    }
+    fori(w, n + 1) {
+        offsets[w + 1] += offsets[w];
+    }
+}
+SparseSet::SparseSet(const DenseSet &dense) : SparseSet::SparseSet(dense.n) {
+    offsets.assign(n + 2, 0);
+    auto by_wt = dense.get_counts_by_weights();
+    fori(w, n + 1) {
+        offsets[w + 1] = offsets[w] + by_wt[w];
+    }
+    data.resize(offsets[n + 1]);
+    auto pos = offsets;
+    dense.iter_support([&] (uint64_t v) {
+        data[pos[hw(v)]++] = v;
+    });
+}
+SparseSet SparseSet::copy() const {
+    return *this;
+}
+void SparseSet::clear() {
+    n = 0;
+    data.clear();
+    offsets.assign(2, 0);
+}
+void SparseSet::empty() {
+    data.clear();
+    offsets.assign(n + 2, 0);
+}
+bool SparseSet::is_empty() const {
+    return data.empty();
+}
+
+// ========================================
+// Read/Write & info
+// ========================================
+uint64_t SparseSet::get_hash() const {
+    uint64_t h = -1ull;
+    for (auto v: data) {
+        h ^= v;
+        h *= 0xcaffee1234abcdefull;
+        h ^= h >> 12;
+        h += v;
+        h ^= h >> 17;
+    }
+    return h;
+}
+std::string SparseSet::info() const {
+    char buf[4096] = {};
+    snprintf(
+        buf, 4000,
+        "<SparseSet hash=%016lx n=%d wt=%lu | ",
+        get_hash(), n, get_weight()
+    );
+    return string(buf) + str_stat_by_weights() + ">";
+}
+
+// ========================================
+// Single element get/set
+// ========================================
+int SparseSet::get(uint64_t x) const {
+    int w = hw(x);
+    if (w > n)
+        return 0;
+    auto first = data.begin() + offsets[w];
+    auto last = data.begin() + offsets[w + 1];
+    return binary_search(first, last, x);
+}
+void SparseSet::set(uint64_t x) {
+    uint64_t mask = n == 64 ? -1ull : (1ull << n) - 1;
+    ensure((x & ~mask) == 0, "element out of range");
+    int w = hw(x);
+    auto first = data.begin() + offsets[w];
+    auto last = data.begin() + offsets[w + 1];
+    auto it = lower_bound(first, last, x);
+    if (it != last && *it == x)
+        return;
+    data.insert(it, x);
+    fori(i, w + 1, n + 2) {
+        offsets[i] += 1;
+    }
+}
+void SparseSet::unset(uint64_t x) {
+    int w = hw(x);
+    if (w > n)
+        return;
+    auto first = data.begin() + offsets[w];
+    auto last = data.begin() + offsets[w + 1];
+    auto it = lower_bound(first, last, x);
+    if (it == last || *it != x)
+        return;
+    data.erase(it);
+    fori(i, w + 1, n + 2) {
+        offsets[i] -= 1;
+    }
+}
+void SparseSet::set(uint64_t x, uint64_t value) {
+    if (value)
+        set(x);
+    else
+        unset(x);
+}
+void SparseSet::add(uint64_t x) {
+    ensure(!get(x), "adding existing element");
+    set(x);
+}
+void SparseSet::remove(uint64_t x) {
+    ensure(get(x), "removing non-existing element");
+    unset(x);
+}
+void SparseSet::discard(uint64_t x) {
+    unset(x);
+}
+bool SparseSet::is_compatible_set(const SparseSet & b) const {
+    return n == b.n;
+}
+
+// ========================================
+// Closures membership
+// ========================================
+bool SparseSet::is_in_upper(uint64_t x) const {
+    int w = hw(x);
+    if (w > n)
+        w = n;
+    fori(i, offsets[w + 1]) {
+        if ((data[i] & ~x) == 0)
+            return true;
+    }
+    return false;
+}
+bool SparseSet::is_in_lower(uint64_t x) const {
+    int w = hw(x);
+    if (w > n)
+        return false;
+    fori(i, offsets[w], data.size()) {
+        if ((x & ~data[i]) == 0)
+            return true;
+    }
+    return false;
+}
+bool SparseSet::is_antichain() const {
+    // comparable elements have different weights
+    fori(w, n + 1) {
+        fori(i, offsets[w], offsets[w + 1]) {
+            fori(j, offsets[w]) {
+                if ((data[j] & ~data[i]) == 0)
+                    return false;
+            }
+        }
+    }
+    return true;
+}
+
+// ========================================
+// Comparison
+// ========================================
+bool SparseSet::operator==(const SparseSet & b) const {
+    ensure(is_compatible_set(b), "sets have different dimensions");
+    return data == b.data;
+}
+bool SparseSet::operator!=(const SparseSet & b) const {
+    ensure(is_compatible_set(b), "sets have different dimensions");
+    return data != b.data;
+}
+
+// ========================================
+// Set ops
+// ========================================
+#define SPARSE_SET_OP(op, algo) \
+SparseSet SparseSet::operator op(const SparseSet & b) const { \
+    ensure(is_compatible_set(b), "sets have different dimensions"); \
+    vector<uint64_t> res; \
+    algo( \
+        data.begin(), data.end(), b.data.begin(), b.data.end(), \
+        back_inserter(res), weight_less \
+    ); \
+    return SparseSet(n, res); \
+}
+SPARSE_SET_OP(|, set_union)
+SPARSE_SET_OP(&, set_intersection)
+SPARSE_SET_OP(-, set_difference)
+SPARSE_SET_OP(^, set_symmetric_difference)
+#undef SPARSE_SET_OP
+
+// ========================================
+// Support & weights
+// ========================================
+void SparseSet::iter_support(function<void(uint64_t)> const & func) const {
+    for (auto v: get_support()) {
+        func(v);
+    }
+}
+std::vector<uint64_t> SparseSet::get_support() const {
+    auto res = data;
+    sort(res.begin(), res.end());
+    return res;
+}
+std::vector<uint64_t> SparseSet::get_by_weight(int w) const {
+    ensure(w >= 0 && w <= n, "weight out of range");
+    return vector<uint64_t>(
+        data.begin() + offsets[w], data.begin() + offsets[w + 1]
+    );
+}
+uint64_t SparseSet::get_weight() const {
+    return data.size();
+}
+std::vector<uint64_t> SparseSet::get_counts_by_weights() const {
+    vector<uint64_t> res(n + 1);
+    fori(w, n + 1) {
+        res[w] = offsets[w + 1] - offsets[w];
+    }
+    return res;
+}
+std::string SparseSet::str_stat_by_weights() const {
+    string ret;
+    char buf[4096] = "";
+    auto by_wt = get_counts_by_weights();
+    fori(i, n+1) {
+        if (by_wt[i]) {
+            snprintf(buf, 4000, "%lu:%lu ", i, by_wt[i]);
+            ret += buf;
+        }
+    };
+    if (ret.size()) {
+        ret.erase(ret.end() - 1);
+    }
+    return ret;
+}
+
+// ========================================
+// Main methods
+// ========================================
+SparseSet SparseSet::MinSet() const {
+    // by increasing weight, keep elements not above the kept ones
+    vector<uint64_t> kept;
+    fori(w, n + 1) {
+        uint64_t n_lower = kept.size();
+        fori(i, offsets[w], offsets[w + 1]) {
+            uint64_t x = data[i];
+            bool good = true;
+            fori(j, n_lower) {
+                if ((kept[j] & ~x) == 0) {
+                    good = false;
+                    break;
+                }
+            }
+            if (good)
+                kept.push_back(x);
+        }
+    }
+    return SparseSet(n, kept);
+}
+SparseSet SparseSet::MaxSet() const {
+    // by decreasing weight, keep elements not below the kept ones
+    vector<uint64_t> kept;
+    rfori(w, n + 1) {
+        uint64_t n_upper = kept.size();
+        fori(i, offsets[w], offsets[w + 1]) {
+            uint64_t x = data[i];
+            bool good = true;
+            fori(j, n_upper) {
+                if ((x & ~kept[j]) == 0) {
+                    good = false;
+                    break;
+                }
+            }
+            if (good)
+                kept.push_back(x);
+        }
+    }
+    return SparseSet(n, kept);
+}
+
+DenseSet SparseSet::to_DenseSet() const {
+    DenseSet res(n);
+    for (auto v: data) {
+        res.set(v);
+    }
+    return res;
+}
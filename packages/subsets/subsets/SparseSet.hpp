@@ -0,0 +1,137 @@
+#pragma once
+
+#include <functional>
+
+#include "common.hpp"
+
+#include "DenseSet.hpp"
+
+#ifdef SWIG
+%pythoncode %{
+from binteger import Bin
+%}
+#endif
+
+/*
+Working with a small set of n-bit vectors (e.g. an antichain such as a MinSet,
+MaxSet or division core), stored as a sorted vector of uint64_t.
+Elements are stored bucketed by Hamming weight (sorted inside each bucket),
+which speeds up closure membership tests.
+Unlike DenseSet, memory is linear in the set size and not in 2^n.
+*/
+struct SparseSet {
+    int n; // n input bits
+    // elements sorted by (weight, value)
+    std::vector<uint64_t> data;
+    // elements of weight w are data[offsets[w]:offsets[w+1]]
+    std::vector<uint64_t> offsets;
+
+    SparseSet() : SparseSet(0) {};
+    SparseSet(int _n) : n(_n), data(), offsets(_n + 2, 0) {
+        ensure(n >= 0 and n <= 64, "supported set dimension is between 0 and 64");
+    };
+    SparseSet(int n, const std::vector<uint64_t> &ints);
+    SparseSet(const DenseSet &dense);
+
+    SparseSet copy() const;
+    void clear(); // set to empty set with n=0
+    void empty(); // set to empty set, keep n
+
+    bool is_empty() const;
+
+    // ========================================
+    // Read/Write & info
+    // ========================================
+    uint64_t get_hash() const;
+    std::string info() const;
+
+    // ========================================
+    // Single element get/set
+    // ========================================
+    int get(uint64_t x) const;
+    void set(uint64_t x);
+    void unset(uint64_t x);
+    void set(uint64_t x, uint64_t value);
+
+    void add(uint64_t x);
+    void remove(uint64_t x);
+    void discard(uint64_t x);
+
+    bool is_compatible_set(const SparseSet & b) const;
+
+    // ========================================
+    // Closures membership
+    // ========================================
+    // is there an element a of the set with a <= x (bitwise)
+    bool is_in_upper(uint64_t x) const;
+    // is there an element a of the set with a >= x (bitwise)
+    bool is_in_lower(uint64_t x) const;
+    bool is_antichain() const;
+
+    // ========================================
+    // Comparison
+    // ========================================
+    bool operator==(const SparseSet & b) const;
+    bool operator!=(const SparseSet & b) const;
+
+    // ========================================
+    // Set ops
+    // ========================================
+    SparseSet operator|(const SparseSet & b) const;
+    SparseSet operator&(const SparseSet & b) const;
+    SparseSet operator-(const SparseSet & b) const;
+    SparseSet operator^(const SparseSet & b) const;
+
+    // ========================================
+    // Support & weights
+    // ========================================
+    void iter_support(function<void(uint64_t)> const & func) const;
+    std::vector<uint64_t> get_support() const; // sorted by value
+    std::vector<uint64_t> get_by_weight(int w) const;
+    uint64_t get_weight() const;
+
+    std::vector<uint64_t> get_counts_by_weights() const;
+    std::string str_stat_by_weights() const;
+
+    // ========================================
+    // Main methods
+    // ========================================
+    SparseSet MinSet() const;
+    SparseSet MaxSet() const;
+
+    DenseSet to_DenseSet() const;
+
+    #ifdef SWIG
+    %pythoncode %{
+    def __bool__(self):
+        return not self.is_empty()
+
+    def __str__(self):
+        return self.info()
+
+    def __repr__(self):
+        return self.info()
+
+    def __contains__(self, x):
+        return bool(self.get(int(x)))
+
+    def __iter__(self):
+        return iter(self.get_support())
+
+    def __len__(self):
+        return self.get_weight()
+
+    def to_Bins(self):
+        n = int(self.n)
+        return [Bin(v, n) for v in self]
+
+    def __getstate__(self):
+        return self.n, tuple(self.data)
+
+    def __setstate__(self, st):
+        n, data = st
+        self.__init__(n, data)
+        return self
+    %}
+    #endif
+};
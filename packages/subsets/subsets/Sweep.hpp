@@ -1,7 +1,23 @@
 #pragma once
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
 #include "common.hpp"
 
+// arrays smaller than 2^SWEEP_PARALLEL_MIN_LOG elements
+// are always swept in a single thread
+constexpr int SWEEP_PARALLEL_MIN_LOG = 12;
+
+static inline int sweep_max_threads() {
+    #ifdef _OPENMP
+    return omp_get_max_threads();
+    #else
+    return 1;
+    #endif
+}
+
 template<typename T>
 vector<T> neibs_up(T u, int n) {
     vector<T> res;
@@ -26,34 +42,6 @@ vector<T> neibs_down(T u, int n) {
 }
 
 
-template<auto func, typename T>
-void GenericSweep(vector<T> &arr, uint64_t mask) {
-    auto size = arr.size();
-    int n = log2(size);
-    ensure(arr.size() == (1ull << n));
-    fori(i, n) {
-        uint64_t bit = (1ull << i);
-        if ((mask & bit) == 0)
-            continue;
-
-        // fori(j, 1ull << n) {
-        //     if (j & bit) {
-        //         func(arr[j ^ bit], arr[j]);
-        //     }
-        // }
-
-        // iterate over all submasks
-        // slightly better than the above one
-        // due to same branching full loop (~25% faster)
-        uint64_t msk = ((1ull << n) - 1) ^ bit;
-        uint64_t j = msk;
-        fori(_, 1ull << (n-1)) {
-            func(arr[j], arr[j | bit]);
-            j = (j - 1) & msk;
-        }
-    }
-}
-
 template<auto func, typename WORD>
 static inline void GenericSweepWordBit(WORD &word, int shift, WORD mask) {
     // /!\ here mask corresponds to word mask,
@@ -83,6 +71,292 @@ static inline void GenericSweepWord(uint64_t &word, uint64_t mask) {
     if (mask & (32)) GenericSweepWordBit<func>(word, 32, MASK64_SINGLE[5]);
 }
 
+// cache tiles of the blocked sweep are 2^SWEEP_TILE_BYTES_LOG bytes (L2-sized),
+// but never less than 2^SWEEP_TILE_MIN_LOG elements
+constexpr int SWEEP_TILE_BYTES_LOG = 18;
+constexpr int SWEEP_TILE_MIN_LOG = 10;
+// contiguous rows processed in multi-bit stages
+// are at least 2^SWEEP_ROW_MIN_LOG elements long
+constexpr int SWEEP_ROW_MIN_LOG = 8;
+// in-word sweeps go over all bits on chunks of this many words (16 KiB)
+constexpr uint64_t SWEEP_WORDS_CHUNK = 2048;
+
+// software pdep: spread low bits of x over the set bits of mask
+static inline uint64_t sweep_deposit(uint64_t x, uint64_t mask) {
+    uint64_t res = 0;
+    for (uint64_t bit = 1; mask; bit <<= 1) {
+        uint64_t low = mask & -mask;
+        if (x & bit)
+            res |= low;
+        mask ^= low;
+    }
+    return res;
+}
+
+// ========================================
+// Instruction set dispatch
+// ========================================
+// the inner loops (SweepKernels.hpp) are compiled for each ISA
+// and the best one supported by the CPU is selected at load time
+enum SweepISA {
+    SWEEP_ISA_GENERIC = 0,
+    SWEEP_ISA_AVX2 = 1,
+    SWEEP_ISA_AVX512 = 2,
+};
+
+#if defined(__x86_64__) && defined(__GNUC__)
+#define SWEEP_X86_ISA
+#endif
+
+static inline bool sweep_isa_supported(int isa) {
+    if (isa == SWEEP_ISA_GENERIC)
+        return true;
+    #ifdef SWEEP_X86_ISA
+    __builtin_cpu_init();
+    if (isa == SWEEP_ISA_AVX2)
+        return __builtin_cpu_supports("avx2");
+    if (isa == SWEEP_ISA_AVX512)
+        return __builtin_cpu_supports("avx512f");
+    #endif
+    return false;
+}
+
+static inline int sweep_detect_isa() {
+    if (sweep_isa_supported(SWEEP_ISA_AVX512))
+        return SWEEP_ISA_AVX512;
+    if (sweep_isa_supported(SWEEP_ISA_AVX2))
+        return SWEEP_ISA_AVX2;
+    return SWEEP_ISA_GENERIC;
+}
+
+inline int SWEEP_ISA = sweep_detect_isa();
+
+namespace sweep_generic {
+    #define SWEEP_TARGET
+    #include "SweepKernels.hpp"
+    #undef SWEEP_TARGET
+}
+
+#ifdef SWEEP_X86_ISA
+namespace sweep_avx2 {
+    #define SWEEP_TARGET __attribute__((target("avx2")))
+    #include "SweepKernels.hpp"
+    #undef SWEEP_TARGET
+}
+namespace sweep_avx512 {
+    #define SWEEP_TARGET __attribute__((target("avx512f")))
+    #include "SweepKernels.hpp"
+    #undef SWEEP_TARGET
+}
+#define SWEEP_DISPATCH(call) \
+    switch (SWEEP_ISA) { \
+    case SWEEP_ISA_AVX512: sweep_avx512::call; break; \
+    case SWEEP_ISA_AVX2: sweep_avx2::call; break; \
+    default: sweep_generic::call; \
+    }
+#else
+#define SWEEP_DISPATCH(call) sweep_generic::call;
+#endif
+
+// ========================================
+// Sweeps
+// ========================================
+
+template<auto func, typename T>
+static void sweep_tile_dispatch(T *arr, int n, uint64_t mask) {
+    SWEEP_DISPATCH(sweep_tile<func>(arr, n, mask));
+}
+
+template<auto func, typename T>
+static void sweep_block_dispatch(
+    T *base, uint64_t group, uint64_t bits, uint64_t row_len
+) {
+    SWEEP_DISPATCH(sweep_block<func>(base, group, bits, row_len));
+}
+
+// one sweep of a chain (see GenericSweepChain)
+template<typename T>
+struct SweepStep {
+    void (*tile)(T *arr, int n, uint64_t mask);
+    void (*block)(T *base, uint64_t group, uint64_t bits, uint64_t row_len);
+    uint64_t mask;
+    // extra sweep applied to each tile along with the tile bits
+    // (e.g. in-word bits of bit-sliced arrays)
+    void (*extra)(T *arr, uint64_t len, uint64_t mask) = nullptr;
+    uint64_t extra_mask = 0;
+};
+
+template<auto func, typename T>
+SweepStep<T> sweep_step(uint64_t mask) {
+    return SweepStep<T>{
+        sweep_tile_dispatch<func, T>, sweep_block_dispatch<func, T>, mask
+    };
+}
+
+// Cache-blocked sweeps (as in blocked FFT / Walsh transforms).
+// Bits below the tile size are swept tile by tile (stage 0),
+// higher bits are swept in groups of up to (tile - SWEEP_ROW_MIN_LOG) bits
+// (stages 1, 2, ...), each stage in one pass over the array:
+// a block is made of 2^|group| rows of contiguous elements,
+// which are all the elements reachable by flipping the group bits.
+//
+// A chain of several sweeps is fused by going through the stages
+// in zigzag order (0..k for the first sweep, k..0 for the second, etc.),
+// so that the last stage of a sweep and the first stage of the next one
+// share the same pass over the array.
+// The first sweep processes bits in ascending order for every element,
+// as the naive bit-by-bit sweep does.
+// The following sweeps process bits in a different order
+// and must therefore be order-independent on their input
+// (e.g. OR/XOR/SWAP on anything, LESS_up on upward-closed sets).
+// Extra sweeps of the steps are done in the stage 0 pass.
+//
+// tail(ptr, len) is called once on every element range
+// after all sweeps of that range are finished (while it is still in cache).
+template<typename T, typename A, typename Tail>
+void GenericSweepChain(
+    vector<T, A> &arr, const vector<SweepStep<T>> &steps, int n_threads,
+    const Tail &tail
+) {
+    uint64_t size = arr.size();
+    int n = log2(size);
+    ensure(size == (1ull << n));
+
+    int tile = min(n, SWEEP_TILE_BYTES_LOG - __builtin_ctzll(sizeof(T)));
+    if (n_threads > 1) {
+        // leave at least 2 tiles per thread
+        int n_threads_log = 0;
+        while ((1 << n_threads_log) < n_threads)
+            n_threads_log++;
+        while (tile > SWEEP_TILE_MIN_LOG && n - tile < n_threads_log + 1)
+            tile--;
+    }
+    uint64_t tile_mask = (1ull << tile) - 1;
+
+    // stages: group masks, stage 0 is the tile stage
+    uint64_t high = 0;
+    for (auto &step: steps) {
+        high |= step.mask & (size - 1) & ~tile_mask;
+    }
+    vector<uint64_t> groups = {tile_mask};
+    int group_size = max(1, tile - SWEEP_ROW_MIN_LOG);
+    while (high) {
+        uint64_t group = 0;
+        for (int k = 0; k < group_size && high; k++) {
+            uint64_t low = high & -high;
+            group |= low;
+            high ^= low;
+        }
+        groups.push_back(group);
+    }
+
+    // passes: stage and steps to apply in that stage
+    int n_stages = groups.size();
+    vector<pair<int, vector<int>>> passes;
+    fori(j, (int)steps.size()) {
+        fori(i, n_stages) {
+            int s = (j % 2 == 0) ? i : n_stages - 1 - i;
+            uint64_t bits = steps[j].mask & groups[s];
+            if (s == 0 && steps[j].extra && steps[j].extra_mask)
+                bits |= 1;
+            if (!bits)
+                continue;
+            if (passes.size() && passes.back().first == s)
+                passes.back().second.push_back(j);
+            else
+                passes.push_back({s, {(int)j}});
+        }
+    }
+    if (passes.empty()) {
+        // still make sure tail is called
+        passes.push_back({0, {}});
+    }
+
+    uint64_t n_tiles = size >> tile;
+    bool parallel = n_threads > 1 && n >= SWEEP_PARALLEL_MIN_LOG;
+    #pragma omp parallel num_threads(n_threads) if(parallel)
+    for (size_t p = 0; p < passes.size(); p++) {
+        int s = passes[p].first;
+        auto &pass_steps = passes[p].second;
+        bool last = p + 1 == passes.size();
+
+        if (s == 0) {
+            #pragma omp for schedule(static)
+            for (uint64_t t = 0; t < n_tiles; t++) {
+                T *ptr = arr.data() + (t << tile);
+                for (int j: pass_steps) {
+                    auto &step = steps[j];
+                    if (step.mask & tile_mask)
+                        step.tile(ptr, tile, step.mask & tile_mask);
+                    if (step.extra && step.extra_mask)
+                        step.extra(ptr, 1ull << tile, step.extra_mask);
+                }
+                if (last)
+                    tail(ptr, 1ull << tile);
+            }
+            continue;
+        }
+
+        uint64_t group = groups[s];
+        int k = __builtin_popcountll(group);
+        int row = tile - k;
+        uint64_t row_len = 1ull << row;
+        uint64_t others = (size - 1) & ~group & ~(row_len - 1);
+        uint64_t n_blocks = 1ull << (n - row - k);
+
+        #pragma omp for schedule(static)
+        for (uint64_t b = 0; b < n_blocks; b++) {
+            T *base = arr.data() + sweep_deposit(b, others);
+            for (int j: pass_steps) {
+                auto &step = steps[j];
+                step.block(base, group, step.mask & group, row_len);
+            }
+            if (last) {
+                uint64_t off = 0;
+                do {
+                    tail(base + off, row_len);
+                    off = (off - group) & group;
+                } while (off);
+            }
+        }
+    }
+}
+
+// single sweep, bits in ascending order
+template<auto func, typename T, typename A, typename Tail>
+void GenericSweepBlocked(
+    vector<T, A> &arr, uint64_t mask, int n_threads, const Tail &tail
+) {
+    GenericSweepChain(arr, {sweep_step<func, T>(mask)}, n_threads, tail);
+}
+
+template<auto func, typename T, typename A>
+void GenericSweep(vector<T, A> &arr, uint64_t mask, int n_threads = 1) {
+    GenericSweepBlocked<func>(arr, mask, n_threads, [](T *, uint64_t) {});
+}
+
+// in-word sweep of a range of words
+template<auto func>
+static inline void GenericSweepWordsRange(
+    uint64_t *arr, uint64_t len, uint64_t mask
+) {
+    SWEEP_DISPATCH(sweep_words<func>(arr, len, mask));
+}
+
+template<auto func, typename A>
+void GenericSweepWords(vector<uint64_t, A> &arr, uint64_t mask, int n_threads = 1) {
+    uint64_t size = arr.size();
+    uint64_t n_chunks = (size + SWEEP_WORDS_CHUNK - 1) / SWEEP_WORDS_CHUNK;
+    bool parallel = n_threads > 1 && size >= (1ull << SWEEP_PARALLEL_MIN_LOG);
+    #pragma omp parallel for num_threads(n_threads) schedule(static) if(parallel)
+    for (uint64_t c = 0; c < n_chunks; c++) {
+        uint64_t start = c * SWEEP_WORDS_CHUNK;
+        GenericSweepWordsRange<func>(
+            arr.data() + start, min(size - start, SWEEP_WORDS_CHUNK), mask
+        );
+    }
+}
+
 
 TTi void WALSH_HADAMARD(T &a, T &b) { T plus = a + b; b = a - b; a = plus; }
 
@@ -2,29 +2,40 @@
 
 #include "common.hpp"
 #include "ternary.hpp"
+#include "Sweep.hpp"  // SWEEP_PARALLEL_MIN_LOG
 
 
 template<auto func, typename T>
-void GenericSweep3(vector<T> &arr, uint64_t mask) {
+void GenericSweep3(vector<T> &arr, uint64_t mask, int n_threads=1) {
     auto size = arr.size();
     int n = log3(size);
     ensure(arr.size() == pow3(n));
 
+    bool parallel = n_threads > 1 && size >= (1ull << SWEEP_PARALLEL_MIN_LOG);
     uint64_t hi = size / 3;
     uint64_t hi_stride = 3;
     uint64_t lo = 1;
     fori(i, n) {
         if ((mask & (1ull << i))) {
-            uint64_t j = 0;
-            fori(_, hi) {
-                fori(_, lo) {
-                    auto j1 = j + lo;
-                    auto j2 = j1 + lo;
-                    func(arr[j], arr[j1], arr[j2]);
-                    j++;
+            // triples (j, j + lo, j + 2lo), j = h * hi_stride + l, are independent:
+            // threads split the longer of the h and l loops
+            if (hi >= lo) {
+                #pragma omp parallel for num_threads(n_threads) schedule(static) if(parallel)
+                for (uint64_t h = 0; h < hi; h++) {
+                    T *p = &arr[h * hi_stride];
+                    fori(l, lo) {
+                        func(p[l], p[l + lo], p[l + 2 * lo]);
+                    }
+                }
+            }
+            else {
+                fori(h, hi) {
+                    T *p = &arr[h * hi_stride];
+                    #pragma omp parallel for num_threads(n_threads) schedule(static) if(parallel)
+                    for (uint64_t l = 0; l < lo; l++) {
+                        func(p[l], p[l + lo], p[l + 2 * lo]);
+                    }
                 }
-                j -= lo;
-                j += hi_stride;
             }
         }
         hi /= 3;
@@ -0,0 +1,71 @@
+// Inner loops of the sweeps, compiled once per instruction set.
+// This file has no include guard on purpose:
+// Sweep.hpp includes it in several namespaces,
+// each time with SWEEP_TARGET set to the target attribute of the ISA.
+// All loops run over contiguous arrays so that the compiler
+// vectorizes them (4 words per instruction with AVX2, 8 with AVX-512).
+
+// b[x] and a[x] are paired for all x < len
+template<auto func, typename T>
+SWEEP_TARGET static inline void sweep_rows(
+    T *__restrict a, T *__restrict b, uint64_t len
+) {
+    #pragma omp simd
+    for (uint64_t x = 0; x < len; x++) {
+        func(a[x], b[x]);
+    }
+}
+
+// sweep the range arr[0..2^n) over the bits of mask (all < n)
+template<auto func, typename T>
+SWEEP_TARGET static inline void sweep_tile(T *arr, int n, uint64_t mask) {
+    fori(i, n) {
+        uint64_t bit = (1ull << i);
+        if ((mask & bit) == 0)
+            continue;
+        for (uint64_t j = 0; j < (1ull << n); j += 2*bit) {
+            sweep_rows<func>(arr + j, arr + j + bit, bit);
+        }
+    }
+}
+
+// sweep the block of 2^|group| rows of row_len elements
+// (row r starts at base + pdep(r, group))
+// over the bits of group in bits, in ascending order
+template<auto func, typename T>
+SWEEP_TARGET static inline void sweep_block(
+    T *base, uint64_t group, uint64_t bits, uint64_t row_len
+) {
+    for (uint64_t rest = bits; rest; rest &= rest - 1) {
+        uint64_t bit = rest & -rest;
+        uint64_t rows = group ^ bit;
+        // all submasks of rows
+        uint64_t off = 0;
+        do {
+            sweep_rows<func>(base + off, base + (off | bit), row_len);
+            off = (off - rows) & rows;
+        } while (off);
+    }
+}
+
+// in-word sweep of len words over the bits of mask (all < 6),
+// chunk by chunk to stay in L1 while looping over the bits
+template<auto func>
+SWEEP_TARGET static inline void sweep_words(
+    uint64_t *__restrict arr, uint64_t len, uint64_t mask
+) {
+    for (uint64_t start = 0; start < len; start += SWEEP_WORDS_CHUNK) {
+        uint64_t *__restrict ptr = arr + start;
+        uint64_t cnt = min(len - start, SWEEP_WORDS_CHUNK);
+        fori(i, 6) {
+            if ((mask & (1ull << i)) == 0)
+                continue;
+            int shift = 1 << i;
+            uint64_t word_mask = MASK64_SINGLE[i];
+            #pragma omp simd
+            for (uint64_t x = 0; x < cnt; x++) {
+                GenericSweepWordBit<func>(ptr[x], shift, word_mask);
+            }
+        }
+    }
+}
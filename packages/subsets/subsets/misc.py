@@ -1,6 +1,6 @@
 from binteger import Bin
 
-from subsets.subsets import DenseSet
+from subsets.subsets import DenseSet, DenseTernary
 
 
 def Quine_McCluskey_Step1(P: DenseSet, n=None):
@@ -34,3 +34,38 @@ def Quine_McCluskey_Step1(P: DenseSet, n=None):
         for u in X:
             S.append((a, u))
     return S
+
+
+def _QuineMcCluskey_ternary(P: DenseSet, n_threads=None):
+    old = DenseSet.get_num_threads()
+    if n_threads is not None:
+        DenseSet.set_num_threads(n_threads)
+    try:
+        ter = DenseTernary(P)
+        ter.do_QuineMcCluskey()
+    finally:
+        DenseSet.set_num_threads(old)
+    return ter
+
+
+def prime_implicants(P: DenseSet, n_threads=None):
+    """
+    Same as Quine_McCluskey_Step1 (up to the order):
+    list of (a, u) for all maximal subsets (a xor LowerSet(u)) of P,
+    computed by 2n sweeps of the ternary set of P (see DenseTernary).
+
+    n_threads: number of threads of the sweeps
+    (default: DenseSet.get_num_threads())
+
+    Complexity: n 3^n / 243 bitset operations, 3^n bits of memory.
+    """
+    return list(iter_prime_implicants(P, n_threads=n_threads))
+
+
+def iter_prime_implicants(P: DenseSet, n_threads=None, words=4096):
+    """
+    Generator of prime_implicants(P),
+    decoded by chunks of (words * 243) ternary vectors.
+    """
+    ter = _QuineMcCluskey_ternary(P, n_threads=n_threads)
+    yield from ter.iter_implicants(words=words)
@@ -34,13 +34,22 @@
 #include "DenseSet.hpp"
 #include "DenseBox.hpp"
 #include "DenseTernary.hpp"
+#include "SparseSet.hpp"
+%}
+
+// move returned sets into the Python objects instead of copying them
+// (a copy would also turn a file-mapped set into a heap one)
+%typemap(out) BitSet, DenseSet %{
+    $result = SWIG_NewPointerObj(new $1_ltype(std::move($1)), $&1_descriptor, SWIG_POINTER_OWN);
 %}
 
 %include "BitSet.hpp"
 %include "DenseSet.hpp"
 %include "DenseBox.hpp"
 %include "DenseTernary.hpp"
+%include "SparseSet.hpp"
 
 %template(Vec_DenseSet) std::vector<DenseSet>;
 %template(Vec_DenseBox) std::vector<DenseBox>;
-%template(Vec_DenseTernary) std::vector<DenseTernary>;
\ No newline at end of file
+%template(Vec_DenseTernary) std::vector<DenseTernary>;
+%template(Vec_SparseSet) std::vector<SparseSet>;
\ No newline at end of file
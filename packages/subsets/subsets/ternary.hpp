@@ -34,4 +34,15 @@ static inline uint64_t bin2ter(uint64_t x, int n) {
         ret = ret * 3 + ((x >> (n - 1 - i)) & 1);
     }
     return ret;
-}
\ No newline at end of file
+}
+// x with bits of digits 1 (a) and digits 2 (u) of the ternary v
+static inline void ter2bin(uint64_t v, int n, uint64_t &a, uint64_t &u) {
+    a = 0;
+    u = 0;
+    fori(i, n) {
+        uint64_t digit = v % 3;
+        v /= 3;
+        a |= uint64_t(digit == 1) << i;
+        u |= uint64_t(digit == 2) << i;
+    }
+}
@@ -1,4 +1,7 @@
+import os
+import time
 import argparse
+from random import randrange
 
 from subsets import DenseSet
 
@@ -59,3 +62,76 @@ def tool_setinfo():
             print(*s)
 
         log.info("")
+
+
+def tool_sweep_benchmark():
+    log = logging.getLogger("subsets.sweep_benchmark")
+
+    logging.basicConfig(level="INFO")
+
+    parser = argparse.ArgumentParser(
+        description=(
+            "Benchmark DenseSet sweeps against the number of threads"
+            " and the instruction set of sweep kernels."
+        )
+    )
+
+    parser.add_argument(
+        "--nmin", type=int, default=24,
+        help="Smallest set dimension",
+    )
+    parser.add_argument(
+        "--nmax", type=int, default=34,
+        help="Largest set dimension",
+    )
+    parser.add_argument(
+        "-t", "--threads", type=str, default=None,
+        help="Comma-separated thread counts (default: powers of 2 up to #cpus)",
+    )
+    parser.add_argument(
+        "-o", "--ops", type=str, default="Mobius,UpperSet,MaxSet",
+        help="Comma-separated in-place DenseSet methods (without do_)",
+    )
+    parser.add_argument(
+        "-i", "--isa", type=str, default=None,
+        help="Comma-separated sweep instruction sets (default: detected one)",
+    )
+    args = parser.parse_args()
+
+    if args.threads:
+        threads = [int(t) for t in args.threads.split(",")]
+    else:
+        ncpu = os.cpu_count() or 1
+        threads = [1]
+        while threads[-1] * 2 <= ncpu:
+            threads.append(threads[-1] * 2)
+    ops = args.ops.split(",")
+    default_isa = DenseSet.get_sweep_isa()
+    isas = args.isa.split(",") if args.isa else [default_isa]
+
+    DenseSet.set_quiet()
+    for n in range(args.nmin, args.nmax + 1):
+        d = DenseSet(n)
+        for _ in range(1000):
+            d.set(randrange(2**n))
+
+        for op in ops:
+            base = None
+            for isa in isas:
+                DenseSet.set_sweep_isa(isa)
+                for nt in threads:
+                    DenseSet.set_num_threads(nt)
+                    cur = d.copy()
+                    t0 = time.time()
+                    getattr(cur, "do_" + op)()
+                    elapsed = time.time() - t0
+                    del cur
+                    if base is None:
+                        base = elapsed
+                    log.info(
+                        f"n={n:2d} {op:>10s} {isa:>7s} threads={nt:3d}:"
+                        f" {elapsed:8.3f}s"
+                        f" (speedup {base / max(elapsed, 1e-9):5.2f})"
+                    )
+    DenseSet.set_num_threads(0)
+    DenseSet.set_sweep_isa(default_isa)
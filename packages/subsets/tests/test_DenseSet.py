@@ -1,9 +1,11 @@
+import os
 import time
 import ctypes
 import pickle
 from random import randrange, shuffle
 from tempfile import NamedTemporaryFile
 
+import pytest
 from binteger import Bin
 
 from subsets import DenseSet, BitSet
@@ -121,6 +123,55 @@ def test_save_load():
             assert d == DenseSet.load_from_file(f.name)
 
 
+def test_map_file():
+    for d in gen_densesets(maxn=12, maxnum=8):
+        with NamedTemporaryFile() as f:
+            d.save_to_file(f.name)
+            m = DenseSet.map_file(f.name)
+            assert m == d
+
+            # copy-on-write: the file and other mappings are not affected
+            m2 = DenseSet.map_file(f.name)
+            copy = m.copy()
+            assert not copy.is_mapped()
+            m.do_Mobius()
+            m |= m2
+            assert m == (d.Mobius() | d)
+            assert m2 == d == copy == DenseSet.load_from_file(f.name)
+            assert pickle.loads(pickle.dumps(m2)) == d
+
+            m2.resize(d.n + 7)
+            assert not m2.is_mapped()
+            assert m2.get_support() == d.get_support()
+
+    d = DenseSet(12)
+    d.fill()
+    with NamedTemporaryFile() as f:
+        d.save_to_file(f.name)
+        assert DenseSet.map_file(f.name).is_mapped()
+    # sparse files are loaded normally
+    d.empty()
+    with NamedTemporaryFile() as f:
+        d.save_to_file(f.name)
+        assert not DenseSet.map_file(f.name).is_mapped()
+
+    # bad files raise without leaking file descriptors
+    d.fill()
+    with NamedTemporaryFile() as f:
+        d.save_to_file(f.name)
+        with open(f.name, "r+b") as g:
+            g.truncate(40)
+        n_fds = len(os.listdir("/proc/self/fd"))
+        for _ in range(10):
+            assert_raises(lambda: DenseSet.map_file(f.name))
+        assert len(os.listdir("/proc/self/fd")) == n_fds
+
+    # words of a BitSet are readable, not writable
+    b = BitSet(70)
+    b.set(65)
+    assert b.data == (0, 2)
+
+
 def test_properties():
     for a in gen_densesets(maxn=9):
         if a.n <= 6:
@@ -225,12 +276,192 @@ def test_BouraCanteaut16_lemma3():
                 assert F[u] == iF[iv]
 
 
+def test_parallel_sweeps():
+    for n in (1, 7, 18, 20):
+        a = DenseSet(n)
+        for i in range(500):
+            a.set(randrange(2**n))
+
+        DenseSet.set_num_threads(1)
+        assert DenseSet.get_num_threads() == 1
+        ans = [
+            a.Mobius(), a.ParitySet(), a.UpperSet(), a.LowerSet(),
+            a.MinSet(), a.MaxSet(), a.Not(), a.DivCore(), a.WalshHadamard(),
+        ]
+
+        DenseSet.set_num_threads(4)
+        assert DenseSet.get_num_threads() == 4
+        res = [
+            a.Mobius(), a.ParitySet(), a.UpperSet(), a.LowerSet(),
+            a.MinSet(), a.MaxSet(), a.Not(), a.DivCore(), a.WalshHadamard(),
+        ]
+        assert res == ans
+
+    DenseSet.set_num_threads(0)
+    assert DenseSet.get_num_threads() >= 1
+    assert_raises(lambda: DenseSet.set_num_threads(-1))
+
+
+def test_blocked_sweeps():
+    # large enough to use several cache tiles and multi-bit stages
+    n = 24
+    a = DenseSet(n)
+    for i in range(5000):
+        a.set(randrange(2**n))
+    # the blocked sweep must give exactly the result of
+    # sweeping bit by bit (word-index bits first, then in-word bits)
+    order = list(range(6, n)) + list(range(6))
+    for nthreads in (1, 4):
+        DenseSet.set_num_threads(nthreads)
+        for name in ("OR_up", "XOR_down", "LESS_up", "MORE_down"):
+            res = a.copy()
+            getattr(res, "do_Sweep_" + name)()
+
+            ans = a.copy()
+            for i in order:
+                getattr(ans, "do_Sweep_" + name)(1 << i)
+            assert res == ans, (name, nthreads)
+    DenseSet.set_num_threads(0)
+
+
+def test_fused_sweeps():
+    def chain(a, *steps):
+        a = a.copy()
+        for name, mask in steps:
+            if name == "Not":
+                a.do_Not(mask)
+            else:
+                getattr(a, "do_Sweep_" + name)(mask)
+        return a
+
+    for n in (3, 9, 23):
+        a = DenseSet(n)
+        for i in range(3000):
+            a.set(randrange(2**n))
+        full = 2**n - 1
+        for nthreads in (1, 4):
+            DenseSet.set_num_threads(nthreads)
+            for m1, m2 in ((full, full), (randrange(2**n), randrange(2**n))):
+                assert a.MinSet(m1) == chain(a, ("OR_up", m1), ("LESS_up", m1))
+                assert a.MaxSet(m1) == chain(a, ("OR_down", m1), ("MORE_down", m1))
+                assert a.DivCore(m1) == chain(
+                    a, ("XOR_up", m1), ("OR_down", m1), ("MORE_down", m1),
+                    ("Not", m1),
+                )
+                assert a.UpperSet_MinSet(m1, m2) == a.UpperSet(m1).MinSet(m2)
+                assert a.UpperSet_MinSet(m1, m2, m1) == \
+                    a.UpperSet(m1).MinSet(m2).Not(m1)
+                assert a.UpperSet_Not(m1, m2) == a.UpperSet(m1).Not(m2)
+    DenseSet.set_num_threads(0)
+
+
+def test_sweep_isa():
+    default = DenseSet.get_sweep_isa()
+    assert default in ("generic", "avx2", "avx512")
+    assert_raises(lambda: DenseSet.set_sweep_isa("sse1"))
+
+    isas = []
+    for isa in ("generic", "avx2", "avx512"):
+        try:
+            DenseSet.set_sweep_isa(isa)
+        except RuntimeError:
+            continue
+        assert DenseSet.get_sweep_isa() == isa
+        isas.append(isa)
+
+    for n in (4, 11, 23):
+        a = DenseSet(n)
+        for i in range(1000):
+            a.set(randrange(2**n))
+
+        ans = None
+        for isa in isas:
+            DenseSet.set_sweep_isa(isa)
+            res = [
+                a.Mobius(), a.UpperSet(), a.LowerSet(), a.MinSet(), a.MaxSet(),
+                a.Not(), a.WalshHadamard(),
+            ]
+            if ans is None:
+                ans = res
+            assert res == ans, isa
+    DenseSet.set_sweep_isa(default)
+
+
 def test_pickle():
     for d in gen_densesets(maxn=8):
         assert pickle.loads(pickle.dumps(d)) == d
         assert d.copy() == d
 
 
+def test_frozen():
+    import copy
+
+    d = DenseSet(8, [1, 2, 100])
+    d.freeze()
+    assert d.is_frozen()
+    for f in (
+        lambda: d.set(5),
+        lambda: d.__setitem__(1, 0),
+        lambda: d.do_UpperSet(),
+        lambda: d.do_MinSet(),
+        lambda: d.do_Not(),
+        lambda: d.do_Complement(),
+        lambda: d.do_UpperSet_Up1(),
+        lambda: d.empty(),
+        lambda: d.resize(9),
+        lambda: d.__ior__(DenseSet(8)),
+    ):
+        assert_raises(f)
+    assert list(d) == [1, 2, 100]
+
+    # derived sets and copies are mutable
+    u = d.UpperSet()
+    assert not u.is_frozen()
+    u.do_MinSet()
+    assert u == d
+    for c in (d.copy(), copy.copy(d), copy.deepcopy(d), d | DenseSet(8)):
+        assert not c.is_frozen()
+        c.set(5)
+        assert 5 in c and 5 not in d
+
+    # no writable views of the words
+    assert d.__array_interface__["data"][1] is True
+    assert c.__array_interface__["data"][1] is False
+    assert not hasattr(d, "data")
+
+
+def test_array_interface():
+    for d in gen_densesets(maxn=9, maxnum=16):
+        ai = d.__array_interface__
+        nwords = (2**d.n + 63) // 64
+        assert ai["shape"] == (nwords,)
+        assert ai["typestr"][1:] == "u8"
+        words = (ctypes.c_uint64 * nwords).from_address(ai["data"][0])
+        assert [
+            i for i in range(2**d.n) if words[i // 64] >> (i % 64) & 1
+        ] == list(d.get_support())
+
+
+def test_numpy():
+    np = pytest.importorskip("numpy")
+    d = DenseSet(10, [1, 2, 3, 100, 1023])
+    words = np.asarray(d)
+    assert words.dtype == np.uint64
+    bits = np.unpackbits(words.view(np.uint8), bitorder="little")
+    assert tuple(np.flatnonzero(bits)) == d.get_support()
+    # zero-copy
+    d.set(5)
+    assert words[0] == 2**1 + 2**2 + 2**3 + 2**5
+
+    # frozen sets give read-only views
+    d.freeze()
+    words = np.asarray(d)
+    assert not words.flags.writeable
+    with pytest.raises(ValueError):
+        words[0] |= 1 << 6
+    assert 6 not in d
+
+
 def test_bytes_byref():
     conv = BitSet._bytes_to_ctypes
 
@@ -1,9 +1,12 @@
+import time
 from random import randrange, seed, sample
 from collections import Counter
 from binteger import Bin
 
 from subsets import DenseSet, DenseBox, DenseTernary
-from subsets.misc import Quine_McCluskey_Step1
+from subsets.misc import (
+    Quine_McCluskey_Step1, prime_implicants, iter_prime_implicants,
+)
 
 
 def test_QMC1():
@@ -121,6 +124,41 @@ def test_implementations():
             assert pats == pats3
 
 
+def test_prime_implicants():
+    seed(123)
+    for n in range(0, 13):
+        for _ in range(3):
+            P = DenseSet(n)
+            for x in range(2**n):
+                if randrange(3):
+                    P.set(x)
+
+            ans = sorted(Quine_McCluskey_Step1(P))
+            assert sorted(prime_implicants(P)) == ans
+            assert sorted(prime_implicants(P, n_threads=2)) == ans
+            assert sorted(iter_prime_implicants(P, words=2)) == ans
+    assert prime_implicants(DenseSet(6)) == []
+
+
+def time_prime_implicants():
+    for n in (8, 10, 12, 14, 16):
+        P = DenseSet(n)
+        for x in range(2**n):
+            if randrange(3):
+                P.set(x)
+
+        t0 = time.time()
+        S1 = Quine_McCluskey_Step1(P)
+        t1 = time.time()
+        S2 = prime_implicants(P)
+        t2 = time.time()
+        assert sorted(S1) == sorted(S2)
+        print(
+            f"n={n:2d} implicants {len(S1):7d}: "
+            f"Step1 {t1 - t0:.3f}s ternary {t2 - t1:.3f}s"
+        )
+
+
 def time_imp_diff():
     AES = [
         0x63,0x7c,0x77,0x7b,0xf2,0x6b,0x6f,0xc5,0x30,0x01,0x67,0x2b,0xfe,0xd7,0xab,0x76,
@@ -196,4 +234,5 @@ def time_imp_diff():
 
 
 if __name__ == '__main__':
+    time_prime_implicants()
     time_imp_diff()
@@ -0,0 +1,73 @@
+import pickle
+from random import randrange
+
+from subsets import DenseSet, SparseSet
+
+
+def assert_raises(f, err=RuntimeError):
+    try:
+        f()
+    except err as e:
+        print("exception good:", e)
+    else:
+        assert 0, f"exception {err} not raised"
+
+
+def test_SparseSet():
+    s = SparseSet(4, [3, 5, 1, 15, 5])
+    assert list(s) == [1, 3, 5, 15]
+    assert len(s) == 4
+    assert s.get_counts_by_weights() == (0, 1, 2, 0, 1)
+    assert s.get_by_weight(2) == (3, 5)
+    assert 3 in s and 2 not in s
+
+    s.add(2)
+    assert 2 in s
+    assert_raises(lambda: s.add(2))
+    s.remove(2)
+    assert 2 not in s
+    assert_raises(lambda: s.remove(2))
+    s.discard(2)
+    assert_raises(lambda: s.set(16))
+
+    assert s.is_in_upper(7) and s.is_in_upper(1) and not s.is_in_upper(2)
+    assert s.is_in_lower(2) and s.is_in_lower(0) and not s.is_in_lower(15 + 16)
+    assert not s.is_antichain()
+    assert list(s.MinSet()) == [1]
+    assert list(s.MaxSet()) == [15]
+    assert s.MaxSet().is_antichain()
+
+    assert pickle.loads(pickle.dumps(s)) == s
+    assert SparseSet(64, [2**63, 1]).get_support() == (1, 2**63)
+
+
+def test_ops():
+    a = SparseSet(8, [1, 2, 3, 100])
+    b = SparseSet(8, [3, 100, 200])
+    assert list(a | b) == [1, 2, 3, 100, 200]
+    assert list(a & b) == [3, 100]
+    assert list(a - b) == [1, 2]
+    assert list(a ^ b) == [1, 2, 200]
+    assert_raises(lambda: a | SparseSet(9))
+
+
+def test_DenseSet_conversion():
+    for n in (1, 5, 12):
+        d = DenseSet(n)
+        for i in range(50):
+            d.set(randrange(2**n))
+
+        s = d.to_SparseSet()
+        assert s.get_support() == d.get_support()
+        assert s.get_counts_by_weights() == d.get_counts_by_weights()
+        assert SparseSet(d) == s
+        assert s.to_DenseSet() == d
+
+        assert s.MinSet().to_DenseSet() == d.MinSet()
+        assert s.MaxSet().to_DenseSet() == d.MaxSet()
+
+        up = d.UpperSet()
+        lo = d.LowerSet()
+        for x in range(2**n):
+            assert s.is_in_upper(x) == (x in up)
+            assert s.is_in_lower(x) == (x in lo)
@@ -0,0 +1,69 @@
+"""
+Throughput of DivCore_StrongComposition (keys/sec) against the number of threads
+and the strategy ("keys" or "values", see DivCore_StrongComposition.process).
+
+Usage: python scripts/ssb_benchmark.py [cipher ...] [-k keys] [-t threads]
+                                       [-s strategies]
+"""
+import os
+import time
+import argparse
+
+import logging
+import justlogs
+
+from divprop.ciphers import ciphers
+
+justlogs.setup(level="INFO")
+
+log = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument(
+    "ciphers", type=str, nargs="*", default=["SSB_LED", "SSB_SKINNY64"],
+    help="Ciphers from divprop.ciphers",
+)
+parser.add_argument(
+    "-k", "--keys", type=int, default=16,
+    help="Number of keys processed for each thread count",
+)
+parser.add_argument(
+    "-t", "--threads", type=str, default=None,
+    help="Comma-separated thread counts (default: powers of 2 up to #cpus)",
+)
+parser.add_argument(
+    "-s", "--strategies", type=str, default="keys,values",
+    help="Comma-separated strategies",
+)
+args = parser.parse_args()
+
+if args.threads:
+    threads = [int(t) for t in args.threads.split(",")]
+else:
+    ncpu = os.cpu_count() or 1
+    threads = [1]
+    while threads[-1] * 2 <= ncpu:
+        threads.append(threads[-1] * 2)
+
+for name in args.ciphers:
+    name = name.lower()
+    cipher = ciphers[name]()
+    keys = cipher.get_keys()[:args.keys]
+    snd = cipher.make_sandwich(keys=keys)
+
+    log.info(f"{name}: Sandwich picks the {snd.pick_strategy()} strategy")
+
+    base = None
+    for strategy in args.strategies.split(","):
+        for nt in threads:
+            DCS = snd.make_composition()
+            t0 = time.time()
+            DCS.process(len(keys), nt, strategy)
+            elapsed = time.time() - t0
+            if base is None:
+                base = elapsed
+            log.info(
+                f"{name} {strategy:>6s} threads={nt:3d}:"
+                f" {len(keys) / elapsed:8.3f} keys/sec"
+                f" (speedup {base / elapsed:5.2f})"
+            )
@@ -26,4 +26,4 @@ log.info(
 log.info(f"path {path}")
 
 snd = cipher.make_sandwich()
-snd.compute_divcore(chunk=128, filename=f"{path}/divcore")
+snd.compute_divcore(chunk=128, filename=f"{path}/divcore", resume=True)